@@ -1,12 +1,23 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from datetime import datetime
+import hashlib
+import itertools
+import logging
 import os
+import threading
+from app.utils.cache import MISS, create_cache
+from app.utils.db_pool import instrument, pool_options
 
 # Charger les variables d'environnement
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
@@ -14,26 +25,343 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 DB_SSL_CA = os.getenv("DB_SSL_CA")
 
-# ✅ Connexion à Aiven avec SSL
-SQLALCHEMY_DATABASE_URL = (
+# ✅ Connexion à Aiven avec SSL (DATABASE_URL la remplace entièrement, ex. SQLite en local)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     f"?ssl_ca={DB_SSL_CA}&ssl_verify_cert=false"
 )
 
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # 🔥 évite les connexions mortes
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+
+# 🔥 Pool réglable par l'environnement (DB_POOL_*, DB_PRE_PING) et instrumenté
+engine = instrument(
+    create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=_connect_args(SQLALCHEMY_DATABASE_URL),
+        **pool_options(SQLALCHEMY_DATABASE_URL),
+    )
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# ✅ Réplicas en lecture (DB_REPLICA_URLS="url1,url2") : les routes qui se
+# déclarent en lecture seule (Depends(get_read_db)) y sont envoyées, tout le
+# reste va sur le primaire. Après une écriture, le même client (token ou IP)
+# reste sur le primaire pendant DB_STICKY_SECONDS (lecture de ses écritures
+# malgré le retard de réplication).
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", "5"))
+
+replica_engines = [
+    instrument(
+        create_engine(url, connect_args=_connect_args(url), **pool_options(url)),
+        name=f"replica{i}",
+    )
+    for i, url in enumerate(DB_REPLICA_URLS, start=1)
+]
+_replicas = itertools.cycle(replica_engines)
+
+# Clients ayant écrit récemment : memory (propre au processus) ou redis
+# (partagé entre workers, CACHE_REDIS_URL), ou tout backend ajouté par
+# register_backend() avant la première requête
+DB_STICKY_BACKEND = os.getenv("DB_STICKY_BACKEND", "memory")
+_recent_writers = None
+_recent_writers_lock = threading.Lock()
+
+
+def recent_writers():
+    """Cache des écritures récentes, créé au premier usage"""
+    global _recent_writers
+    if _recent_writers is None:
+        with _recent_writers_lock:
+            if _recent_writers is None:
+                options = {"prefix": "sticky:"} if DB_STICKY_BACKEND == "redis" else {}
+                _recent_writers = create_cache(
+                    DB_STICKY_BACKEND, max_entries=100_000, ttl=DB_STICKY_SECONDS, **options
+                )
+    return _recent_writers
+
+
+def _is_write(clause) -> bool:
+    return clause is not None and (
+        getattr(clause, "is_dml", False) or getattr(clause, "_for_update_arg", None) is not None
+    )
+
+
+class RoutingSession(Session):
+    """
+    Session primaire par défaut. Avec read_only=True, les SELECT partent sur
+    un réplica ; dès la première écriture (flush, DML, FOR UPDATE) la session
+    bascule définitivement sur le primaire.
+    """
+
+    def __init__(self, *args, read_only: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = self._next_replica() if read_only else None
+
+    @staticmethod
+    def _next_replica():
+        return next(_replicas) if replica_engines else None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or _is_write(clause):
+            self.info["wrote"] = True
+        if self.replica is not None and not self.info.get("wrote"):
+            return self.replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writer(session):
+    client = session.info.get("client")
+    if client and session.info.get("wrote"):
+        recent_writers().set(client, True)
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+def client_key(request: Request) -> str:
+    """Identité du client pour la fenêtre de lecture de ses écritures"""
+    auth = request.headers.get("authorization")
+    if auth:
+        return "token:" + hashlib.sha256(auth.encode()).hexdigest()[:32]
+    return "ip:" + (request.client.host if request.client else "-")
+
+
+def get_db(request: Request):
+    db = SessionLocal(info={"client": client_key(request)})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """Session des routes en lecture seule : réplica, sauf écriture récente du client"""
+    client = client_key(request)
+    db = SessionLocal(read_only=recent_writers().get(client) is MISS, info={"client": client})
     try:
         yield db
     finally:
         db.close()
 
+
+# ✅ Accès asynchrone (routes de lecture à forte concurrence)
+# URL déduite de DATABASE_URL (ou de chaque réplica) en changeant de pilote :
+# sqlite → aiosqlite, mysql → asyncmy (ou aiomysql via ASYNC_DB_DRIVER) ;
+# ASYNC_DATABASE_URL la remplace pour le primaire. Les moteurs ne sont créés
+# qu'au premier usage : le pilote async reste optionnel tant que
+# ASYNC_READ_ROUTES n'est pas activé.
+ASYNC_READ_ROUTES = os.getenv("ASYNC_READ_ROUTES", "false").lower() in ("1", "true", "yes")
+ASYNC_DB_DRIVER = os.getenv("ASYNC_DB_DRIVER", "asyncmy")
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": ASYNC_DB_DRIVER}
+# Options de connexion propres à pymysql (remplacées par le contexte SSL)
+_SYNC_QUERY_OPTIONS = ("ssl_ca", "ssl_verify_cert")
+
+
+def async_url(url: str) -> str:
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"Aucun pilote async pour {parsed.drivername} : définir ASYNC_DATABASE_URL")
+    parsed = parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}")
+    return parsed.difference_update_query(_SYNC_QUERY_OPTIONS).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+if ASYNC_READ_ROUTES:
+    ASYNC_DATABASE_URL = ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABASE_URL)  # échoue au démarrage
+
+_async_engine = None
+_async_replica_engines = []
+_async_replicas = None
+_async_sessionmaker = None
+
+
+def _async_connect_args(url: str) -> dict:
+    from sqlalchemy.engine import make_url
+
+    cafile = make_url(url).query.get("ssl_ca") or DB_SSL_CA
+    if not url.startswith("mysql") or not cafile or cafile == "None":
+        return {}
+    import ssl
+
+    context = ssl.create_default_context(cafile=cafile)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE  # même politique que ssl_verify_cert=false
+    return {"ssl": context}
+
+
+def _create_async_engine(url: str, target: str | None = None, name: str = "primary"):
+    """Moteur async de la base `url` (URL synchrone), pool réglé et instrumenté comme le sync"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    target = target or async_url(url)
+    async_engine = create_async_engine(
+        target, connect_args=_async_connect_args(url), **pool_options(target, asynchronous=True)
+    )
+    instrument(async_engine.sync_engine, name=f"async_{name}")
+    return async_engine
+
+
+class AsyncRoutingSession(RoutingSession):
+    """Routage de RoutingSession sur les réplicas async"""
+
+    @staticmethod
+    def _next_replica():
+        return next(_async_replicas).sync_engine if _async_replica_engines else None
+
+
+def get_async_engine():
+    global _async_engine, _async_replica_engines, _async_replicas, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = _create_async_engine(SQLALCHEMY_DATABASE_URL, ASYNC_DATABASE_URL)
+        _async_replica_engines = [
+            _create_async_engine(url, name=f"replica{i}") for i, url in enumerate(DB_REPLICA_URLS, start=1)
+        ]
+        _async_replicas = itertools.cycle(_async_replica_engines)
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+def AsyncSessionLocal(**kwargs):
+    get_async_engine()
+    return _async_sessionmaker(**kwargs)
+
+
+async def get_async_db(request: Request):
+    """Session async en lecture : réplica, sauf écriture récente du client (comme get_read_db)"""
+    client = client_key(request)
+    writers = recent_writers()
+    if DB_STICKY_BACKEND == "memory":
+        recent = writers.get(client)
+    else:
+        recent = await run_in_threadpool(writers.get, client)
+    async with AsyncSessionLocal(read_only=recent is MISS, info={"client": client}) as db:
+        yield db
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_replica_engines, _async_replicas, _async_sessionmaker
+    if _async_engine is not None:
+        for async_engine in (_async_engine, *_async_replica_engines):
+            await async_engine.dispose()
+        _async_engine = _async_replicas = _async_sessionmaker = None
+        _async_replica_engines = []
+
+
+# Dates de tri de la pagination par curseur : les lignes anciennes sans
+# date passent en tête des listes (plus anciennes que toutes les autres)
+_EPOCH = datetime(1970, 1, 1)
+_BACKFILL = {
+    "products": "date_creation",
+    "orders": "date_commande",
+    "payments": "date_paiement",
+    "product_reviews": "date_review",
+}
+
+
+# ✅ Ajout des colonnes et index manquants sur les tables existantes
+# (create_all ne crée que les tables absentes)
+def sync_schema(bind=None):
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateColumn
+
+    bind = bind or engine
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            if table.name in _BACKFILL:
+                column = table.c[_BACKFILL[table.name]]
+                conn.execute(table.update().where(column.is_(None)).values({column: _EPOCH}))
+
+    # Index (dont les contraintes d'unicité) : un par transaction. Les
+    # doublons connus sont fusionnés avant ; un index unique encore refusé
+    # n'empêche pas le démarrage mais est journalisé en erreur.
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        names = {i["name"] for i in inspector.get_indexes(table.name)}
+        names |= {u["name"] for u in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name in names:
+                continue
+            try:
+                with bind.begin() as conn:
+                    if index.name in _DEDUPLICATE:
+                        _DEDUPLICATE[index.name](conn)
+                    index.create(conn)
+            except Exception as exc:
+                log = logger.error if index.unique else logger.warning
+                log("Index non créé", extra={"index": index.name, "erreur": repr(exc)})
+
+
+def _merge_duplicate_carts(conn):
+    """Un panier par utilisateur : les articles des paniers en trop passent dans le plus ancien"""
+    from sqlalchemy import delete, func, select, update
+
+    carts, items = Base.metadata.tables["carts"], Base.metadata.tables["cart_items"]
+    duplicates = conn.execute(
+        select(carts.c.id_user, func.min(carts.c.id_cart))
+        .where(carts.c.id_user.isnot(None))
+        .group_by(carts.c.id_user)
+        .having(func.count() > 1)
+    ).all()
+    for id_user, keep in duplicates:
+        extra = select(carts.c.id_cart).where(carts.c.id_user == id_user, carts.c.id_cart != keep)
+        extra = [id_cart for (id_cart,) in conn.execute(extra)]
+        conn.execute(update(items).where(items.c.id_cart.in_(extra)).values(id_cart=keep))
+        conn.execute(delete(carts).where(carts.c.id_cart.in_(extra)))
+    if duplicates:
+        logger.warning("Paniers en double fusionnés", extra={"utilisateurs": len(duplicates)})
+
+
+def _merge_duplicate_cart_items(conn):
+    """Une ligne par produit et par panier : les quantités des doublons sont additionnées"""
+    from sqlalchemy import delete, func, select, update
+
+    items = Base.metadata.tables["cart_items"]
+    duplicates = conn.execute(
+        select(items.c.id_cart, items.c.id_product, func.min(items.c.id_cart_item), func.sum(items.c.quantite))
+        .group_by(items.c.id_cart, items.c.id_product)
+        .having(func.count() > 1)
+    ).all()
+    for id_cart, id_product, keep, quantite in duplicates:
+        conn.execute(update(items).where(items.c.id_cart_item == keep).values(quantite=quantite))
+        conn.execute(
+            delete(items).where(
+                items.c.id_cart == id_cart, items.c.id_product == id_product, items.c.id_cart_item != keep
+            )
+        )
+    if duplicates:
+        logger.warning("Articles de panier en double fusionnés", extra={"lignes": len(duplicates)})
+
+
+# Nettoyage à faire avant de poser un index unique sur des données existantes
+# (les paniers d'abord : leur fusion peut créer des articles en double)
+_DEDUPLICATE = {
+    "uq_carts_user": _merge_duplicate_carts,
+    "uq_cart_items_cart_product": _merge_duplicate_cart_items,
+}
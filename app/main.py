@@ -1,7 +1,7 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import Base, engine
-from fastapi.staticfiles import StaticFiles
+from app.database import Base, dispose_async_engine, engine, sync_schema
 from app.routes import (
     users,
     products,
@@ -15,24 +15,43 @@ from app.routes import (
     admin_dashboard,
     seller_dashboard,
     categories,
+    health,
 )
-from fastapi import Depends
-from sqlalchemy import text
-from app.database import get_db
+from app.utils import image_pipeline, product_import
+from app.utils.cart_store import cart_store
+from app.utils.passwords import password_service
+from app.utils.reservations import reservations
+from app.utils.static_files import UploadFiles
+from app.utils.uploads import UploadLimitMiddleware
+from app.utils.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from app.utils.metrics import MetricsMiddleware
+from app.utils.query_budget import QueryBudgetMiddleware
+
+# 📝 Journalisation structurée (avant tout le reste)
+setup_logging()
 
 
 # =====================================================
 # ✅ Configuration FastAPI
 # =====================================================
-app = FastAPI(title="Drops API", version="1.1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🛒 Écriture différée des paniers (reprend aussi ceux laissés par un autre nœud)
+    cart_store.start()
+    # 🎟️ Réservations de stock (reprend aussi les baux orphelins)
+    reservations.start()
+    yield
+    # 🧹 Arrêt propre des tâches de fond
+    cart_store.shutdown()
+    reservations.shutdown()
+    image_pipeline.shutdown()
+    product_import.shutdown()
+    password_service.shutdown()
+    await dispose_async_engine()
+    shutdown_logging()
+
 
-@app.get("/health/db")
-def check_database_connection(db=Depends(get_db)):
-    try:
-        db.execute(text("SELECT 1"))
-        return {"status": "✅ Database connected successfully!"}
-    except Exception as e:
-        return {"status": "❌ Database connection failed!", "error": str(e)}
+app = FastAPI(title="Drops API", version="1.1", lifespan=lifespan)
 
 # =====================================================
 # 🌐 Middleware CORS (doit venir AVANT les routes)
@@ -47,18 +66,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 🔗 Identifiant de requête (X-Request-ID) dans tous les logs
+app.add_middleware(RequestIdMiddleware)
+
+# 📈 Compteurs, latence et temps SQL par route (exposés sur /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# 🔁 Budget de requêtes SQL par route et détection des N+1
+app.add_middleware(QueryBudgetMiddleware)
+
+# 📏 413 sur les envois multipart trop gros, avant l'analyse du formulaire
+app.add_middleware(UploadLimitMiddleware, limits={"/products/import": product_import.IMPORT_MAX_BYTES})
+
 
 # 📂 Montage du dossier d'uploads (pour les images produits)
+# Cache immutable, ETag/304, Range ; X-Accel-Redirect derrière nginx
 # =====================================================
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadFiles(directory="uploads"), name="uploads")
 # =====================================================
 # ⚙️ Création des tables (après app)
 # =====================================================
 Base.metadata.create_all(bind=engine)
+sync_schema(engine)
 
 # =====================================================
 # 🚀 Inclusion des routes
 # =====================================================
+app.include_router(health.router)  # /health/live, /health/ready, /health/db, /metrics
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
@@ -4,5 +4,7 @@ from app.models.category import Category
 from app.models.product import Product
 from app.models.cart import Cart, CartItem
 from app.models.order import Order, OrderItem
-from app.models.payment import Payment
-from app.models.review import ProductReview
+from app.models.payment import Payment, PaymentMethod, PaymentStatus
+from app.models.review import ProductReview, ProductReviewStats
+from app.models.stored_file import StoredFile
+from app.models.stock_lease import StockLease
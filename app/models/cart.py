@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 class Cart(Base):
     __tablename__ = "carts"
+    # ✅ Un seul panier par utilisateur (créations concurrentes)
+    __table_args__ = (Index("uq_carts_user", "id_user", unique=True),)
 
     id_cart = Column(Integer, primary_key=True, index=True)
     id_user = Column(Integer, ForeignKey("users.id_user"))
@@ -15,6 +17,8 @@ class Cart(Base):
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # ✅ Une ligne par produit : les ajouts concurrents deviennent des upserts
+    __table_args__ = (Index("uq_cart_items_cart_product", "id_cart", "id_product", unique=True),)
 
     id_cart_item = Column(Integer, primary_key=True, index=True)
     id_cart = Column(Integer, ForeignKey("carts.id_cart"))
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, Integer, String, Text, DateTime
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.database import Base
 
 
@@ -10,6 +11,7 @@ class Category(Base):
     nom = Column(String(100), nullable=False)
     description = Column(Text)
     image = Column(String(255))
+    date_modification = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
  # ✅ Relation inverse avec Product
     products = relationship("Product", back_populates="category", cascade="all, delete-orphan")
 
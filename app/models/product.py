@@ -16,12 +16,16 @@ class Product(Base):
     stock = Column(Integer, default=0)
     image = Column(String(255))
     date_creation = Column(DateTime, default=datetime.utcnow)
+    date_modification = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     note_moyenne = Column(Float, default=5.0)
 
     # ✅ Relations
     seller = relationship("User", back_populates="products")
     category = relationship("Category", back_populates="products")
     reviews = relationship("ProductReview", back_populates="product", cascade="all, delete-orphan")
+    review_stats = relationship(
+        "ProductReviewStats", back_populates="product", uselist=False, cascade="all, delete-orphan"
+    )
 
 
 
@@ -17,3 +17,30 @@ class ProductReview(Base):
     user = relationship("User", back_populates="reviews")
     product = relationship("Product", back_populates="reviews")
 
+
+class ProductReviewStats(Base):
+    """Statistiques d'avis dénormalisées (une ligne par produit)"""
+    __tablename__ = "product_review_stats"
+
+    id_product = Column(Integer, ForeignKey("products.id_product", ondelete="CASCADE"), primary_key=True)
+    nb_reviews = Column(Integer, nullable=False, default=0)
+    somme_notes = Column(Integer, nullable=False, default=0)
+
+    # ⭐ Histogramme par nombre d'étoiles
+    nb_1 = Column(Integer, nullable=False, default=0)
+    nb_2 = Column(Integer, nullable=False, default=0)
+    nb_3 = Column(Integer, nullable=False, default=0)
+    nb_4 = Column(Integer, nullable=False, default=0)
+    nb_5 = Column(Integer, nullable=False, default=0)
+
+    product = relationship("Product", back_populates="review_stats")
+
+    @property
+    def note_moyenne(self):
+        if not self.nb_reviews:
+            return None
+        return self.somme_notes / self.nb_reviews
+
+    @property
+    def histogramme(self):
+        return {str(n): getattr(self, f"nb_{n}") or 0 for n in range(1, 6)}
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.database import Base
+
+
+class StockLease(Base):
+    """Part du stock d'un produit confiée à un worker (moteur de réservation)"""
+    __tablename__ = "stock_leases"
+    __table_args__ = (Index("uq_stock_leases_worker_product", "worker", "id_product", unique=True),)
+
+    id_lease = Column(Integer, primary_key=True, index=True)
+    worker = Column(String(64), nullable=False)
+    id_product = Column(Integer, ForeignKey("products.id_product", ondelete="CASCADE"), nullable=False)
+    quantite = Column(Integer, nullable=False, default=0)
+    date_modification = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StockLease(worker='{self.worker}', product={self.id_product}, qte={self.quantite})>"
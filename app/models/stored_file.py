@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.database import Base
+
+
+class StoredFile(Base):
+    """Fichier adressé par son contenu (SHA-256), partagé entre produits"""
+    __tablename__ = "stored_files"
+
+    content_hash = Column(String(64), primary_key=True)
+    storage_key = Column(String(255), unique=True, nullable=False)
+    taille = Column(Integer, nullable=False)
+    content_type = Column(String(50))
+    ref_count = Column(Integer, nullable=False, default=0)
+    date_creation = Column(DateTime, default=datetime.utcnow)
+    date_maj = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StoredFile(key='{self.storage_key}', refs={self.ref_count})>"
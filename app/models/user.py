@@ -21,6 +21,8 @@ class User(Base):
     mot_de_passe = Column(String(255), nullable=False)
     role = Column(Enum(UserRole), default=UserRole.CLIENT)
     date_creation = Column(DateTime, default=datetime.utcnow)
+    # Incrémenté à chaque changement de droits : invalide les tokens existants
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # ✅ Un vendeur peut avoir plusieurs produits
     products = relationship("Product", back_populates="seller", cascade="all, delete-orphan")
@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Form, File, UploadFile
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from app.database import get_db
 from app import models
-from app.utils.security import get_current_user, require_role
-from uuid import uuid4
-import shutil, os
+from app.utils.security import get_current_principal, require_role, revoke_tokens
+from functools import partial
+import os
 from app.utils.images import get_image_url
+from app.utils import image_pipeline
+from app.utils.uploads import StoredUpload, product_image_upload
+from app.utils.db_pool import all_pool_stats
+from app.utils.cart_store import cart_store
+from app.utils.reservations import reservations
+from app.utils.idempotency import idempotency_store
+from app.utils.query_budget import QUERY_BUDGET_MODE, query_report
+from app.utils.product_import import import_response, import_status, start_import
+from app.utils.storage import store_upload, delete_legacy_file, collect_garbage, recount_references
+from app.utils.review_stats import rebuild_review_stats, remove_user_reviews
+from app.utils.search import product_index
+from app.utils.cache import catalog_cache, invalidate_product, invalidate_categories, invalidate_catalog
+from app.utils.pagination import Keyset, PageParams, page_params, paginate, attr_key
+from app.utils.export import ExportParams, export_params, export_response, date_range_filters
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "uploads/products"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # =============================
 # 🔐 Vérification rôle admin
@@ -20,22 +34,67 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 def check_admin(user):
     require_role(user, ["ADMIN"])
 
+# =============================
+# 📄 Ordres de pagination (plus récents d'abord)
+# =============================
+USERS_KEYSET = Keyset("admin_users", models.User.date_creation, models.User.id_user)
+ORDERS_KEYSET = Keyset("admin_orders", models.Order.date_commande, models.Order.id_order)
+PAYMENTS_KEYSET = Keyset("admin_payments", models.Payment.date_paiement, models.Payment.id_payment)
+REVIEWS_KEYSET = Keyset("admin_reviews", models.ProductReview.date_review, models.ProductReview.id_review)
+
+# =============================
+# 📤 Colonnes exportées (ndjson / csv)
+# =============================
+USER_EXPORT_COLUMNS = [
+    models.User.id_user, models.User.nom, models.User.prenom,
+    models.User.email, models.User.role, models.User.date_creation,
+]
+ORDER_EXPORT_COLUMNS = [
+    models.Order.id_order, models.Order.id_user, models.Order.date_commande,
+    models.Order.total, models.Order.statut,
+]
+PAYMENT_EXPORT_COLUMNS = [
+    models.Payment.id_payment, models.Payment.id_order, models.Payment.methode,
+    models.Payment.montant, models.Payment.statut, models.Payment.date_paiement,
+]
+REVIEW_EXPORT_COLUMNS = [
+    models.ProductReview.id_review, models.ProductReview.id_user, models.ProductReview.id_product,
+    models.ProductReview.note, models.ProductReview.commentaire, models.ProductReview.date_review,
+]
+
 # =============================
 # 👥 Gestion des utilisateurs
 # =============================
 @router.get("/users", summary="Lister tous les utilisateurs")
-def list_users(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_users(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+    page: PageParams = Depends(page_params),
+    export: ExportParams = Depends(export_params),
+):
     check_admin(user)
-    return db.query(models.User).all()
+    filters = date_range_filters(models.User.date_creation, export.date_from, export.date_to)
+    if export.streaming:
+        return export_response(
+            export.format, "utilisateurs", USER_EXPORT_COLUMNS, filters, order_by=models.User.id_user
+        )
+    users, next_cursor = paginate(
+        db.query(models.User).filter(*filters), USERS_KEYSET, page, attr_key("date_creation", "id_user")
+    )
+    return {"items": users, "next_cursor": next_cursor}
 
 @router.delete("/users/{id_user}", summary="Supprimer un utilisateur")
-def delete_user(id_user: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_user(id_user: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
     target = db.query(models.User).filter(models.User.id_user == id_user).first()
     if not target:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+    # Ses avis partent en cascade : on les retire d'abord des statistiques
+    remove_user_reviews(db, id_user)
     db.delete(target)
     db.commit()
+    revoke_tokens(id_user)
+    invalidate_catalog()
     return {"message": f"Utilisateur {id_user} supprimé avec succès"}
 
 @router.put("/users/{id_user}/role", summary="Changer le rôle d’un utilisateur")
@@ -43,7 +102,7 @@ def update_user_role(
     id_user: int,
     new_role: str,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_principal)
 ):
     check_admin(user)
     target = db.query(models.User).filter(models.User.id_user == id_user).first()
@@ -52,14 +111,18 @@ def update_user_role(
     if new_role not in ["CLIENT", "VENDEUR", "ADMIN"]:
         raise HTTPException(status_code=400, detail="Rôle invalide")
     target.role = new_role
+    # Les tokens émis avec l'ancien rôle ne sont plus acceptés
+    target.token_version = models.User.token_version + 1
     db.commit()
+    db.refresh(target)
+    revoke_tokens(id_user, target.token_version)
     return {"message": f"Rôle mis à jour vers {new_role} pour {target.nom}"}
 
 # =============================
 # 🏷️ Gestion des catégories
 # =============================
 @router.post("/categories", summary="Ajouter une catégorie")
-def add_category(category: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def add_category(category: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
     new_category = models.Category(
         nom=category["nom"],
@@ -69,10 +132,11 @@ def add_category(category: dict, db: Session = Depends(get_db), user=Depends(get
     db.add(new_category)
     db.commit()
     db.refresh(new_category)
+    invalidate_categories()
     return {"message": "Catégorie créée", "category": new_category}
 
 @router.get("/categories", summary="Lister les catégories")
-def list_categories(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_categories(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
     return db.query(models.Category).all()
 
@@ -81,7 +145,7 @@ def update_category(
     id_category: int,
     update_data: dict,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_principal)
 ):
     check_admin(user)
     category = db.query(models.Category).filter(models.Category.id_category == id_category).first()
@@ -91,16 +155,18 @@ def update_category(
         setattr(category, key, value)
     db.commit()
     db.refresh(category)
+    invalidate_categories()
     return {"message": "Catégorie mise à jour", "category": category}
 
 @router.delete("/categories/{id_category}", summary="Supprimer une catégorie")
-def delete_category(id_category: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_category(id_category: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
     category = db.query(models.Category).filter(models.Category.id_category == id_category).first()
     if not category:
         raise HTTPException(status_code=404, detail="Catégorie introuvable")
     db.delete(category)
     db.commit()
+    invalidate_categories()
     return {"message": "Catégorie supprimée"}
 
 # =============================
@@ -112,7 +178,7 @@ def delete_category(id_category: int, db: Session = Depends(get_db), user=Depend
 # 📦 LISTER TOUS LES PRODUITS
 # =============================
 @router.get("/products", summary="Lister tous les produits (admin)")
-def list_all_products(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_all_products(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
 
     products = (
@@ -162,23 +228,16 @@ def add_product_admin(
     stock: int = Form(0),
     id_category: int = Form(...),
     id_seller: int = Form(None),
-    image_file: UploadFile = File(None),
+    image: StoredUpload | None = Depends(product_image_upload("ADMIN")),
     image_url: str = Form(None),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_principal)
 ):
     check_admin(user)
 
-    # 1 — Upload image locale
-    if image_file:
-        ext = os.path.splitext(image_file.filename)[1]
-        file_name = f"{uuid4()}{ext}"
-        file_path = os.path.join(UPLOAD_DIR, file_name)
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image_file.file, buffer)
-
-        image_path = f"uploads/products/{file_name}"
+    # 1 — Upload image locale (dédupliquée par contenu)
+    if image:
+        image_path = store_upload(db, image)
 
     # 2 — Image externe
     elif image_url:
@@ -201,6 +260,9 @@ def add_product_admin(
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    product_index.index_product(new_product)
+    invalidate_product(new_product.id_product)
+    image_pipeline.submit(image_path, on_done=partial(invalidate_product, new_product.id_product))
 
     return {
         "message": "Produit créé avec succès",
@@ -212,31 +274,51 @@ def add_product_admin(
 # ❌ SUPPRESSION PRODUIT
 # =============================
 @router.delete("/products/{id_product}")
-def delete_product(id_product: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_product(id_product: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
 
     product = db.query(models.Product).filter(models.Product.id_product == id_product).first()
     if not product:
         raise HTTPException(404, "Produit introuvable")
 
-    # Supprimer fichier local si interne
-    if product.image and product.image.startswith("uploads/"):
-        file_path = product.image.replace("uploads/", "uploads/")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    # Supprimer fichier local si interne ; un fichier partagé n'est
+    # supprimé qu'au commit, quand plus aucun produit ne le référence
+    delete_legacy_file(product.image)
 
     db.delete(product)
     db.commit()
+    product_index.remove_product(id_product)
+    invalidate_product(id_product)
 
     return {"message": "Produit supprimé"}
 
+# =============================
+# 📥 Import de produits en masse
+# =============================
+@router.post("/products/import", summary="Importer des produits en masse (CSV ou NDJSON, colonne id_seller)")
+def import_products_admin(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(None, ge=1, le=5000),
+    user=Depends(get_current_principal),
+):
+    check_admin(user)
+    return import_response(*start_import(file, user, format, batch_size))
+
+
+@router.get("/products/import/{job_id}", summary="Suivre un import de produits (admin)")
+def import_status_admin(job_id: str, user=Depends(get_current_principal)):
+    check_admin(user)
+    return import_status(job_id, user)
+
+
 # =============================
 # 🎛️ Filtrage produits admin
 # =============================
 @router.get("/products/filter", summary="Filtrer les produits (par nom, catégorie, vendeur)")
 def filter_products_admin(
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_current_principal),
     search: str = Query(None),
     category_id: int = Query(None),
     seller_id: int = Query(None)
@@ -258,29 +340,128 @@ def filter_products_admin(
 # 🧑‍💼 Liste et validation vendeurs
 # =============================
 @router.get("/sellers", summary="Lister tous les vendeurs")
-def list_all_sellers(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_all_sellers(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
     return db.query(models.User).filter(models.User.role == "VENDEUR").all()
 
 @router.get("/orders", summary="Lister toutes les commandes (admin)")
-def list_all_orders(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_all_orders(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+    page: PageParams = Depends(page_params),
+    export: ExportParams = Depends(export_params),
+):
     check_admin(user)
-    return db.query(models.Order).all()
+    filters = date_range_filters(models.Order.date_commande, export.date_from, export.date_to)
+    if export.streaming:
+        return export_response(
+            export.format, "commandes", ORDER_EXPORT_COLUMNS, filters, order_by=models.Order.id_order
+        )
+    orders, next_cursor = paginate(
+        db.query(models.Order).filter(*filters), ORDERS_KEYSET, page, attr_key("date_commande", "id_order")
+    )
+    return {"items": orders, "next_cursor": next_cursor}
 
 @router.get("/payments", summary="Lister tous les paiements (admin)")
-def list_all_payments(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_all_payments(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+    page: PageParams = Depends(page_params),
+    export: ExportParams = Depends(export_params),
+):
     check_admin(user)
-    return db.query(models.Payment).all()
+    filters = date_range_filters(models.Payment.date_paiement, export.date_from, export.date_to)
+    if export.streaming:
+        return export_response(
+            export.format, "paiements", PAYMENT_EXPORT_COLUMNS, filters, order_by=models.Payment.id_payment
+        )
+    payments, next_cursor = paginate(
+        db.query(models.Payment).filter(*filters), PAYMENTS_KEYSET, page, attr_key("date_paiement", "id_payment")
+    )
+    return {"items": payments, "next_cursor": next_cursor}
 
 @router.get("/reviews", summary="Lister tous les avis (admin)")
-def list_all_reviews(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_all_reviews(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+    page: PageParams = Depends(page_params),
+    export: ExportParams = Depends(export_params),
+):
+    check_admin(user)
+    filters = date_range_filters(models.ProductReview.date_review, export.date_from, export.date_to)
+    if export.streaming:
+        return export_response(
+            export.format, "avis", REVIEW_EXPORT_COLUMNS, filters, order_by=models.ProductReview.id_review
+        )
+    reviews, next_cursor = paginate(
+        db.query(models.ProductReview).filter(*filters), REVIEWS_KEYSET, page, attr_key("date_review", "id_review")
+    )
+    return {"items": reviews, "next_cursor": next_cursor}
+
+@router.post("/reviews/stats/rebuild", summary="Recalculer les statistiques d'avis (admin)")
+def rebuild_reviews_stats(db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    check_admin(user)
+    total = rebuild_review_stats(db)
+    return {"message": "Statistiques d'avis recalculées", "produits": total}
+
+@router.get("/cache/stats", summary="Statistiques du cache catalogue (admin)")
+def cache_stats(user=Depends(get_current_principal)):
+    check_admin(user)
+    return catalog_cache.stats()
+
+@router.delete("/cache", summary="Vider le cache catalogue (admin)")
+def clear_cache(user=Depends(get_current_principal)):
+    check_admin(user)
+    invalidate_catalog()
+    return {"message": "Cache catalogue vidé"}
+
+@router.post("/search/rebuild", summary="Reconstruire l'index de recherche produits (admin)")
+def rebuild_search_index(db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    check_admin(user)
+    product_index.rebuild(db)
+    return {"message": "Index de recherche reconstruit", "produits": len(product_index)}
+
+
+@router.post("/storage/gc", summary="Recompter les références et supprimer les images orphelines (admin)")
+def storage_gc(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     check_admin(user)
-    return db.query(models.ProductReview).all()
+    referenced = recount_references(db)
+    removed = collect_garbage()
+    return {"message": "Stockage nettoyé", "fichiers_references": referenced, "fichiers_supprimes": removed}
 
 
+@router.get("/db/pool", summary="État et mesures des pools de connexions (admin)")
+def db_pool_stats(user=Depends(get_current_principal)):
+    check_admin(user)
+    return all_pool_stats()
+
+
+@router.get("/db/queries", summary="Routes les plus coûteuses en requêtes SQL, N+1 détectés (admin)")
+def db_query_report(user=Depends(get_current_principal), limit: int = Query(20, ge=1, le=200)):
+    check_admin(user)
+    return {"mode": QUERY_BUDGET_MODE, "routes": query_report.top(limit)}
+
+
+@router.get("/carts/store", summary="Paniers en écriture différée : en attente, écritures, échecs (admin)")
+def cart_store_stats(user=Depends(get_current_principal)):
+    check_admin(user)
+    return cart_store.stats()
+
+
+@router.get("/reservations", summary="Réservations de stock du worker : baux, réservations, ruptures (admin)")
+def reservation_stats(user=Depends(get_current_principal)):
+    check_admin(user)
+    return reservations.stats()
+
+
+@router.get("/idempotency", summary="Clés d'idempotence : gardées, en cours, réponses rejouées (admin)")
+def idempotency_stats(user=Depends(get_current_principal)):
+    check_admin(user)
+    return idempotency_store.stats()
+
 
 @router.post("/fix-all-images", summary="Corrige TOUTES les images dans la base")
-def fix_all_images(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def fix_all_images(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     require_role(user, ["ADMIN"])
 
     products = db.query(models.Product).all()
@@ -319,11 +500,12 @@ def fix_all_images(db: Session = Depends(get_db), user=Depends(get_current_user)
         img = img.replace("uploads/uploads/", "uploads/")
 
         if img != original:
-            print(f"{original}  →  {img}")
+            logger.info("Chemin d'image corrigé", extra={"id_product": p.id_product, "avant": original, "apres": img})
             p.image = img
             fixed += 1
 
     if fixed > 0:
         db.commit()
+        invalidate_catalog()
 
     return {"corrigés": fixed}
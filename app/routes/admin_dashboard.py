@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.database import get_db
+from app.database import get_read_db
 from app import models
-from app.utils.security import get_current_user, require_role
+from app.utils.security import get_current_principal, require_role
 from datetime import datetime, timedelta
 from sqlalchemy import func, cast, Date
 
 router = APIRouter()
 
 @router.get("/dashboard", summary="Statistiques globales du site (Admin uniquement)")
-def admin_dashboard(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def admin_dashboard(db: Session = Depends(get_read_db), user=Depends(get_current_principal)):
     require_role(user, ["ADMIN"])
 
     # 👥 Comptes
@@ -68,8 +68,8 @@ def admin_dashboard(db: Session = Depends(get_db), user=Depends(get_current_user
 # ----------------------------------------------------------
 @router.get("/dashboard/daily", summary="Statistiques journalières (Admin uniquement)")
 def daily_stats(
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_principal),
     days: int = 30
 ):
     require_role(user, ["ADMIN"])
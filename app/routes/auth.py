@@ -1,55 +1,80 @@
+import hashlib
+import logging
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from app.database import get_db
 from app import models
-from app.utils.security import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.utils.security import create_access_token, principal_claims, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.utils.passwords import password_service
+from fastapi.concurrency import run_in_threadpool
 from fastapi import Form
 from pydantic import BaseModel
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 class LoginSchema(BaseModel):
     email: str
     password: str
 
+def _find_user(db: Session, email: str):
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is not None:
+        db.expunge(user)
+    # Rend la connexion au pool pendant la vérification bcrypt (voir
+    # security._current_version)
+    db.rollback()
+    return user
+
+
+def _upgrade_hash(db: Session, user: models.User, new_hash: str):
+    db.query(models.User).filter(models.User.id_user == user.id_user).update({"mot_de_passe": new_hash})
+    db.commit()
+    user.mot_de_passe = new_hash
+
+
 @router.post("/login")
-def login(login_data: LoginSchema, db: Session = Depends(get_db)):
+async def login(login_data: LoginSchema, db: Session = Depends(get_db)):
     """
-    Login avec email/mot de passe via JSON
+    Login avec email/mot de passe via JSON.
+    bcrypt tourne dans le pool de processus de password_service (503 si saturé).
     """
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
+    user = await run_in_threadpool(_find_user, db, login_data.email)
 
-    # 🔍 Debug : email non trouvé
+    # 🔍 Email non trouvé
     if not user:
-        print("🚫 Aucun utilisateur trouvé pour :", login_data.email)
+        # Empreinte plutôt que l'adresse saisie : corrèle les essais sans la journaliser
+        email_hash = hashlib.sha256(login_data.email.strip().lower().encode()).hexdigest()[:16]
+        logger.info("Connexion refusée : email inconnu", extra={"email_hash": email_hash})
         raise HTTPException(status_code=401, detail="Identifiants incorrects")
 
-    print("\n=== 🔎 DEBUG LOGIN ===")
-    print("Email reçu :", login_data.email)
-    print("Mot de passe reçu :", login_data.password)
-    print("Hash stocké :", user.mot_de_passe)
-
     # Vérification bcrypt
-    from app.utils.security import verify_password
-    result = verify_password(login_data.password, user.mot_de_passe)
-    print("Résultat de verify_password:", result)
+    result, new_hash = await password_service.verify(login_data.password, user.mot_de_passe)
+    logger.debug("Vérification du mot de passe", extra={"id_user": user.id_user, "resultat": result})
 
     if not result:
-        print("❌ Le mot de passe ne correspond pas.")
+        logger.info("Connexion refusée : mot de passe incorrect", extra={"id_user": user.id_user})
         raise HTTPException(status_code=401, detail="Identifiants incorrects")
 
+    # Coût bcrypt modifié depuis l'enregistrement : on remplace le hash
+    if new_hash:
+        await run_in_threadpool(_upgrade_hash, db, user, new_hash)
+        logger.info("Hash bcrypt recalculé", extra={"id_user": user.id_user})
+
     from datetime import timedelta
     from app.utils.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 
-    token_data = {"sub": str(user.id_user)}
+    # Rôle et identité dans le token : pas de lecture de `users` par requête
+    token_data = principal_claims(user)
     access_token = create_access_token(
         data=token_data,
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
-    print("✅ Connexion réussie :", user.email)
+    logger.info("Connexion réussie", extra={"id_user": user.id_user})
 
     return {
         "access_token": access_token,
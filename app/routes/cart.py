@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app import models
-from app.utils.security import get_current_user
+from app.database import get_db, get_read_db
+from app.schemas.cart_schema import CartBatch, CartResponse
+from app.utils.cart_store import cart_store
+from app.utils.query_budget import query_budget
+from app.utils.security import get_current_principal
 
 router = APIRouter()
 
@@ -10,82 +12,54 @@ router = APIRouter()
 # 🟢 Ajouter un produit au panier
 # =====================================================
 @router.post("/add/{id_product}")
-def add_to_cart(id_product: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    # Vérifier si le panier existe déjà
-    cart = db.query(models.Cart).filter(models.Cart.id_user == user.id_user).first()
-    if not cart:
-        cart = models.Cart(id_user=user.id_user)
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-
-    # Vérifier si le produit est déjà dans le panier
-    item = db.query(models.CartItem).filter(
-        models.CartItem.id_cart == cart.id_cart,
-        models.CartItem.id_product == id_product
-    ).first()
-
-    if item:
-        item.quantite += 1
-    else:
-        item = models.CartItem(id_cart=cart.id_cart, id_product=id_product, quantite=1)
-        db.add(item)
-
-    db.commit()
-    db.refresh(item)
+def add_to_cart(
+    id_product: int,
+    quantite: int = Query(1, ge=1),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+):
+    # Upsert (un seul commit) ou écriture différée selon CART_STORE_BACKEND
+    cart_store.update(db, user.id_user, {id_product: quantite}, merge=True)
     return {"message": "Produit ajouté au panier avec succès ✅"}
 
 
 # =====================================================
-# 🔍 Récupérer le panier complet de l'utilisateur
+# 📦 Modifier plusieurs articles en une fois
 # =====================================================
-@router.get("/")
-def get_cart(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    cart = db.query(models.Cart).filter(models.Cart.id_user == user.id_user).first()
-    if not cart:
-        return {"items": [], "total": 0.0}
+@router.post("/batch", response_model=CartResponse)
+def update_cart(batch: CartBatch, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    """
+    mode=set : fixe les quantités (0 retire l'article).
+    mode=merge : ajoute les quantités (fusion du panier invité à la connexion).
+    Une seule transaction ; retourne le panier mis à jour.
+    """
+    merge = batch.mode == "merge"
+    quantities: dict[int, int] = {}
+    for line in batch.items:
+        # Produit répété : la dernière quantité l'emporte (set) ou elles s'additionnent (merge)
+        quantities[line.id_product] = quantities.get(line.id_product, 0) * merge + line.quantite
+
+    cart_store.update(db, user.id_user, quantities, merge=merge)
+    return cart_store.read(db, user.id_user)
 
-    items = db.query(models.CartItem).filter(models.CartItem.id_cart == cart.id_cart).all()
 
-    results = []
-    total = 0.0
-
-    for item in items:
-        product = db.query(models.Product).filter(models.Product.id_product == item.id_product).first()
-        if product:
-            subtotal = float(product.prix) * item.quantite
-            total += subtotal
-            results.append({
-                "id_product": product.id_product,
-                "quantite": item.quantite,
-                "product": {
-                    "nom": product.nom,
-                    "prix": float(product.prix),
-                    "image": product.image
-                }
-            })
-
-    return {"items": results, "total": round(total, 2)}
+# =====================================================
+# 🔍 Récupérer le panier complet de l'utilisateur
+# =====================================================
+@router.get("/", response_model=CartResponse)
+@query_budget(2)
+def get_cart(db: Session = Depends(get_read_db), user=Depends(get_current_principal)):
+    return cart_store.read(db, user.id_user)
 
 
 # =====================================================
 # ❌ Supprimer un article du panier
 # =====================================================
 @router.delete("/remove/{id_product}")
-def remove_from_cart(id_product: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    cart = db.query(models.Cart).filter(models.Cart.id_user == user.id_user).first()
-    if not cart:
+def remove_from_cart(id_product: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    removed = cart_store.remove(db, user.id_user, id_product)
+    if removed is None:
         raise HTTPException(status_code=404, detail="Panier introuvable")
-
-    item = db.query(models.CartItem).filter(
-        models.CartItem.id_cart == cart.id_cart,
-        models.CartItem.id_product == id_product
-    ).first()
-
-    if not item:
+    if not removed:
         raise HTTPException(status_code=404, detail="Article introuvable dans le panier")
-
-    db.delete(item)
-    db.commit()
     return {"message": "Article supprimé du panier 🗑️"}
-
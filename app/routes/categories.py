@@ -1,30 +1,123 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import ASYNC_READ_ROUTES, get_async_db, get_read_db
 from app import models
+from app.utils.cache import catalog_cache, cached, cached_async
+from app.utils.http_cache import conditional, versioned
+from app.utils.pagination import Keyset, PageParams, page_params, paginate, paginate_async, attr_key
 
 router = APIRouter()
 
+PRODUCTS_KEYSET = Keyset("category_products", models.Product.date_creation, models.Product.id_product)
+
+
+def _categories_entry(categories) -> dict:
+    body = [
+        {
+            "id_category": c.id_category,
+            "nom": c.nom,
+            "description": c.description,
+            "image": c.image,
+        }
+        for c in categories
+    ]
+    return versioned(body, [(c.id_category, c.date_modification) for c in categories])
+
+
+def _category_products_entry(category, products, next_cursor) -> dict:
+    body = {
+        "categorie": category.nom,
+        "produits": products,
+        "next_cursor": next_cursor
+    }
+    validators = (
+        (category.id_category, category.date_modification),
+        [(p.id_product, p.date_modification or p.date_creation) for p in products],
+        next_cursor,
+    )
+    return versioned(body, validators)
+
+
 # --------------------------------------
 # 📦 Lister toutes les catégories
 # --------------------------------------
-@router.get("/", summary="Lister toutes les catégories")
-def list_categories(db: Session = Depends(get_db)):
-    categories = db.query(models.Category).all()
-    return categories
+def list_categories(request: Request, response: Response, db: Session = Depends(get_read_db)):
+
+    def load():
+        return _categories_entry(db.query(models.Category).all())
+
+    return conditional(request, response, cached(catalog_cache, "categories:list", load))
 
 
 # --------------------------------------
 # 🔍 Obtenir les produits d’une catégorie
 # --------------------------------------
-@router.get("/{id_category}/products", summary="Lister les produits d'une catégorie")
-def get_products_by_category(id_category: int, db: Session = Depends(get_db)):
+def get_products_by_category(
+    id_category: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    page: PageParams = Depends(page_params),
+):
     category = db.query(models.Category).filter(models.Category.id_category == id_category).first()
     if not category:
         raise HTTPException(status_code=404, detail="Catégorie introuvable")
 
-    products = db.query(models.Product).filter(models.Product.id_category == id_category).all()
-    return {
-        "categorie": category.nom,
-        "produits": products
-    }
+    products, next_cursor = paginate(
+        db.query(models.Product).filter(models.Product.id_category == id_category),
+        PRODUCTS_KEYSET,
+        page,
+        attr_key("date_creation", "id_product"),
+    )
+    return conditional(request, response, _category_products_entry(category, products, next_cursor))
+
+
+# --------------------------------------
+# ⚡ Versions async (AsyncSession)
+# --------------------------------------
+async def list_categories_async(request: Request, response: Response, db=Depends(get_async_db)):
+
+    async def load():
+        return _categories_entry((await db.execute(select(models.Category))).scalars().all())
+
+    return conditional(request, response, await cached_async(catalog_cache, "categories:list", load))
+
+
+async def get_products_by_category_async(
+    id_category: int,
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    page: PageParams = Depends(page_params),
+):
+    category = await db.get(models.Category, id_category)
+    if not category:
+        raise HTTPException(status_code=404, detail="Catégorie introuvable")
+
+    products, next_cursor = await paginate_async(
+        db,
+        select(models.Product).filter(models.Product.id_category == id_category),
+        PRODUCTS_KEYSET,
+        page,
+        attr_key("date_creation", "id_product"),
+        scalars=True,
+    )
+    return conditional(request, response, _category_products_entry(category, products, next_cursor))
+
+
+# --------------------------------------
+# 🚦 Enregistrement : version sync ou async selon ASYNC_READ_ROUTES
+# --------------------------------------
+router.add_api_route(
+    "/",
+    list_categories_async if ASYNC_READ_ROUTES else list_categories,
+    methods=["GET"],
+    summary="Lister toutes les catégories",
+)
+router.add_api_route(
+    "/{id_category}/products",
+    get_products_by_category_async if ASYNC_READ_ROUTES else get_products_by_category,
+    methods=["GET"],
+    summary="Lister les produits d'une catégorie",
+)
@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+import os
+from app.database import engine
+from app.utils.db_pool import all_pool_stats, pool_stats
+from app.utils.metrics import render_metrics
+
+router = APIRouter(tags=["Health"])
+
+# Au-delà de cette saturation du pool, l'instance se déclare non prête
+# (le répartiteur de charge arrête de lui envoyer du trafic)
+READY_MAX_SATURATION = float(os.getenv("READY_MAX_SATURATION", "1.0"))
+
+
+# ==========================================================
+# 💓 LIVENESS : le processus répond (aucun accès base)
+# ==========================================================
+@router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+
+# ==========================================================
+# 🚦 READINESS : base joignable et pool non saturé
+# ==========================================================
+@router.get("/health/ready")
+def readiness():
+    pool = pool_stats()
+    # Saturation jugée sur le primaire ; réplicas et moteurs async pour information
+    body = {"status": "ok", "pool": pool, "pools": all_pool_stats()}
+
+    if pool and pool["saturation"] >= READY_MAX_SATURATION:
+        # Pas d'emprunt supplémentaire : on attendrait DB_POOL_TIMEOUT
+        body["status"] = "saturated"
+        return JSONResponse(body, status_code=503)
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        body.update(status="unavailable", error=str(e))
+        return JSONResponse(body, status_code=503)
+
+    return body
+
+
+# Ancienne URL, conservée pour les moniteurs existants
+@router.get("/health/db")
+def check_database_connection():
+    return readiness()
+
+
+# ==========================================================
+# 📈 MÉTRIQUES (format texte Prometheus)
+# ==========================================================
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    # async : lu depuis la boucle, sans attendre un thread libre
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,35 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session, selectinload
 from app.database import get_db
 from app import models
-from app.schemas.order_schema import OrderCreate, OrderResponse, OrderItemResponse
+from app.schemas.order_schema import OrderCreate, OrderResponse, OrderPage
+from app.utils.pagination import Keyset, PageParams, page_params, paginate, attr_key
+from app.utils.checkout import place_order
+from app.utils.idempotency import IdempotentRoute, idempotent
+from app.utils.query_budget import query_budget
+from app.utils.security import get_current_principal
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
-@router.post("/", response_model=OrderResponse)
-def create_order(order: OrderCreate, db: Session = Depends(get_db)):
-    new_order = models.Order(
-        id_user=1,  # (à remplacer plus tard par l'utilisateur connecté)
-        total=order.total
-    )
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+ORDERS_KEYSET = Keyset("orders", models.Order.date_commande, models.Order.id_order)
 
-    for item in order.items:
-        order_item = models.OrderItem(
-            id_order=new_order.id_order,
-            id_product=item.id_product,
-            quantite=item.quantite,
-            prix_unitaire=item.prix_unitaire,
-        )
-        db.add(order_item)
+@router.post("/", response_model=OrderResponse)
+@idempotent
+def create_order(
+    order: OrderCreate | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+):
+    """
+    Valide le panier de l'utilisateur (ou les articles fournis) : prix relus
+    en base, stock décrémenté, le tout en une transaction. 409 si un
+    produit n'a plus assez de stock.
+    Avec un en-tête Idempotency-Key, une répétition rejoue la première réponse.
+    """
+    quantities = None
+    if order is not None and order.items is not None:
+        quantities = {}
+        for item in order.items:
+            quantities[item.id_product] = quantities.get(item.id_product, 0) + item.quantite
 
-    db.commit()
-    db.refresh(new_order)
-    return new_order
+    id_order = place_order(db, user.id_user, quantities)
+    created = db.get(models.Order, id_order, options=[selectinload(models.Order.items)])
+    return OrderResponse.model_validate(created)
 
-@router.get("/", response_model=list[OrderResponse])
-def list_orders(db: Session = Depends(get_db)):
-    orders = db.query(models.Order).all()
-    return orders
+@router.get("/", response_model=OrderPage)
+@query_budget(2)
+def list_orders(db: Session = Depends(get_db), page: PageParams = Depends(page_params)):
+    # items chargés en une requête IN (sinon une requête par commande à la sérialisation)
+    orders, next_cursor = paginate(
+        db.query(models.Order).options(selectinload(models.Order.items)),
+        ORDERS_KEYSET,
+        page,
+        attr_key("date_commande", "id_order"),
+    )
+    return {"items": orders, "next_cursor": next_cursor}
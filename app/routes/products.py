@@ -1,14 +1,145 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from app.database import get_db
+from app.database import ASYNC_READ_ROUTES, SessionLocal, get_async_db, get_db, get_read_db
 from app import models
-from app.schemas.product_schema import ProductCreate, ProductResponse
-from app.utils.images import get_image_url
+from app.schemas.product_schema import ProductCreate, ProductResponse, ProductPage
+from app.utils.images import get_image_url, get_image_variants
+from app.utils.pagination import (
+    Keyset, PageParams, page_params, paginate, paginate_async, paginate_ranked, paginate_ranked_async,
+)
+from app.utils.search import product_index, tokenize
+from app.utils.cache import catalog_cache, cached, cached_async, invalidate_product
+from app.utils.http_cache import conditional, versioned
+from app.utils.query_budget import query_budget
 
 router = APIRouter(tags=["Products"])
 
 
+# ==========================================================
+# 📊 Lecture catalogue : produit + stats d'avis + vendeur en une requête
+# ==========================================================
+def _catalog_query(db: Session):
+    return (
+        db.query(
+            models.Product,
+            models.ProductReviewStats,
+            models.User.prenom.label("seller_prenom"),
+            models.User.nom.label("seller_nom"),
+        )
+        .outerjoin(
+            models.ProductReviewStats,
+            models.ProductReviewStats.id_product == models.Product.id_product,
+        )
+        .outerjoin(models.User, models.User.id_user == models.Product.id_seller)
+    )
+
+
+def _catalog_select():
+    """Même lecture que _catalog_query, en select() pour AsyncSession"""
+    return (
+        select(
+            models.Product,
+            models.ProductReviewStats,
+            models.User.prenom.label("seller_prenom"),
+            models.User.nom.label("seller_nom"),
+        )
+        .outerjoin(
+            models.ProductReviewStats,
+            models.ProductReviewStats.id_product == models.Product.id_product,
+        )
+        .outerjoin(models.User, models.User.id_user == models.Product.id_seller)
+    )
+
+
+# Produits les plus récents d'abord
+PRODUCTS_KEYSET = Keyset("products", models.Product.date_creation, models.Product.id_product)
+
+
+def _row_key(row):
+    return row[0].date_creation, row[0].id_product
+
+
+def _row_version(row):
+    """Version d'un produit affiché : ligne produit + stats d'avis"""
+    p, stats = row[0], row[1]
+    return (
+        p.id_product,
+        p.date_modification or p.date_creation,
+        stats.nb_reviews if stats else 0,
+        stats.somme_notes if stats else 0,
+    )
+
+
+def _versioned_page(rows, next_cursor) -> dict:
+    items = [_serialize_product(row) for row in rows]
+    validators = [(_row_version(row), item["image_variants"]) for row, item in zip(rows, items)]
+    return versioned({"items": items, "next_cursor": next_cursor}, (validators, next_cursor))
+
+
+def _product_page(query, params: PageParams) -> dict:
+    return _versioned_page(*paginate(query, PRODUCTS_KEYSET, params, _row_key))
+
+
+async def _product_page_async(db, stmt, params: PageParams) -> dict:
+    rows, next_cursor = await paginate_async(db, stmt, PRODUCTS_KEYSET, params, _row_key)
+    # Sérialisation (variantes d'images lues sur disque) hors de la boucle d'événements
+    return await run_in_threadpool(_versioned_page, rows, next_cursor)
+
+
+def _product_entry(row):
+    """Entrée de cache d'une fiche produit (None si absent)"""
+    if not row:
+        return None
+    p, item = row[0], _serialize_product(row)
+    return versioned(
+        item,
+        (_row_version(row), item["image_variants"]),
+        p.date_modification or p.date_creation,
+    )
+
+
+def _filter_products(query, category_id, min_price, max_price):
+    """Filtres de /search, valables sur un Query comme sur un select()"""
+    if category_id:
+        query = query.filter(models.Product.id_category == category_id)
+    if min_price is not None:
+        query = query.filter(models.Product.prix >= min_price)
+    if max_price is not None:
+        query = query.filter(models.Product.prix <= max_price)
+    return query
+
+
+def _refresh_search_index():
+    db = SessionLocal()
+    try:
+        product_index.ensure_ready(db)
+    finally:
+        db.close()
+
+
+def _serialize_product(row) -> dict:
+    p, stats, seller_prenom, seller_nom = row
+    avg = stats.note_moyenne if stats else None
+    return {
+        "id_product": p.id_product,
+        "nom": p.nom,
+        "description": p.description,
+        "prix": p.prix,
+        "stock": p.stock,
+        "image": p.image,
+        "id_category": p.id_category,
+        "id_seller": p.id_seller,
+        "date_creation": p.date_creation,
+        "note_moyenne": round(avg or 5, 2),
+        "nb_reviews": stats.nb_reviews if stats else 0,
+        "vendeur_nom": f"{seller_prenom} {seller_nom}" if seller_nom else None,
+        "image_url": get_image_url(p.image),
+        "image_variants": get_image_variants(p.image),
+    }
+
+
 # ==========================================================
 # 🔧 ROUTES DEBUG (doivent être AVANT TOUTES LES DYNAMIQUES)
 # ==========================================================
@@ -43,7 +174,8 @@ def debug_single(id_product: int, db: Session = Depends(get_db)):
 
     return {
         "image_bdd": p.image,
-        "image_url": get_image_url(p.image)
+        "image_url": get_image_url(p.image),
+        "image_variants": get_image_variants(p.image),
     }
 
 
@@ -56,138 +188,209 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    product_index.index_product(new_product)
+    invalidate_product(new_product.id_product)
     return new_product
 
 
 # ==========================================================
 # 🟢 LISTE DE TOUS LES PRODUITS
 # ==========================================================
-@router.get("/", response_model=list[ProductResponse])
-def list_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-    results = []
-
-    for p in products:
-        avg = db.query(func.avg(models.ProductReview.note)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
-
-        count = db.query(func.count(models.ProductReview.id_review)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
-
-        p.image_url = get_image_url(p.image)
-        p.note_moyenne = round(avg or 5, 2)
-        p.nb_reviews = count
-
-        results.append(p)
-
-    return results
+@query_budget(2)
+def list_products(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    page: PageParams = Depends(page_params),
+):
+    entry = cached(
+        catalog_cache,
+        f"products:list:{page.cursor}:{page.limit}",
+        lambda: _product_page(_catalog_query(db), page),
+    )
+    return conditional(request, response, entry)
 
 
 # ==========================================================
 # 🔍 RECHERCHE & FILTRAGE
 # ==========================================================
-@router.get("/search", response_model=list[ProductResponse])
+@query_budget(3)
 def search_products(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    page: PageParams = Depends(page_params),
     q: str = Query(None),
     category_id: int = Query(None),
     min_price: float = Query(None),
     max_price: float = Query(None),
 ):
-    query = db.query(models.Product)
-
-    if q:
-        query = query.filter(
-            or_(
-                func.lower(models.Product.nom).like(f"%{q.lower()}%"),
-                func.lower(models.Product.description).like(f"%{q.lower()}%")
-            )
-        )
+    query = _filter_products(_catalog_query(db), category_id, min_price, max_price)
 
-    if category_id:
-        query = query.filter(models.Product.id_category == category_id)
+    if q and tokenize(q):
+        # 🏆 Classement par pertinence (index inversé), filtres appliqués en base
+        product_index.ensure_ready(db)
 
-    if min_price is not None:
-        query = query.filter(models.Product.prix >= min_price)
+        def fetch(ids):
+            rows = query.filter(models.Product.id_product.in_(ids)).all()
+            return {row[0].id_product: row for row in rows}
 
-    if max_price is not None:
-        query = query.filter(models.Product.prix <= max_price)
+        entry = _versioned_page(*paginate_ranked(product_index.search(q), page, fetch))
+    else:
+        entry = _product_page(query, page)
 
-    products = query.all()
-    results = []
+    return conditional(request, response, entry)
 
-    for p in products:
-        avg = db.query(func.avg(models.ProductReview.note)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
 
-        count = db.query(func.count(models.ProductReview.id_review)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
+# ==========================================================
+# 🌍 PRODUITS PAR CATÉGORIE
+# ==========================================================
+@query_budget(2)
+def list_products_by_category(
+    id_category: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    page: PageParams = Depends(page_params),
+):
+    entry = cached(
+        catalog_cache,
+        f"products:category:{id_category}:{page.cursor}:{page.limit}",
+        lambda: _product_page(
+            _catalog_query(db).filter(models.Product.id_category == id_category),
+            page,
+        ),
+    )
+
+    if not entry["body"]["items"] and not page.cursor:
+        raise HTTPException(404, "Aucun produit trouvé dans cette catégorie")
+
+    return conditional(request, response, entry)
 
-        p.image_url = get_image_url(p.image)
-        p.note_moyenne = round(avg or 5, 2)
-        p.nb_reviews = count
-        p.vendeur_nom = f"{p.seller.prenom} {p.seller.nom}" if p.seller else None
 
-        results.append(p)
+# ==========================================================
+# 🟢 DETAIL PRODUIT (À METTRE EN DERNIER !)
+# ==========================================================
+@query_budget(1)
+def get_product(
+    id_product: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+):
 
-    return results
+    def load():
+        return _product_entry(_catalog_query(db).filter(models.Product.id_product == id_product).first())
+
+    entry = cached(catalog_cache, f"product:{id_product}", load)
+
+    if not entry:
+        raise HTTPException(404, "Produit non trouvé")
+
+    return conditional(request, response, entry)
 
 
 # ==========================================================
-# 🌍 PRODUITS PAR CATÉGORIE
+# ⚡ VERSIONS ASYNC (AsyncSession) — mêmes clés de cache et mêmes ETag
 # ==========================================================
-@router.get("/public/category/{id_category}", response_model=list[ProductResponse])
-def list_products_by_category(id_category: int, db: Session = Depends(get_db)):
+@query_budget(2)
+async def list_products_async(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    page: PageParams = Depends(page_params),
+):
+    entry = await cached_async(
+        catalog_cache,
+        f"products:list:{page.cursor}:{page.limit}",
+        lambda: _product_page_async(db, _catalog_select(), page),
+    )
+    return conditional(request, response, entry)
+
+
+@query_budget(3)
+async def search_products_async(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    page: PageParams = Depends(page_params),
+    q: str = Query(None),
+    category_id: int = Query(None),
+    min_price: float = Query(None),
+    max_price: float = Query(None),
+):
+    stmt = _filter_products(_catalog_select(), category_id, min_price, max_price)
 
-    products = db.query(models.Product).filter(
-        models.Product.id_category == id_category
-    ).all()
+    if q and tokenize(q):
+        if not product_index.is_fresh():
+            await run_in_threadpool(_refresh_search_index)
 
-    if not products:
-        raise HTTPException(404, "Aucun produit trouvé dans cette catégorie")
+        async def fetch(ids):
+            rows = (await db.execute(stmt.filter(models.Product.id_product.in_(ids)))).all()
+            return {row[0].id_product: row for row in rows}
 
-    for p in products:
-        avg = db.query(func.avg(models.ProductReview.note)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
+        # Classement BM25 et sérialisation : CPU et disque, hors de la boucle d'événements
+        ranked = await run_in_threadpool(product_index.search, q)
+        rows, next_cursor = await paginate_ranked_async(ranked, page, fetch)
+        entry = await run_in_threadpool(_versioned_page, rows, next_cursor)
+    else:
+        entry = await _product_page_async(db, stmt, page)
 
-        count = db.query(func.count(models.ProductReview.id_review)).filter(
-            models.ProductReview.id_product == p.id_product
-        ).scalar()
+    return conditional(request, response, entry)
 
-        p.image_url = get_image_url(p.image)
-        p.note_moyenne = round(avg or 5, 2)
-        p.nb_reviews = count
 
-    return products
+@query_budget(2)
+async def list_products_by_category_async(
+    id_category: int,
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    page: PageParams = Depends(page_params),
+):
+    entry = await cached_async(
+        catalog_cache,
+        f"products:category:{id_category}:{page.cursor}:{page.limit}",
+        lambda: _product_page_async(
+            db, _catalog_select().filter(models.Product.id_category == id_category), page
+        ),
+    )
+
+    if not entry["body"]["items"] and not page.cursor:
+        raise HTTPException(404, "Aucun produit trouvé dans cette catégorie")
 
+    return conditional(request, response, entry)
 
-# ==========================================================
-# 🟢 DETAIL PRODUIT (À METTRE EN DERNIER !)
-# ==========================================================
-@router.get("/{id_product}", response_model=ProductResponse)
-def get_product(id_product: int, db: Session = Depends(get_db)):
-    p = db.query(models.Product).filter(models.Product.id_product == id_product).first()
 
-    if not p:
-        raise HTTPException(404, "Produit non trouvé")
+@query_budget(1)
+async def get_product_async(
+    id_product: int,
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+):
 
-    avg = db.query(func.avg(models.ProductReview.note)).filter(
-        models.ProductReview.id_product == id_product
-    ).scalar()
+    async def load():
+        result = await db.execute(_catalog_select().filter(models.Product.id_product == id_product))
+        return await run_in_threadpool(_product_entry, result.first())
 
-    count = db.query(func.count(models.ProductReview.id_review)).filter(
-        models.ProductReview.id_product == id_product
-    ).scalar()
+    entry = await cached_async(catalog_cache, f"product:{id_product}", load)
 
-    p.image_url = get_image_url(p.image)
-    p.note_moyenne = round(avg or 5, 2)
-    p.nb_reviews = count
-    p.vendeur_nom = f"{p.seller.prenom} {p.seller.nom}" if p.seller else None
+    if not entry:
+        raise HTTPException(404, "Produit non trouvé")
+
+    return conditional(request, response, entry)
 
-    return p
 
+# ==========================================================
+# 🚦 Routes de lecture : version sync ou async selon ASYNC_READ_ROUTES
+# (enregistrées en dernier : /{id_product} doit rester après les routes debug)
+# ==========================================================
+for path, sync_route, async_route, model in (
+    ("/", list_products, list_products_async, ProductPage),
+    ("/search", search_products, search_products_async, ProductPage),
+    ("/public/category/{id_category}", list_products_by_category, list_products_by_category_async, ProductPage),
+    ("/{id_product}", get_product, get_product_async, ProductResponse),
+):
+    router.add_api_route(
+        path, async_route if ASYNC_READ_ROUTES else sync_route, methods=["GET"], response_model=model
+    )
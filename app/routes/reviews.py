@@ -1,13 +1,18 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import ASYNC_READ_ROUTES, get_async_db, get_db, get_read_db
 from app import models
-from app.utils.security import get_current_user, require_role
-from sqlalchemy import func
+from app.utils.security import get_current_principal, require_role
 from datetime import datetime
+from app.utils.cache import invalidate_product
+from app.utils.review_stats import apply_review_change, get_stats, NOTE_MIN, NOTE_MAX
 
 router = APIRouter(tags=["Reviews"])
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -19,10 +24,14 @@ def add_or_update_review(
     id_product: int,
     review: dict,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_principal)
 ):
     require_role(user, ["CLIENT"])
 
+    note = review.get("note", 5)
+    if isinstance(note, bool) or not isinstance(note, int) or not NOTE_MIN <= note <= NOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"La note doit être comprise entre {NOTE_MIN} et {NOTE_MAX}")
+
     product = db.query(models.Product).filter(models.Product.id_product == id_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
@@ -33,33 +42,32 @@ def add_or_update_review(
     ).first()
 
     if existing:
-        existing.note = review.get("note", 5)
+        old_note = existing.note
+        existing.note = note
         existing.commentaire = review.get("commentaire", "")
         existing.date_review = datetime.now()
-        db.commit()
-        db.refresh(existing)
         message = "Avis mis à jour avec succès ✅"
         review_obj = existing
     else:
-        new_review = models.ProductReview(
+        old_note = None
+        review_obj = models.ProductReview(
             id_user=user.id_user,
             id_product=id_product,
             commentaire=review.get("commentaire", ""),
-            note=review.get("note", 5)
+            note=note
         )
-        db.add(new_review)
-        db.commit()
-        db.refresh(new_review)
+        db.add(review_obj)
         message = "Avis ajouté avec succès ✅"
-        review_obj = new_review
-
-    avg_note = (
-        db.query(func.avg(models.ProductReview.note))
-        .filter(models.ProductReview.id_product == id_product)
-        .scalar()
-    )
-    product.note_moyenne = round(avg_note or 5, 2)
+
+    # 📊 Avis + statistiques dans la même transaction
+    db.flush()
+    apply_review_change(db, id_product, old_note=old_note, new_note=note)
+    stats = get_stats(db, id_product)
+    product.note_moyenne = round(stats.note_moyenne or 5, 2)
+    product.date_modification = datetime.utcnow()
     db.commit()
+    db.refresh(review_obj)
+    invalidate_product(id_product)
 
     return {
         "message": message,
@@ -73,31 +81,18 @@ def add_or_update_review(
     }
 
 
-# ------------------------------------
-# 🌍 Lister les avis d’un produit
-# ------------------------------------
-@router.get("/product/{id_product}", summary="Lister les avis d’un produit (public)")
-def list_product_reviews(id_product: int, db: Session = Depends(get_db)):
-    print("🧩 DEBUG — ID produit reçu :", id_product)  # ✅ ICI, à l’intérieur de la fonction
-
-    product = db.query(models.Product).filter(models.Product.id_product == id_product).first()
-    print("📦 DEBUG — Produit trouvé :", product)
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Produit introuvable")
-
-    reviews = db.query(models.ProductReview).filter(models.ProductReview.id_product == id_product).all()
-
-    average_note = (
-        db.query(func.avg(models.ProductReview.note))
-        .filter(models.ProductReview.id_product == id_product)
-        .scalar()
-    )
+def _reviews_body(product, stats, reviews) -> dict:
+    if stats:
+        average_note = stats.note_moyenne
+    else:
+        # Statistiques pas encore construites pour ce produit
+        average_note = sum(r.note for r in reviews) / len(reviews) if reviews else None
 
     return {
         "produit": product.nom,
         "note_moyenne": round(average_note or 5, 2),
         "nombre_avis": len(reviews),
+        "repartition": stats.histogramme if stats else None,
         "avis": [
             {
                 "note": r.note,
@@ -106,4 +101,41 @@ def list_product_reviews(id_product: int, db: Session = Depends(get_db)):
                 "date": r.date_review
             } for r in reviews
         ]
-    }
\ No newline at end of file
+    }
+
+
+# ------------------------------------
+# 🌍 Lister les avis d’un produit
+# ------------------------------------
+def list_product_reviews(id_product: int, db: Session = Depends(get_read_db)):
+    product = db.query(models.Product).filter(models.Product.id_product == id_product).first()
+    logger.debug("Avis demandés", extra={"id_product": id_product, "trouve": product is not None})
+
+    if not product:
+        raise HTTPException(status_code=404, detail="Produit introuvable")
+
+    reviews = db.query(models.ProductReview).filter(models.ProductReview.id_product == id_product).all()
+    return _reviews_body(product, product.review_stats, reviews)
+
+
+async def list_product_reviews_async(id_product: int, db=Depends(get_async_db)):
+    product = await db.get(models.Product, id_product)
+    logger.debug("Avis demandés", extra={"id_product": id_product, "trouve": product is not None})
+
+    if not product:
+        raise HTTPException(status_code=404, detail="Produit introuvable")
+
+    reviews = (
+        await db.execute(select(models.ProductReview).filter(models.ProductReview.id_product == id_product))
+    ).scalars().all()
+    stats = await db.get(models.ProductReviewStats, id_product)
+    return _reviews_body(product, stats, reviews)
+
+
+# Version sync ou async selon ASYNC_READ_ROUTES
+router.add_api_route(
+    "/product/{id_product}",
+    list_product_reviews_async if ASYNC_READ_ROUTES else list_product_reviews,
+    methods=["GET"],
+    summary="Lister les avis d’un produit (public)",
+)
@@ -2,14 +2,14 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func, cast, Date
 from datetime import datetime, timedelta
-from app.database import get_db
+from app.database import get_read_db
 from app import models
-from app.utils.security import get_current_user, require_role
+from app.utils.security import get_current_principal, require_role
 
 router = APIRouter()
 
 @router.get("/dashboard", summary="Bilan complet du vendeur connecté")
-def seller_dashboard(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def seller_dashboard(db: Session = Depends(get_read_db), user=Depends(get_current_principal)):
     require_role(user, ["VENDEUR"])
 
     # 🛍️ Nombre total de produits
@@ -35,8 +35,8 @@ def seller_dashboard(db: Session = Depends(get_db), user=Depends(get_current_use
 
     # ⭐ Note moyenne globale sur ses produits
     avg_rating = (
-        db.query(func.avg(models.Review.note))
-        .join(models.Product, models.Review.id_product == models.Product.id_product)
+        db.query(func.avg(models.ProductReview.note))
+        .join(models.Product, models.ProductReview.id_product == models.Product.id_product)
         .filter(models.Product.id_seller == user.id_user)
         .scalar()
     )
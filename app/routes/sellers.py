@@ -2,19 +2,23 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models
-from app.utils.security import get_current_user, require_role
+from app.utils.security import get_current_user, get_current_principal, require_role
 from fastapi import Query
 from sqlalchemy import or_
-import shutil, os
-from fastapi import Form, UploadFile, File
-from uuid import uuid4
+import os
+from fastapi import Form, File, UploadFile
+from functools import partial
 from app.utils.images import get_image_url
+from app.utils import image_pipeline
+from app.utils.uploads import StoredUpload, product_image_upload
+from app.utils.storage import store_upload, delete_legacy_file
+from app.utils.search import product_index
+from app.utils.cache import invalidate_product
+from app.utils.product_import import import_response, import_status, start_import
+from app.utils.reservations import reservations
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads/products"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 
 # ------------------------------------
 # 👤 Informations vendeur
@@ -35,7 +39,7 @@ def get_my_info(user=Depends(get_current_user)):
 # 🛍️ Produits du vendeur
 # ------------------------------------
 @router.get("/products")
-def list_my_products(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def list_my_products(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     require_role(user, ["VENDEUR"])
 
     products = db.query(models.Product).filter(
@@ -58,23 +62,16 @@ def add_product_seller(
     description: str = Form(None),
     stock: int = Form(0),
     id_category: int = Form(...),
-    image_file: UploadFile = File(None),
+    image: StoredUpload | None = Depends(product_image_upload("VENDEUR")),
     image_url: str = Form(None),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_current_principal),
 ):
     require_role(user, ["VENDEUR"])
 
-    # Upload local
-    if image_file:
-        ext = os.path.splitext(image_file.filename)[1]
-        file_name = f"{uuid4()}{ext}"
-        file_path = os.path.join(UPLOAD_DIR, file_name)
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image_file.file, buffer)
-
-        image_path = f"uploads/products/{file_name}"
+    # Upload local (dédupliqué par contenu)
+    if image:
+        image_path = store_upload(db, image)
 
     # URL externe
     elif image_url:
@@ -96,6 +93,9 @@ def add_product_seller(
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    product_index.index_product(new_product)
+    invalidate_product(new_product.id_product)
+    image_pipeline.submit(image_path, on_done=partial(invalidate_product, new_product.id_product))
 
     new_product.image_url = get_image_url(image_path)
 
@@ -113,7 +113,7 @@ def update_product(
     id_product: int,
     update_data: dict,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    user=Depends(get_current_principal)
 ):
     require_role(user, ["VENDEUR"])
 
@@ -125,11 +125,15 @@ def update_product(
     if not product:
         raise HTTPException(404, "Produit introuvable")
 
+    if "stock" in update_data:
+        reservations.void_leases(db, [id_product])
     for key, value in update_data.items():
         setattr(product, key, value)
 
     db.commit()
     db.refresh(product)
+    product_index.index_product(product)
+    invalidate_product(id_product)
 
     return {"message": "Produit mis à jour", "product": product}
 
@@ -139,7 +143,7 @@ def update_product(
 # =============================
 @router.delete("/products/{id_product}")
 def delete_product(
-    id_product: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+    id_product: int, db: Session = Depends(get_db), user=Depends(get_current_principal)
 ):
     require_role(user, ["VENDEUR"])
 
@@ -151,21 +155,41 @@ def delete_product(
     if not product:
         raise HTTPException(404, "Produit introuvable")
 
-    if product.image and product.image.startswith("uploads/"):
-        file_path = product.image
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    # Fichier partagé : supprimé au commit s'il n'est plus référencé
+    delete_legacy_file(product.image)
 
     db.delete(product)
     db.commit()
+    product_index.remove_product(id_product)
+    invalidate_product(id_product)
 
     return {"message": "Produit supprimé"}
 
+
+# ------------------------------------
+# 📥 Import en masse (CSV / NDJSON)
+# ------------------------------------
+@router.post("/products/import", summary="Importer mes produits en masse (CSV ou NDJSON)")
+def import_my_products(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(None, ge=1, le=5000),
+    user=Depends(get_current_principal),
+):
+    require_role(user, ["VENDEUR"])
+    return import_response(*start_import(file, user, format, batch_size))
+
+
+@router.get("/products/import/{job_id}", summary="Suivre un import de produits")
+def my_import_status(job_id: str, user=Depends(get_current_principal)):
+    require_role(user, ["VENDEUR"])
+    return import_status(job_id, user)
+
 # ------------------------------------
 # 🧾 Commandes liées à ses produits
 # ------------------------------------
 @router.get("/orders", summary="Voir les commandes liées à mes produits")
-def get_seller_orders(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def get_seller_orders(db: Session = Depends(get_db), user=Depends(get_current_principal)):
     require_role(user, ["VENDEUR"])
     orders = (
         db.query(models.Order)
@@ -182,7 +206,7 @@ def get_seller_orders(db: Session = Depends(get_db), user=Depends(get_current_us
 @router.get("/products/filter", summary="Filtrer mes produits par nom, prix ou stock")
 def filter_my_products(
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_current_principal),
     search: str = Query(None, description="Recherche par nom ou description"),
     min_price: float = Query(None),
     max_price: float = Query(None),
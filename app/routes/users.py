@@ -1,46 +1,42 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models
 from app.schemas.user_schema import UserCreate, UserResponse
-from app.utils.security import get_current_user, require_role
-from passlib.context import CryptContext
-import bcrypt
+from app.utils.security import get_current_principal, require_role
+from fastapi.concurrency import run_in_threadpool
+from app.utils.passwords import password_service
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# ======================================================
-# 🔐 Fonction sécurisée de hash de mot de passe
-# ======================================================
-def hash_password(password: str):
-    """
-    Hash un mot de passe en contournant la limite de 72 bytes
-    """
-    password_bytes = password.encode('utf-8')
-    
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    
-    # Utiliser bcrypt directement
-    hashed_bytes = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
-    return hashed_bytes.decode('utf-8')
+logger = logging.getLogger(__name__)
+
+
+def _email_exists(db: Session, email: str) -> bool:
+    return db.query(models.User.id_user).filter(models.User.email == email).first() is not None
+
+
+def _save_user(db: Session, user: models.User) -> models.User:
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
 
 # ======================================================
 # 👤 1️⃣ - Inscription d’un CLIENT (publique)
 # ======================================================
 @router.post("/register", response_model=UserResponse, summary="Inscription client")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     try:
-        print("📩 Requête reçue :", user.dict())
+        logger.debug("Inscription reçue", extra={"email": user.email})
 
-        # Vérifie si l'email existe déjà
-        existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-        if existing_user:
+        # Vérifie si l'email existe déjà (avant le hachage, coûteux)
+        if await run_in_threadpool(_email_exists, db, user.email):
             raise HTTPException(status_code=400, detail="Cet email existe déjà.")
 
-        # Hash sécurisé
-        hashed_pw = hash_password(user.mot_de_passe)
+        # Hash sécurisé (pool de processus dédié)
+        hashed_pw = await password_service.hash(user.mot_de_passe)
 
         # Création de l'utilisateur client
         new_user = models.User(
@@ -50,39 +46,36 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
             mot_de_passe=hashed_pw,
             role="CLIENT"
         )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await run_in_threadpool(_save_user, db, new_user)
 
-        print("✅ Utilisateur créé :", new_user.id_user)
+        logger.info("Utilisateur créé", extra={"id_user": new_user.id_user})
         return new_user
 
     except HTTPException:
         raise
     except Exception as e:
-        print("❌ ERREUR SERVEUR :", e)
+        logger.exception("Erreur serveur à l'inscription")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ======================================================
 # 👑 2️⃣ - Création d’un utilisateur par ADMIN
 # ======================================================
 @router.post("/admin/create", response_model=UserResponse, summary="Création d’un utilisateur (ADMIN)")
-def create_user_admin(
+async def create_user_admin(
     user: UserCreate,
     db: Session = Depends(get_db),
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_current_principal)
 ):
     require_role(current_user, ["ADMIN"])  # ✅ seul l’admin peut accéder
 
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing_user:
+    if await run_in_threadpool(_email_exists, db, user.email):
         raise HTTPException(status_code=400, detail="Cet email existe déjà.")
 
     # ✅ Vérification du rôle
     if user.role not in ["CLIENT", "VENDEUR", "ADMIN"]:
         raise HTTPException(status_code=400, detail="Rôle invalide")
 
-    hashed_pw = hash_password(user.mot_de_passe)
+    hashed_pw = await password_service.hash(user.mot_de_passe)
     new_user = models.User(
         nom=user.nom,
         prenom=user.prenom,
@@ -90,15 +83,12 @@ def create_user_admin(
         mot_de_passe=hashed_pw,
         role=user.role,
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    return await run_in_threadpool(_save_user, db, new_user)
 
 # ======================================================
 # 👥 3️⃣ - Lister les utilisateurs
 # ======================================================
 @router.get("/", response_model=list[UserResponse], summary="Lister tous les utilisateurs")
-def get_users(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_users(db: Session = Depends(get_db), current_user=Depends(get_current_principal)):
     require_role(current_user, ["ADMIN"])
     return db.query(models.User).all()
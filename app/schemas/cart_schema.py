@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+
+class CartLine(BaseModel):
+    id_product: int
+    quantite: int = Field(ge=0)  # 0 = retirer l'article (mode set)
+
+
+class CartBatch(BaseModel):
+    # set   : les quantités remplacent celles du panier
+    # merge : elles s'ajoutent (fusion d'un panier invité à la connexion)
+    mode: Literal["set", "merge"] = "set"
+    items: List[CartLine] = Field(max_length=200)
+
+
+class CartProduct(BaseModel):
+    nom: str
+    prix: float
+    image: Optional[str] = None
+    stock: Optional[int] = None
+
+
+class CartItemResponse(BaseModel):
+    id_product: int
+    quantite: int
+    sous_total: float
+    product: CartProduct
+
+
+class CartResponse(BaseModel):
+    items: List[CartItemResponse]
+    nb_articles: int = 0
+    total: float = 0.0
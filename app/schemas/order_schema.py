@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -7,27 +7,35 @@ class OrderItemBase(BaseModel):
     quantite: int
     prix_unitaire: float
 
-class OrderItemCreate(OrderItemBase):
-    pass
+class OrderItemCreate(BaseModel):
+    id_product: int
+    quantite: int = Field(ge=1)
+    prix_unitaire: Optional[float] = None  # ignoré : prix relu en base
 
 class OrderItemResponse(OrderItemBase):
     id_order_item: int
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class OrderBase(BaseModel):
     total: float
     statut: Optional[str] = "EN_ATTENTE"
 
-class OrderCreate(OrderBase):
-    items: List[OrderItemCreate]
+class OrderCreate(BaseModel):
+    # Sans articles, la commande reprend le panier de l'utilisateur
+    items: Optional[List[OrderItemCreate]] = Field(default=None, max_length=200)
+    total: Optional[float] = None  # ignoré : recalculé côté serveur
 
 class OrderResponse(OrderBase):
     id_order: int
     id_user: int
-    date_commande: datetime
+    date_commande: Optional[datetime] = None
     items: List[OrderItemResponse]
 
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+class OrderPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
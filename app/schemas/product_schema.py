@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -17,16 +17,32 @@ class ProductCreate(ProductBase):
     pass
 
 
+class ProductUpdate(BaseModel):
+    """Mise à jour partielle : seules les colonnes fournies sont modifiées"""
+    nom: Optional[str] = None
+    description: Optional[str] = None
+    prix: Optional[float] = None
+    stock: Optional[int] = None
+    image: Optional[str] = None
+    id_category: Optional[int] = None
+    id_seller: Optional[int] = None
+
+
 class ProductResponse(ProductBase):
     id_product: int
-    date_creation: datetime
+    date_creation: Optional[datetime] = None
 
     # ⭐ Champs additionnels calculés ou enrichis
     note_moyenne: Optional[float] = None
     nb_reviews: Optional[int] = None
     vendeur_nom: Optional[str] = None
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
 
     class Config:
         orm_mode = True
 
+
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = None
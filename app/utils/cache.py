@@ -0,0 +1,268 @@
+# app/utils/cache.py
+"""
+Cache de lecture du catalogue.
+
+Politique LRU + TTL avec compteurs (hits / misses / evictions). Le backend
+est interchangeable : memory (propre au processus), redis (partagé entre
+workers et nœuds, CACHE_REDIS_URL) ou none ; `register_backend()` permet
+d'en ajouter d'autres (memcached…) sans toucher aux routes.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+MISS = object()
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class CacheBackend:
+    """Interface commune des backends de cache"""
+
+    def get(self, key: str):
+        """Retourne la valeur ou MISS"""
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float | None = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class NullCache(CacheBackend):
+    """Cache désactivé (CATALOG_CACHE_BACKEND=none)"""
+
+    def get(self, key):
+        return MISS
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+class MemoryCache(CacheBackend):
+    """Cache LRU borné avec expiration, propre au processus"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                del self._data[k]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache partagé sur le protocole Redis : expiration par clé (PX), éviction
+    laissée à la politique maxmemory du serveur. Valeurs sérialisées avec
+    pickle : le serveur ne doit être accessible qu'à l'application.
+    """
+
+    def __init__(self, max_entries: int | None = None, ttl: float = 30.0, url: str = CACHE_REDIS_URL,
+                 prefix: str = "cache:", client=None):
+        if client is None:
+            import redis  # dépendance optionnelle, seulement pour ce backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return MISS
+            self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        removed = self.client.delete(self.prefix + key)
+        with self._lock:
+            self.invalidations += removed
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.prefix + prefix + "*", count=500))
+        removed = self.client.delete(*keys) if keys else 0
+        with self._lock:
+            self.invalidations += removed
+
+    def clear(self):
+        self.delete_prefix("")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "prefix": self.prefix,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+# ==========================================================
+# 🔌 Sélection du backend
+# ==========================================================
+_BACKENDS = {
+    "memory": MemoryCache,
+    "redis": RedisCache,
+    "none": NullCache,
+}
+
+
+def register_backend(name: str, factory):
+    """Enregistre un backend supplémentaire (ex. partagé entre workers)"""
+    _BACKENDS[name] = factory
+
+
+def create_cache(backend: str = "memory", **options) -> CacheBackend:
+    if backend not in _BACKENDS:
+        raise ValueError(f"Backend de cache inconnu : {backend}")
+    if backend == "none":
+        return NullCache()
+    return _BACKENDS[backend](**options)
+
+
+def cached(cache: CacheBackend, key: str, loader, ttl: float | None = None):
+    """Lecture à travers le cache : `loader()` n'est appelé qu'en cas de miss"""
+    value = cache.get(key)
+    if value is MISS:
+        value = loader()
+        cache.set(key, value, ttl)
+    return value
+
+
+async def cached_async(cache: CacheBackend, key: str, loader, ttl: float | None = None):
+    """Variante pour les routes async : `loader` est une coroutine"""
+    value = cache.get(key)
+    if value is MISS:
+        value = await loader()
+        cache.set(key, value, ttl)
+    return value
+
+
+catalog_cache = create_cache(
+    os.getenv("CATALOG_CACHE_BACKEND", "memory"),
+    max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "30")),
+)
+
+
+# ==========================================================
+# 🧹 Invalidation (à appeler après commit)
+# ==========================================================
+def invalidate_product(id_product: int | None = None):
+    """Un produit a changé : sa fiche et toutes les pages de listes"""
+    if id_product is not None:
+        catalog_cache.delete(f"product:{id_product}")
+    catalog_cache.delete_prefix("products:")
+
+
+def invalidate_categories():
+    """Une catégorie a changé (la suppression emporte aussi ses produits)"""
+    catalog_cache.delete_prefix("categories:")
+    catalog_cache.delete_prefix("product:")
+    catalog_cache.delete_prefix("products:")
+
+
+def invalidate_catalog():
+    """Changement de masse (suppression d'un vendeur, correction d'images…)"""
+    catalog_cache.clear()
@@ -0,0 +1,272 @@
+# app/utils/cart_service.py
+"""
+Panier : lecture en une requête et mutations par lot.
+
+- load_cart : articles et produits du panier en une seule requête
+  (jointures), sous-totaux et total calculés ; price_cart fait de même
+  à partir de quantités tenues hors base (cart_store).
+- apply_quantities : plusieurs quantités dans la transaction courante.
+  L'écriture est un upsert sur l'index unique (id_cart, id_product) :
+  ON DUPLICATE KEY UPDATE (MySQL), ON CONFLICT (SQLite, PostgreSQL),
+  UPDATE puis INSERT sous savepoint ailleurs. Deux ajouts concurrents
+  du même produit incrémentent la même ligne au lieu d'en créer deux.
+- replace_carts : écriture par lot de paniers complets (écriture différée).
+
+Variable d'environnement :
+    CART_MAX_QUANTITY : quantité maximale par article (99)
+"""
+import os
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+
+CART_MAX_QUANTITY = int(os.getenv("CART_MAX_QUANTITY", "99"))
+
+Cart = models.Cart
+Item = models.CartItem
+Product = models.Product
+
+
+# ==========================================================
+# 🔍 Lecture
+# ==========================================================
+def _summary(lines) -> dict:
+    """lines : (id_product, quantite, nom, prix, image, stock)"""
+    items = []
+    total = Decimal(0)
+    for id_product, quantite, nom, prix, image, stock in lines:
+        prix = Decimal(prix)
+        sous_total = prix * quantite
+        total += sous_total
+        items.append({
+            "id_product": id_product,
+            "quantite": quantite,
+            "sous_total": round(float(sous_total), 2),
+            "product": {"nom": nom, "prix": float(prix), "image": image, "stock": stock},
+        })
+    return {
+        "items": items,
+        "nb_articles": sum(item["quantite"] for item in items),
+        "total": round(float(total), 2),
+    }
+
+
+_PRODUCT_COLUMNS = (Product.nom, Product.prix, Product.image, Product.stock)
+
+
+def load_cart(db: Session, id_user: int) -> dict:
+    """Panier complet de l'utilisateur (une requête SQL)"""
+    rows = db.execute(
+        select(Item.id_product, Item.quantite, *_PRODUCT_COLUMNS)
+        .select_from(Cart)
+        .join(Item, Item.id_cart == Cart.id_cart)
+        .join(Product, Product.id_product == Item.id_product)
+        .where(Cart.id_user == id_user)
+        .order_by(Item.id_cart_item)
+    ).all()
+    return _summary(rows)
+
+
+def price_cart(db: Session, quantities: dict[int, int]) -> dict:
+    """Panier détaillé à partir de quantités déjà connues (une requête SQL)"""
+    if not quantities:
+        return _summary([])
+    products = {
+        row[0]: row[1:]
+        for row in db.execute(
+            select(Product.id_product, *_PRODUCT_COLUMNS).where(Product.id_product.in_(list(quantities)))
+        )
+    }
+    return _summary(
+        (id_product, quantite, *products[id_product])
+        for id_product, quantite in quantities.items()
+        if id_product in products
+    )
+
+
+def cart_quantities(db: Session, id_user: int) -> dict[int, int]:
+    """{id_product: quantité} du panier enregistré en base"""
+    rows = db.execute(
+        select(Item.id_product, Item.quantite)
+        .join(Cart, Cart.id_cart == Item.id_cart)
+        .where(Cart.id_user == id_user)
+        .order_by(Item.id_cart_item)
+    )
+    return {id_product: quantite for id_product, quantite in rows}
+
+
+# ==========================================================
+# ✏️ Écriture
+# ==========================================================
+def get_or_create_cart(db: Session, id_user: int) -> int:
+    """Identifiant du panier de l'utilisateur, créé au besoin (sûr en concurrence)"""
+    query = select(Cart.id_cart).where(Cart.id_user == id_user).limit(1)
+    id_cart = db.scalar(query)
+    if id_cart is not None:
+        return id_cart
+    try:
+        with db.begin_nested():
+            cart = Cart(id_user=id_user)
+            db.add(cart)
+            db.flush()
+        return cart.id_cart
+    except IntegrityError:
+        # Créé entre-temps par une requête concurrente (index uq_carts_user)
+        return db.scalar(query)
+
+
+def _new_quantity(current, added, merge: bool):
+    if not merge:
+        return added
+    return case((current + added > CART_MAX_QUANTITY, CART_MAX_QUANTITY), else_=current + added)
+
+
+def _upsert(db: Session, rows: list[dict], merge: bool):
+    dialect = db.get_bind(mapper=Item).dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(Item).values(rows)
+        stmt = stmt.on_duplicate_key_update(quantite=_new_quantity(Item.quantite, stmt.inserted.quantite, merge))
+        db.execute(stmt)
+        return
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as conflict_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as conflict_insert
+
+        stmt = conflict_insert(Item).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Item.id_cart, Item.id_product],
+            set_={"quantite": _new_quantity(Item.quantite, stmt.excluded.quantite, merge)},
+        )
+        db.execute(stmt)
+        return
+
+    for row in rows:
+        stmt = (
+            update(Item)
+            .where(Item.id_cart == row["id_cart"], Item.id_product == row["id_product"])
+            .values(quantite=_new_quantity(Item.quantite, row["quantite"], merge))
+            .execution_options(synchronize_session=False)
+        )
+        if db.execute(stmt).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(Item).values(row))
+        except IntegrityError:
+            db.execute(stmt)
+
+
+def out_of_stock_error(id_product: int, nom: str | None, quantite: int, disponible: int) -> HTTPException:
+    """404 si le produit n'existe pas (nom None), sinon 409 avec le stock disponible"""
+    if nom is None:
+        return HTTPException(status_code=404, detail=f"Produit {id_product} introuvable")
+    return HTTPException(
+        status_code=409,
+        detail={
+            "message": "Stock insuffisant",
+            "id_product": id_product,
+            "nom": nom,
+            "demande": quantite,
+            "disponible": max(disponible, 0),
+        },
+    )
+
+
+def raise_out_of_stock(db: Session, id_product: int, quantite: int):
+    row = db.execute(select(Product.nom, Product.stock).where(Product.id_product == id_product)).first()
+    if row is None:
+        raise out_of_stock_error(id_product, None, quantite, 0)
+    raise out_of_stock_error(id_product, row.nom, quantite, row.stock or 0)
+
+
+def check_products(db: Session, ids):
+    """404 si un des produits n'existe pas"""
+    known = set(db.scalars(select(Product.id_product).where(Product.id_product.in_(list(ids)))))
+    missing = sorted(i for i in ids if i not in known)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Produits introuvables : {missing}")
+
+
+def apply_quantities(db: Session, id_user: int, quantities: dict[int, int], merge: bool = False):
+    """
+    Applique {id_product: quantité} au panier dans la transaction courante.
+    - merge=False : la quantité remplace l'actuelle (0 retire l'article)
+    - merge=True  : elle s'ajoute (plafonnée à CART_MAX_QUANTITY)
+    Le commit reste à la charge de l'appelant.
+    """
+    if not quantities:
+        return
+    ids = sorted(quantities)
+    check_products(db, ids)
+    id_cart = get_or_create_cart(db, id_user)
+
+    removed = [i for i in ids if quantities[i] == 0]
+    if removed and not merge:
+        db.execute(
+            delete(Item)
+            .where(Item.id_cart == id_cart, Item.id_product.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+
+    rows = [
+        {"id_cart": id_cart, "id_product": i, "quantite": min(quantities[i], CART_MAX_QUANTITY)}
+        for i in ids if quantities[i] > 0
+    ]
+    if rows:
+        _upsert(db, rows, merge)
+
+
+def remove_item(db: Session, id_user: int, id_product: int) -> bool | None:
+    """Retire un article ; None si l'utilisateur n'a pas de panier, False si l'article n'y est pas"""
+    id_cart = db.scalar(select(Cart.id_cart).where(Cart.id_user == id_user).limit(1))
+    if id_cart is None:
+        return None
+    deleted = db.execute(
+        delete(Item)
+        .where(Item.id_cart == id_cart, Item.id_product == id_product)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return bool(deleted)
+
+
+def replace_carts(db: Session, carts: dict[int, dict[int, int]]):
+    """
+    Remplace le contenu enregistré de plusieurs paniers ({id_user: {id_product: quantité}})
+    dans la transaction courante : idempotent, un même état peut être réécrit sans effet.
+    Les produits supprimés entre-temps sont ignorés.
+    """
+    if not carts:
+        return
+    users = sorted(carts)
+    cart_ids = dict(db.execute(select(Cart.id_user, Cart.id_cart).where(Cart.id_user.in_(users))).all())
+    for id_user in users:
+        if id_user not in cart_ids:
+            cart_ids[id_user] = get_or_create_cart(db, id_user)
+
+    wanted = {id_product for items in carts.values() for id_product in items}
+    known = set(db.scalars(select(Product.id_product).where(Product.id_product.in_(wanted)))) if wanted else set()
+
+    db.execute(
+        delete(Item)
+        .where(Item.id_cart.in_([cart_ids[u] for u in users]))
+        .execution_options(synchronize_session=False)
+    )
+    rows = [
+        {"id_cart": cart_ids[id_user], "id_product": id_product, "quantite": quantite}
+        for id_user in users
+        for id_product, quantite in carts[id_user].items()
+        if quantite > 0 and id_product in known
+    ]
+    if rows:
+        db.execute(insert(Item), rows)
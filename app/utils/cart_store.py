@@ -0,0 +1,511 @@
+# app/utils/cart_store.py
+"""
+Paniers actifs en mémoire ou dans Redis (CART_STORE_BACKEND), écrits en base
+en différé par un fil de fond. Un panier n'est retiré des « à écrire »
+qu'après commit, et seulement si sa version n'a pas bougé pendant
+l'écriture. Exploitation et reprise après incident : README.md.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.utils.cart_service import (
+    CART_MAX_QUANTITY,
+    apply_quantities,
+    cart_quantities,
+    check_products,
+    load_cart,
+    price_cart,
+    remove_item,
+    replace_carts,
+)
+from app.utils.reservations import reservations
+
+CART_STORE_BACKEND = os.getenv("CART_STORE_BACKEND", "sql").lower()
+CART_STORE_URL = os.getenv("CART_STORE_URL", "redis://localhost:6379/0")
+CART_STORE_PREFIX = os.getenv("CART_STORE_PREFIX", "drops:")
+CART_STORE_TTL = int(os.getenv("CART_STORE_TTL", "86400"))
+CART_STORE_MAX_CARTS = int(os.getenv("CART_STORE_MAX_CARTS", "100000"))
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "1.0"))
+CART_FLUSH_BATCH = int(os.getenv("CART_FLUSH_BATCH", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+def _merged(current: int, quantite: int, merge: bool) -> int:
+    return min(current + quantite if merge else quantite, CART_MAX_QUANTITY)
+
+
+# ==========================================================
+# 🗃️ Backends clé-valeur
+# ==========================================================
+class CartBackend:
+    """Paniers {id_product: quantité} par utilisateur, versionnés, avec marquage « à écrire »"""
+
+    def get(self, id_user: int) -> dict[int, int] | None:
+        """None si le panier n'est pas dans le store"""
+        raise NotImplementedError
+
+    def load(self, id_user: int, items: dict[int, int]):
+        """Charge l'état de la base, sans écraser un panier déjà présent"""
+        raise NotImplementedError
+
+    def apply(self, id_user: int, quantities: dict[int, int], merge: bool):
+        raise NotImplementedError
+
+    def remove(self, id_user: int, id_product: int) -> bool:
+        raise NotImplementedError
+
+    def drop(self, id_user: int):
+        """Oublie le panier (après écriture en base)"""
+        raise NotImplementedError
+
+    def pending(self, limit: int) -> list[int]:
+        """Utilisateurs dont le panier reste à écrire"""
+        raise NotImplementedError
+
+    def is_pending(self, id_user: int) -> bool:
+        raise NotImplementedError
+
+    def snapshot(self, users: list[int]) -> dict[int, tuple[int, dict[int, int]]]:
+        """{id_user: (version, panier)} des paniers présents"""
+        raise NotImplementedError
+
+    def mark_written(self, versions: dict[int, int]):
+        """Retire le marquage des paniers dont la version n'a pas changé"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCartBackend(CartBackend):
+    """Paniers en mémoire du processus ; seuls les paniers déjà écrits sont évincés"""
+
+    def __init__(self, max_carts: int = CART_STORE_MAX_CARTS, ttl: float = CART_STORE_TTL):
+        self.max_carts = max_carts
+        self.ttl = ttl
+        self._carts: OrderedDict[int, dict[int, int]] = OrderedDict()
+        self._touched: dict[int, float] = {}
+        self._versions: dict[int, int] = {}
+        self._pending: dict[int, None] = {}  # ensemble ordonné (plus anciens d'abord)
+        self._lock = threading.Lock()
+
+    def _alive(self, id_user) -> bool:
+        if id_user not in self._carts:
+            return False
+        if id_user not in self._pending and time.monotonic() - self._touched[id_user] > self.ttl:
+            self._forget(id_user)
+            return False
+        return True
+
+    def _touch(self, id_user):
+        self._carts.move_to_end(id_user)
+        self._touched[id_user] = time.monotonic()
+
+    def _forget(self, id_user):
+        self._carts.pop(id_user, None)
+        self._touched.pop(id_user, None)
+        self._versions.pop(id_user, None)
+        self._pending.pop(id_user, None)
+
+    def _evict(self):
+        if len(self._carts) <= self.max_carts:
+            return
+        clean = [u for u in self._carts if u not in self._pending]
+        for id_user in clean[: len(self._carts) - self.max_carts]:
+            self._forget(id_user)
+
+    def get(self, id_user):
+        with self._lock:
+            if not self._alive(id_user):
+                return None
+            self._touch(id_user)
+            return dict(self._carts[id_user])
+
+    def load(self, id_user, items):
+        with self._lock:
+            if self._alive(id_user):
+                return
+            self._carts[id_user] = dict(items)
+            self._versions[id_user] = 0
+            self._touch(id_user)
+            self._evict()
+
+    def apply(self, id_user, quantities, merge):
+        with self._lock:
+            cart = self._carts.setdefault(id_user, {})
+            for id_product, quantite in quantities.items():
+                if quantite > 0:
+                    cart[id_product] = _merged(cart.get(id_product, 0), quantite, merge)
+                elif not merge:
+                    cart.pop(id_product, None)
+            self._versions[id_user] = self._versions.get(id_user, 0) + 1
+            self._pending[id_user] = None
+            self._touch(id_user)
+            self._evict()
+
+    def remove(self, id_user, id_product):
+        with self._lock:
+            cart = self._carts.get(id_user, {})
+            if cart.pop(id_product, None) is None:
+                return False
+            self._versions[id_user] += 1
+            self._pending[id_user] = None
+            self._touch(id_user)
+            return True
+
+    def drop(self, id_user):
+        with self._lock:
+            self._forget(id_user)
+
+    def pending(self, limit):
+        with self._lock:
+            return list(islice(self._pending, limit))
+
+    def is_pending(self, id_user):
+        with self._lock:
+            return id_user in self._pending
+
+    def snapshot(self, users):
+        with self._lock:
+            return {u: (self._versions[u], dict(self._carts[u])) for u in users if u in self._carts}
+
+    def mark_written(self, versions):
+        with self._lock:
+            for id_user, version in versions.items():
+                if self._versions.get(id_user) == version:
+                    self._pending.pop(id_user, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "carts": len(self._carts),
+                "max_carts": self.max_carts,
+                "pending": len(self._pending),
+            }
+
+
+class RedisCartBackend(CartBackend):
+    """
+    Un hash par panier ({prefix}cart:{id_user} : id_product → quantité, plus
+    le champ de version « _v ») et un ensemble des paniers à écrire.
+    """
+
+    VERSION = "_v"
+
+    def __init__(self, url: str = CART_STORE_URL, prefix: str = CART_STORE_PREFIX,
+                 ttl: int = CART_STORE_TTL, client=None):
+        if client is None:
+            import redis  # dépendance optionnelle, seulement pour ce backend
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.pending_key = f"{prefix}carts:pending"
+
+    def _key(self, id_user) -> str:
+        return f"{self.prefix}cart:{id_user}"
+
+    @classmethod
+    def _parse(cls, raw: dict) -> tuple[int, dict[int, int]]:
+        version = int(raw.get(cls.VERSION, 0))
+        items = {int(k): int(v) for k, v in raw.items() if k != cls.VERSION}
+        return version, {k: v for k, v in items.items() if v > 0}
+
+    def get(self, id_user):
+        raw = self.client.hgetall(self._key(id_user))
+        return self._parse(raw)[1] if raw else None
+
+    def load(self, id_user, items):
+        key = self._key(id_user)
+
+        def fill(pipe):
+            # WATCH : un chargement concurrent ou une modification gagne
+            if pipe.exists(key):
+                return
+            pipe.multi()
+            pipe.hset(key, mapping={self.VERSION: 0, **{str(k): v for k, v in items.items()}})
+            pipe.expire(key, self.ttl)
+
+        self.client.transaction(fill, key)
+
+    def apply(self, id_user, quantities, merge):
+        key = self._key(id_user)
+        pipe = self.client.pipeline(transaction=True)
+        increments = []
+        for id_product, quantite in quantities.items():
+            if quantite > 0 and merge:
+                pipe.hincrby(key, str(id_product), quantite)
+                increments.append(id_product)
+            elif quantite > 0:
+                pipe.hset(key, str(id_product), min(quantite, CART_MAX_QUANTITY))
+            elif not merge:
+                pipe.hdel(key, str(id_product))
+        pipe.hincrby(key, self.VERSION, 1)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self.pending_key, id_user)
+        results = pipe.execute()
+
+        # Plafond appliqué après coup : deux dépassements concurrents écrivent la même valeur
+        over = [p for p, value in zip(increments, results) if int(value) > CART_MAX_QUANTITY]
+        if over:
+            self.client.hset(key, mapping={str(p): CART_MAX_QUANTITY for p in over})
+
+    def remove(self, id_user, id_product):
+        key = self._key(id_user)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hdel(key, str(id_product))
+        pipe.hincrby(key, self.VERSION, 1)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self.pending_key, id_user)
+        return bool(pipe.execute()[0])
+
+    def drop(self, id_user):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key(id_user))
+        pipe.srem(self.pending_key, id_user)
+        pipe.execute()
+
+    def pending(self, limit):
+        return [int(u) for u in self.client.srandmember(self.pending_key, limit) or []]
+
+    def is_pending(self, id_user):
+        return bool(self.client.sismember(self.pending_key, id_user))
+
+    def snapshot(self, users):
+        pipe = self.client.pipeline(transaction=False)
+        for id_user in users:
+            pipe.hgetall(self._key(id_user))
+        snapshots = {}
+        for id_user, raw in zip(users, pipe.execute()):
+            if raw:
+                snapshots[id_user] = self._parse(raw)
+            else:
+                # Expiré avant écriture (CART_STORE_TTL trop court) : rien à écrire
+                logger.warning("Panier expiré avant écriture en base", extra={"id_user": id_user})
+                self.client.srem(self.pending_key, id_user)
+        return snapshots
+
+    def mark_written(self, versions):
+        if not versions:
+            return
+        users = list(versions)
+        # Retrait d'abord, puis relecture des versions : une modification
+        # intervenue entre-temps remet le panier dans l'ensemble.
+        self.client.srem(self.pending_key, *users)
+        pipe = self.client.pipeline(transaction=False)
+        for id_user in users:
+            pipe.hget(self._key(id_user), self.VERSION)
+        changed = [u for u, v in zip(users, pipe.execute()) if v is not None and int(v) != versions[u]]
+        if changed:
+            self.client.sadd(self.pending_key, *changed)
+
+    def stats(self):
+        return {"backend": "redis", "prefix": self.prefix, "pending": self.client.scard(self.pending_key)}
+
+
+# ==========================================================
+# 🛒 Stores utilisés par les routes
+# ==========================================================
+class SqlCartStore:
+    """Écriture directe : chaque modification est commitée"""
+
+    def read(self, db: Session, id_user: int) -> dict:
+        return load_cart(db, id_user)
+
+    def quantities(self, db: Session, id_user: int) -> dict[int, int]:
+        return cart_quantities(db, id_user)
+
+    def _reserve(self, db: Session, id_user: int, quantities: dict[int, int], merge: bool):
+        """Réserve les quantités qu'aura le panier (409 sans rien modifier si le stock manque)"""
+        if reservations.enabled:
+            current = self.quantities(db, id_user)
+            reservations.hold(id_user, {p: _merged(current.get(p, 0), q, merge) for p, q in quantities.items()})
+
+    def update(self, db: Session, id_user: int, quantities: dict[int, int], merge: bool = False):
+        self._reserve(db, id_user, quantities, merge)
+        apply_quantities(db, id_user, quantities, merge=merge)
+        db.commit()
+
+    def remove(self, db: Session, id_user: int, id_product: int) -> bool | None:
+        removed = remove_item(db, id_user, id_product)
+        if removed:
+            db.commit()
+            reservations.release(id_user, [id_product])
+        return removed
+
+    def flush_user(self, id_user: int):
+        pass
+
+    def discard(self, id_user: int):
+        pass
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "sql"}
+
+
+class WriteBehindCartStore(SqlCartStore):
+    """Paniers servis par un backend clé-valeur, écrits en base par lots"""
+
+    def __init__(self, backend: CartBackend, interval: float = CART_FLUSH_INTERVAL, batch: int = CART_FLUSH_BATCH):
+        self.backend = backend
+        self.interval = interval
+        self.batch = batch
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.carts_written = 0
+        self.failures = 0
+        self.last_flush: float | None = None
+
+    # ---------- routes ----------
+    def read(self, db, id_user):
+        items = self.backend.get(id_user)
+        if items is not None:
+            return price_cart(db, items)
+        # Pas de chargement dans le store ici : la lecture peut venir d'un
+        # réplica en retard ; le panier est chargé depuis le primaire à la
+        # première modification.
+        return load_cart(db, id_user)
+
+    def quantities(self, db, id_user):
+        items = self.backend.get(id_user)
+        return items if items is not None else cart_quantities(db, id_user)
+
+    def _ensure_loaded(self, db, id_user):
+        if self.backend.get(id_user) is None:
+            self.backend.load(id_user, cart_quantities(db, id_user))
+
+    def update(self, db, id_user, quantities, merge=False):
+        if not quantities:
+            return
+        check_products(db, quantities)
+        self._ensure_loaded(db, id_user)
+        self._reserve(db, id_user, quantities, merge)
+        self.backend.apply(id_user, quantities, merge)
+        self.start()
+
+    def remove(self, db, id_user, id_product):
+        self._ensure_loaded(db, id_user)
+        removed = self.backend.remove(id_user, id_product)
+        if removed:
+            reservations.release(id_user, [id_product])
+            self.start()
+        return removed
+
+    # ---------- écriture en base ----------
+    def _write(self, users: list[int]) -> int:
+        snapshots = self.backend.snapshot(users)
+        if not snapshots:
+            return 0
+        db = SessionLocal()
+        try:
+            replace_carts(db, {u: items for u, (_, items) in snapshots.items()})
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            db.close()
+        self.backend.mark_written({u: version for u, (version, _) in snapshots.items()})
+        with self._lock:
+            self.flushes += 1
+            self.carts_written += len(snapshots)
+            self.last_flush = time.time()
+        return len(snapshots)
+
+    def flush(self) -> int:
+        """Écrit un lot de paniers marqués ; retourne le nombre de paniers écrits"""
+        users = self.backend.pending(self.batch)
+        return self._write(users) if users else 0
+
+    def flush_all(self) -> int:
+        total = 0
+        while True:
+            written = self.flush()
+            total += written
+            if written < self.batch:
+                return total
+
+    def flush_user(self, id_user):
+        """Écriture immédiate d'un panier (avant validation de commande)"""
+        if self.backend.is_pending(id_user):
+            self._write([id_user])
+
+    def discard(self, id_user):
+        """Panier vidé en base (commande validée) : l'état du store est obsolète"""
+        self.backend.drop(id_user)
+
+    # ---------- fil de fond ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="cart-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush_all()
+            except Exception:
+                logger.exception("Écriture différée des paniers impossible")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        try:
+            written = self.flush_all()
+            if written:
+                logger.info("Paniers écrits à l'arrêt", extra={"carts": written})
+        except Exception:
+            logger.exception("Paniers non écrits à l'arrêt")
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "flushes": self.flushes,
+                "carts_written": self.carts_written,
+                "failures": self.failures,
+                "last_flush": self.last_flush,
+            }
+        return {
+            **self.backend.stats(),
+            **stats,
+            "interval_s": self.interval,
+            "batch": self.batch,
+        }
+
+
+def create_cart_store(backend: str = CART_STORE_BACKEND) -> SqlCartStore:
+    if backend == "sql":
+        return SqlCartStore()
+    if backend == "memory":
+        return WriteBehindCartStore(MemoryCartBackend())
+    if backend == "redis":
+        return WriteBehindCartStore(RedisCartBackend())
+    raise ValueError(f"Backend de panier inconnu : {backend}")
+
+
+cart_store = create_cart_store()
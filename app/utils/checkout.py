@@ -0,0 +1,115 @@
+# app/utils/checkout.py
+"""
+Validation de commande : panier (ou liste d'articles) → commande, en une
+transaction.
+
+1. Le panier en écriture différée est d'abord écrit en base (cart_store).
+2. Le stock est décrémenté produit par produit, dans l'ordre des
+   identifiants, par des UPDATE conditionnels :
+       UPDATE products SET stock = stock - :q WHERE id_product = :id AND stock >= :q
+   Pas de lecture-modification-écriture : deux commandes concurrentes ne
+   peuvent pas vendre la même unité. L'ordre fixe des verrous de ligne
+   évite les interblocages entre paniers qui partagent des produits.
+   Au premier produit insuffisant, tout est annulé (409).
+3. Les prix sont relus en base (ceux du client sont ignorés), la commande
+   est créée puis ses lignes insérées en un seul INSERT multi-lignes.
+4. Le panier est vidé dans la même transaction.
+
+Avec les réservations (RESERVATIONS_ENABLED), les unités réservées par
+l'acheteur sont vendues sur le bail du worker (ligne stock_leases) au lieu
+de products.stock ; le reste suit le chemin ci-dessus, dans le même ordre
+(bail puis produit, par identifiant).
+
+Preuve de non-survente sous charge : python -m benchmarks.checkout_concurrency
+"""
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.cache import invalidate_product
+from app.utils.cart_service import cart_quantities, raise_out_of_stock
+from app.utils.cart_store import cart_store
+from app.utils.reservations import reservations
+
+Product = models.Product
+
+
+def _reserve_stock(db: Session, quantities: dict[int, int], covered: dict[int, int]):
+    """
+    Décrémente le stock de chaque produit (réservations d'abord) ; retourne
+    le premier produit en rupture et les unités vendues sur les baux.
+    """
+    sold = {}
+    for id_product in sorted(quantities):
+        quantite = quantities[id_product]
+        held = covered.get(id_product, 0)
+        if held and reservations.sell(db, id_product, held):
+            sold[id_product] = held
+            quantite -= held
+        if not quantite:
+            continue
+        updated = db.execute(
+            update(Product)
+            .where(Product.id_product == id_product, Product.stock >= quantite)
+            .values(stock=Product.stock - quantite)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            return id_product, sold
+    return None, sold
+
+
+def place_order(db: Session, id_user: int, quantities: dict[int, int] | None = None) -> int:
+    """
+    Crée la commande de l'utilisateur et retourne son identifiant.
+    quantities=None : la commande reprend le panier, qui est vidé.
+    """
+    from_cart = quantities is None
+    if from_cart:
+        cart_store.flush_user(id_user)
+        quantities = cart_quantities(db, id_user)
+    quantities = {id_product: q for id_product, q in quantities.items() if q > 0}
+    if not quantities:
+        raise HTTPException(status_code=400, detail="Panier vide")
+
+    covered = reservations.covered(id_user, quantities)
+    short, sold = _reserve_stock(db, quantities, covered)
+    if short is not None:
+        db.rollback()
+        raise_out_of_stock(db, short, quantities[short])
+
+    prices = dict(
+        db.execute(select(Product.id_product, Product.prix).where(Product.id_product.in_(list(quantities)))).all()
+    )
+    total = sum((Decimal(prices[p]) * q for p, q in quantities.items()), Decimal(0))
+
+    order = models.Order(id_user=id_user, total=total)
+    db.add(order)
+    db.flush()
+
+    db.execute(
+        insert(models.OrderItem),
+        [
+            {"id_order": order.id_order, "id_product": p, "quantite": q, "prix_unitaire": prices[p]}
+            for p, q in sorted(quantities.items())
+        ],
+    )
+
+    if from_cart:
+        db.execute(
+            delete(models.CartItem)
+            .where(models.CartItem.id_cart.in_(select(models.Cart.id_cart).where(models.Cart.id_user == id_user)))
+            .execution_options(synchronize_session=False)
+        )
+
+    id_order = order.id_order
+    db.commit()
+    reservations.consume(id_user, covered, sold)
+    if from_cart:
+        cart_store.discard(id_user)
+    for id_product in quantities:
+        invalidate_product(id_product)
+    return id_order
@@ -0,0 +1,212 @@
+# app/utils/db_pool.py
+"""
+Pool de connexions instrumenté.
+
+- Paramètres lus dans l'environnement (voir pool_options) : taille,
+  débordement, délai d'attente, recyclage et stratégie de ping.
+- DB_PRE_PING :
+    always : SELECT 1 à chaque emprunt (ancien pool_pre_ping=True),
+    idle   : ping seulement si la connexion dort depuis plus de
+             DB_PING_IDLE_SECONDS (par défaut),
+    none   : aucun ping, on compte sur DB_POOL_RECYCLE.
+- Mesures par pool : attente d'une connexion libre, durée totale de
+  l'emprunt (attente + ping), connexions utilisées / en débordement,
+  délais dépassés. Lecture via pool_stats() (endpoint admin, /health/ready).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_PRE_PING = os.getenv("DB_PRE_PING", "idle").lower()
+DB_PING_IDLE_SECONDS = float(os.getenv("DB_PING_IDLE_SECONDS", "30"))
+
+# Nombre d'emprunts récents conservés pour les percentiles
+SAMPLE_SIZE = 1024
+
+
+# ==========================================================
+# 📊 Mesures
+# ==========================================================
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(values) -> dict:
+    """Résumé en millisecondes"""
+    return {
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(max(values, default=0.0) * 1000, 3),
+    }
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.invalidations = 0
+        self.wait_total = 0.0
+        self._waits = deque(maxlen=SAMPLE_SIZE)
+        self._latencies = deque(maxlen=SAMPLE_SIZE)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_total += seconds
+            self._waits.append(seconds)
+
+    def record_checkout(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self._latencies.append(seconds)
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "invalidations": self.invalidations,
+                "wait_total_s": round(self.wait_total, 3),
+                "wait": _summary(list(self._waits)),
+                "checkout_latency": _summary(list(self._latencies)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps passé à attendre une connexion libre"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.incr("timeouts")
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        record.info["checkout_start"] = start
+        return record
+
+    def recreate(self):
+        # engine.dispose() recrée le pool : on garde les compteurs
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Même mesure pour les moteurs async (create_async_engine)"""
+
+
+# ==========================================================
+# ⚙️ Configuration et écouteurs
+# ==========================================================
+def pool_options(url: str, asynchronous: bool = False) -> dict:
+    """Arguments de create_engine() pour le pool (SQLite mémoire : pool par défaut)"""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(("sqlite:", "aiosqlite:"))):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_PRE_PING == "always",
+    }
+
+
+_pools: dict[str, object] = {}
+
+
+def instrument(engine, name: str = "primary"):
+    """Branche les mesures et le ping « idle » sur le pool du moteur"""
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return engine
+    pool.metrics = PoolMetrics()
+    _pools[name] = engine
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, record):
+        engine.pool.metrics.incr("connects")
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, record):
+        record.info["checkin_at"] = time.monotonic()
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, record, exception):
+        engine.pool.metrics.incr("invalidations")
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, record, proxy):
+        metrics = engine.pool.metrics
+        idle_since = record.info.pop("checkin_at", None)
+        if (
+            DB_PRE_PING == "idle"
+            and idle_since is not None
+            and time.monotonic() - idle_since > DB_PING_IDLE_SECONDS
+        ):
+            metrics.incr("pings")
+            try:
+                cursor = dbapi_connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except Exception as e:
+                # Le pool jette la connexion et en ouvre une nouvelle
+                metrics.incr("ping_failures")
+                raise exc.DisconnectionError() from e
+        start = record.info.pop("checkout_start", None)
+        if start is not None:
+            metrics.record_checkout(time.perf_counter() - start)
+
+    return engine
+
+
+def pool_stats(name: str = "primary") -> dict | None:
+    engine = _pools.get(name)
+    if engine is None:
+        return None
+    pool = engine.pool
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    in_use = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "timeout_s": pool.timeout(),
+        "recycle_s": pool._recycle,
+        "pre_ping": DB_PRE_PING,
+        "in_use": in_use,
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(in_use / capacity, 3) if capacity else 0.0,
+        **pool.metrics.snapshot(),
+    }
+
+
+def all_pool_stats() -> dict:
+    return {name: pool_stats(name) for name in _pools}
@@ -0,0 +1,128 @@
+# app/utils/export.py
+"""
+Exports en flux (NDJSON / CSV) pour le back-office.
+
+Les lignes sont lues par lots avec un curseur côté serveur (yield_per →
+stream_results) et écrites au fil de l'eau dans une StreamingResponse,
+EXPORT_BATCH_SIZE lignes par morceau : la mémoire reste constante quel
+que soit le nombre de lignes.
+"""
+import csv
+import enum
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.database import SessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@dataclass
+class ExportParams:
+    format: str
+    date_from: datetime | None
+    date_to: datetime | None
+
+    @property
+    def streaming(self) -> bool:
+        return self.format != "json"
+
+
+def export_params(
+    format: str = Query("json", pattern="^(json|ndjson|csv)$", description="json (paginé), ndjson ou csv (flux)"),
+    date_from: datetime = Query(None, description="Borne basse incluse"),
+    date_to: datetime = Query(None, description="Borne haute exclue"),
+) -> ExportParams:
+    """Dépendance commune aux listes admin exportables"""
+    return ExportParams(format=format, date_from=date_from, date_to=date_to)
+
+
+def date_range_filters(column, date_from: datetime | None, date_to: datetime | None) -> list:
+    """Bornes [date_from, date_to[ sur une colonne date"""
+    if date_from and date_to and date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from doit précéder date_to")
+    filters = []
+    if date_from:
+        filters.append(column >= date_from)
+    if date_to:
+        filters.append(column < date_to)
+    return filters
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _iter_rows(columns, filters, order_by):
+    # Session dédiée : celle de get_db est fermée avant la fin du flux
+    # (lecture seule : réplica si configuré)
+    db = SessionLocal(read_only=True)
+    try:
+        query = db.query(*columns).filter(*filters)
+        if order_by is not None:
+            query = query.order_by(order_by)
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            yield [_plain(v) for v in row]
+    finally:
+        db.close()
+
+
+def _ndjson(names, rows):
+    # Un morceau par lot : chaque morceau coûte un passage par le threadpool
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n")
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "".join(lines)
+            lines.clear()
+    if lines:
+        yield "".join(lines)
+
+
+def _csv(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(fmt: str, name: str, columns, filters=(), order_by=None) -> StreamingResponse:
+    """
+    Construit la réponse d'export.
+    `columns` : attributs ORM exportés (la clé est le nom de la colonne).
+    """
+    names = [c.key for c in columns]
+    rows = _iter_rows(columns, list(filters), order_by)
+    body = _csv(names, rows) if fmt == "csv" else _ndjson(names, rows)
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    extension = "csv" if fmt == "csv" else "ndjson"
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{stamp}.{extension}"'},
+    )
@@ -0,0 +1,84 @@
+# app/utils/http_cache.py
+"""
+GET conditionnels pour le catalogue : ETag fort, Last-Modified, 304 et
+Cache-Control. Les validateurs sont calculés à partir des versions des
+entités (date_modification, stats d'avis) et mis en cache avec la réponse,
+si bien qu'un 304 ne sérialise jamais le corps.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=30")
+
+
+def make_etag(validators) -> str:
+    """ETag fort dérivé des versions des entités affichées"""
+    digest = hashlib.sha1(repr(validators).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def versioned(body, validators, last_modified: datetime | None = None) -> dict:
+    """Réponse + validateurs, forme stockée dans le cache catalogue"""
+    return {"body": body, "etag": make_etag(validators), "last_modified": last_modified}
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    # Comparaison faible autorisée pour If-None-Match (RFC 9110 §13.1.2)
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)  # fuseau « -0000 » : UTC
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional(request: Request, response: Response, entry: dict, cache_control: str | None = None):
+    """
+    Retourne une 304 vide si le client a déjà la bonne version,
+    sinon pose les en-têtes sur `response` et renvoie le corps.
+    """
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": cache_control or CATALOG_CACHE_CONTROL,
+    }
+    if entry.get("last_modified"):
+        headers["Last-Modified"] = _http_date(entry["last_modified"])
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, entry["etag"])
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = bool(
+            if_modified_since
+            and entry.get("last_modified")
+            and _not_modified_since(if_modified_since, entry["last_modified"])
+        )
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return entry["body"]
@@ -0,0 +1,249 @@
+# app/utils/idempotency.py
+"""
+Clés d'idempotence (en-tête Idempotency-Key) pour les créations rejouées
+par les clients mobiles (commande, paiement) :
+
+    @router.post("/")
+    @idempotent
+    def create_order(...): ...
+
+sur un routeur APIRouter(route_class=IdempotentRoute). Comportement et
+réglages : README.md.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from app.utils.security import authenticated_user_id
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", "65536"))
+
+MAX_KEY_LENGTH = 255
+_NOT_STORED = {401, 403}  # dépendent du token ou du rôle, pas de la requête
+_POLL_INTERVAL = 0.02
+
+RUN, REPLAY, BUSY, MISMATCH = "run", "replay", "busy", "mismatch"
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: bytes
+    headers: list[tuple[str, str]]
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    response: StoredResponse | None = None  # None : requête en cours
+
+
+class IdempotencyStore:
+    """Clés → réponse gardée (ou requête en cours), bornées et expirées dans l'ordre d'arrivée"""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.replays = 0
+        self.waits = 0
+        self.mismatches = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _sweep(self, now: float):
+        # TTL unique : les clés sont rangées par échéance, les expirées sont en tête
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
+            self.expirations += 1
+
+    def _evict(self):
+        if len(self._entries) <= self.max_keys:
+            return
+        done = [key for key, entry in self._entries.items() if entry.response is not None]
+        for key in done[: len(self._entries) - self.max_keys]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def begin(self, key: str, fingerprint: str, waiting: bool = False) -> tuple[str, StoredResponse | None]:
+        """
+        RUN : la clé est réservée pour cette requête (complete() ou abandon()
+        ensuite) ; REPLAY : réponse gardée ; BUSY : requête identique en
+        cours ; MISMATCH : clé déjà employée pour une autre requête.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(fingerprint, now + self.ttl)
+                self._evict()
+                self.executions += 1
+                return RUN, None
+            if entry.fingerprint != fingerprint:
+                self.mismatches += 1
+                return MISMATCH, None
+            if entry.response is None:
+                if not waiting:
+                    self.waits += 1
+                return BUSY, None
+            self.replays += 1
+            return REPLAY, entry.response
+
+    def complete(self, key: str, response: StoredResponse):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.response = response
+
+    def abandon(self, key: str):
+        """Libère une clé sans réponse gardée (erreur serveur) : le prochain essai s'exécute"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.response is None:
+                del self._entries[key]
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = sum(entry.response is None for entry in self._entries.values())
+            return {
+                "backend": "memory",
+                "keys": len(self._entries),
+                "in_flight": in_flight,
+                "max_keys": self.max_keys,
+                "ttl_s": self.ttl,
+                "executions": self.executions,
+                "replays": self.replays,
+                "waits": self.waits,
+                "mismatches": self.mismatches,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+idempotency_store = IdempotencyStore()
+
+
+# ==========================================================
+# 🔁 Exécution d'une route idempotente
+# ==========================================================
+def idempotent(endpoint):
+    """Marque une route : ses répétitions (même Idempotency-Key) rejouent la première réponse"""
+    endpoint.__idempotent__ = True
+    return endpoint
+
+
+def _replay(stored: StoredResponse) -> Response:
+    response = Response(content=stored.body, status_code=stored.status_code)
+    for name, value in stored.headers:
+        response.headers.append(name, value)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _stored(response: Response) -> StoredResponse | None:
+    body = getattr(response, "body", None)
+    if body is None or len(body) > IDEMPOTENCY_MAX_RESPONSE_BYTES:
+        return None  # réponse en flux ou trop volumineuse
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() != "content-length"]
+    return StoredResponse(response.status_code, bytes(body), headers)
+
+
+async def _fingerprint(request: Request) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(await request.body())  # gardé par Request : la route le relit
+    return digest.hexdigest()
+
+
+async def run_idempotent(request: Request, handler, store: IdempotencyStore = idempotency_store) -> Response:
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return await handler(request)
+    if not key.strip() or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)")
+    id_user = await run_in_threadpool(authenticated_user_id, request.headers.get("authorization"))
+    if id_user is None:
+        return await handler(request)  # la route répond 401
+
+    store_key = f"{id_user}:{key}"
+    fingerprint = await _fingerprint(request)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    waiting = False
+    while True:
+        state, stored = store.begin(store_key, fingerprint, waiting=waiting)
+        if state == RUN:
+            break
+        if state == REPLAY:
+            return _replay(stored)
+        if state == MISMATCH:
+            raise HTTPException(
+                status_code=422, detail=f"{IDEMPOTENCY_HEADER} déjà utilisée pour une autre requête"
+            )
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Requête identique en cours, réessayez plus tard")
+        waiting = True
+        await asyncio.sleep(_POLL_INTERVAL)
+
+    try:
+        response = await handler(request)
+    except HTTPException as exc:
+        _finish(store, store_key, _error_response(exc))
+        raise
+    except BaseException:
+        store.abandon(store_key)
+        raise
+    _finish(store, store_key, response)
+    return response
+
+
+def _error_response(exc: HTTPException) -> Response:
+    """Réponse que produira le gestionnaire d'erreurs de FastAPI pour cette exception"""
+    return JSONResponse({"detail": jsonable_encoder(exc.detail)}, status_code=exc.status_code, headers=exc.headers)
+
+
+def _finish(store: IdempotencyStore, key: str, response: Response):
+    storable = response.status_code < 500 and response.status_code not in _NOT_STORED
+    stored = _stored(response) if storable else None
+    if stored is None:
+        store.abandon(key)
+    else:
+        store.complete(key, stored)
+
+
+class IdempotentRoute(APIRoute):
+    """Classe de route : applique run_idempotent aux endpoints marqués @idempotent"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not getattr(self.endpoint, "__idempotent__", False):
+            return handler
+
+        async def idempotent_handler(request: Request) -> Response:
+            return await run_idempotent(request, handler)
+
+        return idempotent_handler
@@ -0,0 +1,220 @@
+# app/utils/image_pipeline.py
+"""
+Pipeline de traitement des images produits.
+
+À chaque upload, l'image d'origine est confiée à un pool de processus qui
+génère des déclinaisons redimensionnées (thumb / card / detail) dans un
+format moderne (WebP par défaut, AVIF si IMAGE_VARIANT_FORMAT=avif et si
+Pillow le supporte). La requête HTTP n'attend jamais ce traitement.
+
+Backfill de la bibliothèque existante :
+    python -m app.utils.image_pipeline
+"""
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.utils.cache import MISS, create_cache
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow absent : pas de déclinaisons, on sert l'original
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "uploads/products"
+VARIANTS_DIR = os.path.join(UPLOAD_ROOT, "variants")
+
+# Taille maximale (largeur et hauteur) de chaque déclinaison
+VARIANT_SIZES = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1200,
+}
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif", ".bmp", ".tiff")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+VARIANTS_CACHE_TTL = float(os.getenv("IMAGE_VARIANTS_CACHE_TTL", "3600"))
+# Une image aux déclinaisons incomplètes est revérifiée plus souvent
+# (génération en cours, ou faite par un autre processus)
+PENDING_VARIANTS_TTL = 30.0
+
+
+def _variant_format() -> str:
+    wanted = os.getenv("IMAGE_VARIANT_FORMAT", "webp").lower()
+    if Image is not None and wanted == "avif" and not features.check("avif"):
+        return "webp"
+    return wanted
+
+
+VARIANT_FORMAT = _variant_format()
+
+
+def _local_path(image_path: str | None) -> str | None:
+    """Chemin disque d'une image stockée localement (None pour une URL externe)"""
+    if not image_path or image_path.startswith(("http://", "https://")):
+        return None
+    image_path = image_path.replace("\\", "/").strip().lstrip("/")
+    if "uploads/" in image_path:
+        image_path = "uploads/" + image_path.split("uploads/", 1)[1]
+    return image_path
+
+
+def variant_path(image_path: str, size: str) -> str | None:
+    local = _local_path(image_path)
+    if local is None:
+        return None
+    stem = os.path.splitext(os.path.basename(local))[0]
+    return f"{VARIANTS_DIR}/{stem}_{size}.{VARIANT_FORMAT}"
+
+
+# {image: {taille: chemin}} : évite un stat par taille à chaque
+# reconstruction du catalogue
+_variants_cache = create_cache("memory", max_entries=10_000, ttl=VARIANTS_CACHE_TTL)
+
+
+def _remember_variants(image_path: str, found: dict[str, str]):
+    ttl = None if len(found) == len(VARIANT_SIZES) else PENDING_VARIANTS_TTL
+    _variants_cache.set(_local_path(image_path), found, ttl)
+
+
+def existing_variants(image_path: str | None) -> dict[str, str]:
+    """{taille: chemin} des déclinaisons déjà générées"""
+    local = _local_path(image_path)
+    if local is None:
+        return {}
+    found = _variants_cache.get(local)
+    if found is MISS:
+        found = {}
+        for size in VARIANT_SIZES:
+            path = variant_path(image_path, size)
+            if os.path.exists(path):
+                found[size] = path
+        _remember_variants(image_path, found)
+    return found
+
+
+# ==========================================================
+# 🖼️ Génération (exécutée dans un processus du pool)
+# ==========================================================
+def generate_variants(image_path: str) -> dict[str, str]:
+    if Image is None:
+        return {}
+    source = _local_path(image_path)
+    if source is None or not os.path.exists(source):
+        return {}
+
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    source_mtime = os.path.getmtime(source)
+    done = {}
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        for size, max_side in VARIANT_SIZES.items():
+            target = variant_path(image_path, size)
+            if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                done[size] = target
+                continue
+
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            tmp = f"{target}.{os.getpid()}.tmp"
+            resized.save(tmp, format=VARIANT_FORMAT.upper(), quality=VARIANT_QUALITY)
+            os.replace(tmp, target)
+            done[size] = target
+
+    return done
+
+
+def delete_variants(image_path: str | None):
+    local = _local_path(image_path)
+    if local is None:
+        return
+    for size in VARIANT_SIZES:
+        try:
+            os.remove(variant_path(image_path, size))
+        except FileNotFoundError:
+            pass
+    _variants_cache.delete(local)
+
+
+# ==========================================================
+# ⚙️ Pool de traitement hors requête
+# ==========================================================
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return _executor
+
+
+def submit(image_path: str | None, on_done=None):
+    """
+    Planifie la génération des déclinaisons sans bloquer la requête.
+    `on_done()` est appelé dans le processus web une fois les fichiers écrits
+    (ex. pour invalider le cache catalogue).
+    """
+    if Image is None or _local_path(image_path) is None:
+        return None
+
+    future = _get_executor().submit(generate_variants, image_path)
+
+    def _callback(f):
+        if f.exception() is not None:
+            logger.warning(
+                "Déclinaisons impossibles", extra={"image": image_path, "erreur": repr(f.exception())}
+            )
+        else:
+            _remember_variants(image_path, f.result())
+            if on_done is not None:
+                on_done()
+
+    future.add_done_callback(_callback)
+    return future
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def backfill(directory: str = UPLOAD_ROOT, workers: int = IMAGE_WORKERS) -> tuple[int, int]:
+    """Génère les déclinaisons manquantes pour toute la bibliothèque"""
+    paths = [
+        f"{directory}/{name}"
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    ok = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(generate_variants, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                ok += 1
+            except Exception as e:
+                failed += 1
+                logger.error("Échec de déclinaison", extra={"image": futures[future], "erreur": repr(e)})
+    return ok, failed
+
+
+if __name__ == "__main__":
+    if Image is None:
+        sys.exit("Pillow n'est pas installé")
+    ok, failed = backfill(sys.argv[1] if len(sys.argv) > 1 else UPLOAD_ROOT)
+    print(f"Déclinaisons générées : {ok} images, {failed} échecs ({VARIANT_FORMAT})")
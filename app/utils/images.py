@@ -1,16 +1,25 @@
 # app/utils/images.py
+from app.utils.image_pipeline import VARIANT_SIZES, existing_variants
 
-def get_image_url(image_path: str | None) -> str | None:
+
+def get_image_url(image_path: str | None, size: str | None = None) -> str | None:
     """
     Convertit un chemin local ou un lien externe en URL exploitable.
     - Corrige tous les doublons uploads/
     - Supprime les slashes en trop
     - Gère les URL externes
+    - size (thumb / card / detail) : déclinaison si elle est déjà générée,
+      sinon l'image d'origine
     """
 
     if not image_path:
         return None
 
+    if size:
+        variant = existing_variants(image_path).get(size)
+        if variant:
+            image_path = variant
+
     # URL externe → ne pas toucher
     if image_path.startswith(("http://", "https://")):
         return image_path
@@ -36,3 +45,15 @@ def get_image_url(image_path: str | None) -> str | None:
         image_path = image_path.replace("//", "/")
 
     return f"http://localhost:8000/{image_path}"
+
+
+def get_image_variants(image_path: str | None) -> dict[str, str] | None:
+    """URL de chaque taille (l'original tant que la déclinaison n'existe pas)"""
+    if not image_path:
+        return None
+    variants = existing_variants(image_path)
+    original = get_image_url(image_path)
+    return {
+        size: get_image_url(variants[size]) if size in variants else original
+        for size in VARIANT_SIZES
+    }
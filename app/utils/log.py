@@ -0,0 +1,216 @@
+# app/utils/log.py
+"""
+Journalisation structurée.
+
+- Enregistrements JSON sur une ligne (LOG_FORMAT=text pour le développement).
+- Handler à file d'attente : la requête ne fait qu'empiler l'enregistrement,
+  un thread dédié (QueueListener) formate et écrit sur stdout.
+- Niveaux par logger : LOG_LEVEL=INFO, LOG_LEVELS="app.routes.auth=DEBUG,sqlalchemy.engine=WARNING".
+- Échantillonnage des DEBUG : LOG_DEBUG_SAMPLE_RATE=0.01 n'en garde qu'un sur cent.
+- Corrélation : chaque requête reçoit un identifiant (en-tête X-Request-ID
+  repris s'il est fourni) présent dans tous ses enregistrements.
+- Secrets masqués : champs password / mot_de_passe / token / secret /
+  authorization, jetons Bearer et JWT dans les messages.
+
+Usage dans un module :
+    logger = logging.getLogger(__name__)
+    logger.info("Connexion réussie", extra={"id_user": user.id_user})
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+REDACTED = "***"
+_SECRET_KEYS = re.compile(r"pass|mot_de_passe|token|secret|authorization|api_key", re.IGNORECASE)
+_SECRET_VALUES = [
+    (re.compile(r"(?i)bearer\s+[A-Za-z0-9\-_.=]+"), f"Bearer {REDACTED}"),
+    (re.compile(r"eyJ[A-Za-z0-9\-_]+\.[A-Za-z0-9\-_]+\.[A-Za-z0-9\-_]+"), REDACTED),
+    (re.compile(r"\$2[abxy]\$\d{2}\$[./A-Za-z0-9]{53}"), REDACTED),  # hash bcrypt
+]
+
+# Attributs standard d'un LogRecord (le reste vient de `extra=`)
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+# ==========================================================
+# 🔒 Masquage des secrets
+# ==========================================================
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if _SECRET_KEYS.search(str(k)) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        for pattern, replacement in _SECRET_VALUES:
+            value = pattern.sub(replacement, value)
+    return value
+
+
+# ==========================================================
+# 🧾 Filtres et formateurs
+# ==========================================================
+class RequestIdFilter(logging.Filter):
+    """Copie l'identifiant de requête courant (ContextVar) dans l'enregistrement"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Ne conserve qu'une fraction des enregistrements DEBUG"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+def _extra_fields(record) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        data.update(redact(_extra_fields(record)))
+        if record.exc_info:
+            data["exc"] = redact(self.formatException(record.exc_info))
+        elif record.exc_text:
+            data["exc"] = redact(record.exc_text)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", None) or "-"
+        line = redact(super().format(record))
+        extra = _extra_fields(record)
+        return f"{line} {json.dumps(redact(extra), ensure_ascii=False, default=str)}" if extra else line
+
+
+class _QueueHandler(QueueHandler):
+    """Message et traceback figés côté requête ; le formatage JSON se fait dans le thread d'écriture"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ==========================================================
+# ⚙️ Configuration
+# ==========================================================
+_listener: QueueListener | None = None
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Installe le handler à file d'attente sur le logger racine (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Vide la file et arrête le thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ==========================================================
+# 🔗 Middleware d'identifiant de requête
+# ==========================================================
+class RequestIdMiddleware:
+    """Middleware ASGI : X-Request-ID entrant (ou généré), renvoyé dans la réponse"""
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
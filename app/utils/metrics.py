@@ -0,0 +1,255 @@
+# app/utils/metrics.py
+"""
+Métriques au format texte Prometheus (GET /metrics), sans dépendance.
+
+- Par route (gabarit /api/products/{id_product}, pas l'URL brute) :
+  nombre de requêtes par méthode et statut, histogramme de latence.
+  Les percentiles se lisent côté Prometheus :
+      histogram_quantile(0.95, sum by (le, route) (rate(drops_http_request_duration_seconds_bucket[5m])))
+- Base : nombre de requêtes SQL et temps passé en base par requête HTTP
+  (écouteurs d'événements SQLAlchemy sur tous les moteurs).
+- Requêtes en cours, occupation du pool de threads AnyIO (routes `def`),
+  état des pools de connexions.
+
+Coût par requête : deux appels perf_counter, un ContextVar et quelques
+additions sous verrou ; aucun formatage hors du scrape.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bornes des histogrammes (secondes / nombre de requêtes SQL)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+# ==========================================================
+# 📈 Types de métriques
+# ==========================================================
+class Histogram:
+    """Histogramme étiqueté (compteurs cumulés à l'export seulement)"""
+
+    def __init__(self, name: str, help_text: str, buckets, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series: dict[tuple, list] = {}  # labels -> [compte par bucket..., +Inf, somme]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in sorted(items):
+            base = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+def _gauge(name: str, help_text: str, samples: list[tuple[dict, float]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(v)}" for labels, v in samples]
+    return lines
+
+
+REQUESTS = Counter("drops_http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status"))
+LATENCY = Histogram(
+    "drops_http_request_duration_seconds", "Durée des requêtes HTTP", LATENCY_BUCKETS, ("method", "route")
+)
+DB_QUERIES = Histogram(
+    "drops_db_queries_per_request", "Requêtes SQL par requête HTTP", QUERY_BUCKETS, ("route",)
+)
+DB_TIME = Histogram(
+    "drops_db_duration_seconds", "Temps passé en base par requête HTTP", LATENCY_BUCKETS, ("route",)
+)
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+# ==========================================================
+# 🗄️ Temps SQL de la requête courante
+# ==========================================================
+class RequestStats:
+    """Compteurs SQL de la requête HTTP courante (partagés avec les threads de la requête)"""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+request_stats_var: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+# ==========================================================
+# 🧭 Middleware
+# ==========================================================
+def route_of(scope) -> str:
+    """Gabarit de route complet ; une URL inconnue ne crée pas de nouvelle série"""
+    # FastAPI récent : contexte de la route incluse, préfixe du routeur compris
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    if path:
+        return path
+    if "app_root_path" in scope:
+        # Application montée (/uploads) : un seul gabarit pour tous ses fichiers
+        return scope.get("root_path", "")[len(scope["app_root_path"]):] + "/{path}"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : compteurs, latence et temps SQL par route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        global _in_flight
+        status = 500
+        stats = RequestStats()
+        token = request_stats_var.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with _in_flight_lock:
+            _in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            with _in_flight_lock:
+                _in_flight -= 1
+            request_stats_var.reset(token)
+
+            method, route = scope["method"], route_of(scope)
+            REQUESTS.inc((method, route, str(status)))
+            LATENCY.observe((method, route), elapsed)
+            if stats.queries:
+                DB_QUERIES.observe((route,), stats.queries)
+                DB_TIME.observe((route,), stats.db_time)
+
+
+# ==========================================================
+# 📤 Export
+# ==========================================================
+def _threadpool_samples() -> list[str]:
+    """Occupation du pool de threads AnyIO (à appeler depuis la boucle d'événements)"""
+    try:
+        from anyio import to_thread
+
+        limiter = to_thread.current_default_thread_limiter()
+    except Exception:
+        return []
+    return _gauge("drops_threadpool_busy", "Threads AnyIO occupés", [({}, limiter.borrowed_tokens)]) + _gauge(
+        "drops_threadpool_size", "Taille du pool de threads AnyIO", [({}, limiter.total_tokens)]
+    )
+
+
+def _pool_samples() -> list[str]:
+    from app.utils.db_pool import all_pool_stats
+
+    pools = {name: stats for name, stats in all_pool_stats().items() if stats}
+    lines = []
+    for key, name, help_text in (
+        ("in_use", "drops_db_pool_in_use", "Connexions empruntées"),
+        ("idle", "drops_db_pool_idle", "Connexions libres"),
+        ("overflow", "drops_db_pool_overflow", "Connexions en débordement"),
+        ("saturation", "drops_db_pool_saturation", "Connexions empruntées / capacité"),
+        ("timeouts", "drops_db_pool_timeouts", "Emprunts abandonnés (DB_POOL_TIMEOUT)"),
+        ("wait_total_s", "drops_db_pool_wait_seconds", "Temps cumulé d'attente d'une connexion"),
+    ):
+        lines += _gauge(name, help_text, [({"pool": pool}, stats[key]) for pool, stats in pools.items()])
+    return lines
+
+
+def render_metrics() -> str:
+    with _in_flight_lock:
+        in_flight = _in_flight
+    lines = []
+    for metric in (REQUESTS, LATENCY, DB_QUERIES, DB_TIME):
+        lines += metric.render()
+    lines += _gauge("drops_http_requests_in_flight", "Requêtes HTTP en cours", [({}, in_flight)])
+    lines += _threadpool_samples()
+    lines += _pool_samples()
+    return "\n".join(lines) + "\n"
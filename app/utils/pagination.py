@@ -0,0 +1,212 @@
+# app/utils/pagination.py
+import base64
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.types import Date, DateTime, Numeric
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "20"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "100"))
+
+
+@dataclass(frozen=True)
+class Keyset:
+    """
+    Ordre de pagination stable : (sort_column, pk_column).
+    La clé primaire départage les égalités sur sort_column.
+    """
+    name: str
+    sort_column: object
+    pk_column: object
+    descending: bool = True
+
+
+@dataclass
+class PageParams:
+    cursor: str | None
+    limit: int
+
+
+def page_params(
+    cursor: str = Query(None, description="Curseur renvoyé par la page précédente (next_cursor)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+) -> PageParams:
+    """Dépendance commune à toutes les routes de liste"""
+    return PageParams(cursor=cursor, limit=limit)
+
+
+# ==========================================================
+# 🔐 Curseurs opaques
+# ==========================================================
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load_value(column, value):
+    if value is None:
+        return None
+    column_type = getattr(column, "type", None)
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column_type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column_type, Numeric) and column_type.asdecimal:
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(keyset: Keyset, sort_value, pk_value) -> str:
+    payload = json.dumps([keyset.name, _dump_value(sort_value), pk_value], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(keyset: Keyset, cursor: str):
+    """Retourne (sort_value, pk_value) ou lève une 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        name, sort_value, pk_value = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if name != keyset.name:
+            raise ValueError(name)
+        return _load_value(keyset.sort_column, sort_value), _load_value(keyset.pk_column, pk_value)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+# ==========================================================
+# 📄 Application du keyset sur une requête
+# ==========================================================
+def apply_keyset(query, keyset: Keyset, params: PageParams):
+    """
+    Ajoute le filtre « après le curseur », le tri et la limite (limit + 1
+    pour savoir s'il existe une page suivante). Fonctionne sur un Query ORM
+    comme sur un select().
+    Les valeurs NULL de sort_column passent avant toutes les autres (ordre
+    natif de MySQL et SQLite : en fin de liste en tri décroissant).
+    """
+    sort, pk = keyset.sort_column, keyset.pk_column
+
+    if params.cursor:
+        sort_value, pk_value = decode_cursor(keyset, params.cursor)
+        if keyset.descending and sort_value is None:
+            after = and_(sort.is_(None), pk < pk_value)
+        elif keyset.descending:
+            after = or_(sort < sort_value, and_(sort == sort_value, pk < pk_value), sort.is_(None))
+        elif sort_value is None:
+            after = or_(and_(sort.is_(None), pk > pk_value), sort.isnot(None))
+        else:
+            after = or_(sort > sort_value, and_(sort == sort_value, pk > pk_value))
+        query = query.filter(after)
+
+    if keyset.descending:
+        query = query.order_by(sort.desc(), pk.desc())
+    else:
+        query = query.order_by(sort.asc(), pk.asc())
+
+    return query.limit(params.limit + 1)
+
+
+def build_page(rows, keyset: Keyset, params: PageParams, key):
+    """
+    Coupe les lignes à `limit` et calcule next_cursor.
+    `key(row)` doit retourner (sort_value, pk_value) pour une ligne.
+    """
+    rows = list(rows)
+    has_more = len(rows) > params.limit
+    rows = rows[:params.limit]
+    next_cursor = encode_cursor(keyset, *key(rows[-1])) if has_more and rows else None
+    return rows, next_cursor
+
+
+def paginate(query, keyset: Keyset, params: PageParams, key):
+    """Raccourci synchrone : apply_keyset + .all() + build_page"""
+    return build_page(apply_keyset(query, keyset, params).all(), keyset, params, key)
+
+
+async def paginate_async(session, stmt, keyset: Keyset, params: PageParams, key, scalars: bool = False):
+    """
+    Équivalent de paginate() pour un select() exécuté sur une AsyncSession.
+    `scalars=True` pour un select(Model) : lignes = objets ORM.
+    """
+    result = await session.execute(apply_keyset(stmt, keyset, params))
+    rows = result.scalars().all() if scalars else result.all()
+    return build_page(rows, keyset, params, key)
+
+
+def attr_key(sort_attr: str, pk_attr: str):
+    """Clé de curseur pour des objets ORM"""
+    return lambda obj: (getattr(obj, sort_attr), getattr(obj, pk_attr))
+
+
+# ==========================================================
+# 🏆 Résultats classés hors base (ex. pertinence de recherche)
+# ==========================================================
+RANKED_KEYSET = Keyset("ranked", None, None)
+
+
+def _ranked_start(ranked, params: PageParams) -> int:
+    if not params.cursor:
+        return 0
+    after = tuple(decode_cursor(RANKED_KEYSET, params.cursor))
+    if not all(isinstance(v, (int, float)) for v in after):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    return next((i for i, entry in enumerate(ranked) if tuple(entry) < after), len(ranked))
+
+
+def _ranked_batches(ranked, params: PageParams, batch_size: int | None):
+    """
+    Générateur partagé par les variantes sync / async : produit les lots
+    d'ids à charger et reçoit en retour {id: ligne} ; se termine en
+    retournant (lignes, next_cursor).
+    """
+    batch_size = batch_size or max(params.limit * 2, 50)
+    page, last = [], None
+    i = _ranked_start(ranked, params)
+    while i < len(ranked) and len(page) <= params.limit:
+        batch = ranked[i:i + batch_size]
+        found = yield [doc_id for _, doc_id in batch]
+        for entry in batch:
+            i += 1
+            row = found.get(entry[1])
+            if row is None:
+                continue
+            if len(page) == params.limit:
+                return page, encode_cursor(RANKED_KEYSET, *last)
+            page.append(row)
+            last = entry
+    return page, None
+
+
+def paginate_ranked(ranked, params: PageParams, fetch, batch_size: int | None = None):
+    """
+    `ranked` : liste [(score, id)] triée par ordre décroissant.
+    `fetch(ids)` : charge les lignes visibles pour ces ids → {id: ligne}
+    (les ids filtrés ou supprimés sont simplement absents).
+    Retourne (lignes, next_cursor) en conservant l'ordre du classement.
+    """
+    steps = _ranked_batches(ranked, params, batch_size)
+    try:
+        ids = next(steps)
+        while True:
+            ids = steps.send(fetch(ids))
+    except StopIteration as done:
+        return done.value
+
+
+async def paginate_ranked_async(ranked, params: PageParams, fetch, batch_size: int | None = None):
+    """Comme paginate_ranked, avec `fetch` coroutine"""
+    steps = _ranked_batches(ranked, params, batch_size)
+    try:
+        ids = next(steps)
+        while True:
+            ids = steps.send(await fetch(ids))
+    except StopIteration as done:
+        return done.value
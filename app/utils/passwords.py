@@ -0,0 +1,164 @@
+# app/utils/passwords.py
+"""
+Service de hachage des mots de passe.
+
+bcrypt est volontairement lent (~250 ms au coût 12) : exécuté sur le pool
+de threads AnyIO, une vague de connexions au lancement d'un drop bloquait
+toutes les autres routes. Les calculs partent donc dans un pool de processus
+dédié et borné :
+- PASSWORD_WORKERS processus (par défaut un par cœur),
+- au plus PASSWORD_MAX_PENDING calculs en attente ; au-delà, 503 immédiat
+  avec Retry-After plutôt qu'une file qui s'allonge,
+- coût bcrypt réglable (BCRYPT_ROUNDS) ; un hash stocké avec un autre coût
+  est recalculé de façon transparente à la connexion suivante.
+
+Mesure du débit (hashs/s par cœur) :
+    python -m app.utils.passwords 10 12
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", str(PASSWORD_WORKERS * 8)))
+
+
+# ==========================================================
+# 🔐 Fonctions pures (exécutées dans les processus du pool)
+# ==========================================================
+def _encode(password: str) -> bytes:
+    """bcrypt ignore tout au-delà de 72 octets : on tronque explicitement"""
+    return password.encode("utf-8")[:72]
+
+
+def hash_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verify_sync(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_encode(password), hashed.encode("utf-8"))
+    except (ValueError, TypeError):
+        return False  # hash absent ou d'un autre format
+
+
+def cost_of(hashed: str) -> int | None:
+    """Coût d'un hash bcrypt ($2b$12$...), None s'il n'est pas lisible"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    return cost_of(hashed) != rounds
+
+
+def _verify_and_upgrade(password: str, hashed: str, rounds: int) -> tuple[bool, str | None]:
+    if not verify_sync(password, hashed):
+        return False, None
+    if needs_rehash(hashed, rounds):
+        return True, hash_sync(password, rounds)
+    return True, None
+
+
+# ==========================================================
+# ⚙️ Pool borné
+# ==========================================================
+class PasswordService:
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Trop de connexions simultanées, réessayez dans un instant",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_sync, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """(mot de passe correct, nouveau hash à enregistrer si le coût a changé)"""
+        return await self._run(_verify_and_upgrade, password, hashed, self.rounds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "rounds": self.rounds,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_service = PasswordService()
+
+
+# ==========================================================
+# 📏 Micro-benchmark
+# ==========================================================
+def benchmark(rounds: int, duration: float = 2.0) -> float:
+    """Hashs par seconde sur un cœur"""
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        hash_sync("benchmark-password", rounds)
+        done += 1
+    return done / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    costs = [int(a) for a in sys.argv[1:]] or [10, 11, 12, 13]
+    print(f"{PASSWORD_WORKERS} processus de hachage configurés")
+    for rounds in costs:
+        per_core = benchmark(rounds)
+        print(
+            f"coût {rounds:>2} : {per_core:7.2f} hashs/s par cœur, "
+            f"{per_core * PASSWORD_WORKERS:8.2f} hashs/s pour le pool, "
+            f"{1000 / per_core:7.1f} ms par hash"
+        )
@@ -0,0 +1,411 @@
+# app/utils/product_import.py
+"""
+Import de produits en masse (CSV ou NDJSON).
+
+- Lecture en flux : le fichier n'est jamais chargé en mémoire, les lignes
+  sont validées (ProductCreate) puis écrites par lots de IMPORT_BATCH_SIZE
+  (bulk_insert_mappings / bulk_update_mappings, un commit par lot).
+- Une ligne avec id_product met à jour ce produit (upsert) et peut ne
+  porter que les colonnes à modifier (ProductUpdate, ex. id_product,stock) ;
+  sans id_product elle crée un produit.
+- Les vendeurs (id_seller) et propriétaires sont vérifiés en une requête
+  par lot : une ligne invalide est rejetée sans faire échouer son lot.
+- Rapport par ligne : numéro de ligne et erreurs, plafonné à
+  IMPORT_MAX_ERRORS entrées (le compte total reste exact).
+- Au-delà de IMPORT_SYNC_MAX_BYTES, l'import part en tâche de fond
+  (IMPORT_WORKERS threads) et se suit via son identifiant.
+
+Colonnes : nom, prix, description, stock, image (URL http(s)),
+id_category, id_product (mise à jour), id_seller (admin uniquement).
+Séparateur CSV « , » ou « ; », prix avec virgule décimale accepté.
+
+Les écritures en masse ne passent pas par les événements ORM : les
+compteurs de références des images locales (storage.py) ne suivent pas un
+remplacement d'image par import ; POST /api/admin/storage/gc les recalcule.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+
+from app import models
+from app.database import SessionLocal
+from app.schemas.product_schema import ProductCreate, ProductUpdate
+from app.utils.cache import invalidate_catalog
+from app.utils.reservations import reservations
+from app.utils.search import product_index
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+IMPORT_SYNC_MAX_BYTES = int(os.getenv("IMPORT_SYNC_MAX_BYTES", str(1024 * 1024)))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+IMPORT_JOB_TTL = float(os.getenv("IMPORT_JOB_TTL", "3600"))
+
+_COPY_CHUNK = 1024 * 1024
+_FIELDS = set(ProductCreate.model_fields) | {"id_product"}
+
+
+# ==========================================================
+# 📋 État d'un import
+# ==========================================================
+@dataclass
+class ImportJob:
+    id_user: int
+    role: str
+    format: str
+    size: int
+    batch_size: int = IMPORT_BATCH_SIZE
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "EN_ATTENTE"   # EN_ATTENTE → EN_COURS → TERMINE | ECHEC
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    bytes_read: int = 0
+    errors: list = field(default_factory=list)
+    message: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    def add_error(self, line: int, errors):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"ligne": line, "erreurs": errors})
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "statut": self.status,
+            "format": self.format,
+            "progression": round(self.bytes_read / self.size, 3) if self.size else 1.0,
+            "lignes": self.rows,
+            "crees": self.inserted,
+            "mis_a_jour": self.updated,
+            "rejetees": self.failed,
+            "erreurs": self.errors,
+            "erreurs_tronquees": self.failed > len(self.errors),
+            "message": self.message,
+        }
+
+
+class _JobStore:
+    """Imports récents en mémoire, purgés IMPORT_JOB_TTL secondes après leur fin"""
+
+    def __init__(self):
+        self._jobs: dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: ImportJob):
+        with self._lock:
+            now = time.time()
+            for job_id in [k for k, j in self._jobs.items() if j.finished_at and now - j.finished_at > IMPORT_JOB_TTL]:
+                del self._jobs[job_id]
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> ImportJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+jobs = _JobStore()
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="product-import")
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+# ==========================================================
+# 📖 Lecture en flux
+# ==========================================================
+class _CountingReader(io.RawIOBase):
+    """Fichier binaire qui compte les octets lus (progression)"""
+
+    def __init__(self, raw, job: ImportJob):
+        self.raw = raw
+        self.job = job
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.job.bytes_read += len(data)
+        return len(data)
+
+
+def _csv_rows(text):
+    first = text.readline()
+    delimiter = ";" if first.count(";") > first.count(",") else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    reader = csv.DictReader(text, fieldnames=[h.strip().lower() for h in header], delimiter=delimiter)
+    for line, row in enumerate(reader, start=2):
+        yield line, row
+
+
+def _ndjson_rows(text):
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            yield line, None
+            continue
+        yield line, row if isinstance(row, dict) else None
+
+
+def _clean(row: dict) -> dict:
+    data = {}
+    for key, value in row.items():
+        if key is None or key not in _FIELDS:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+            if key == "prix":
+                value = value.replace(",", ".")
+        data[key] = value
+    return data
+
+
+def _validate(row: dict | None, job: ImportJob, categories: set[int]):
+    """(mapping prêt à écrire, None) ou (None, erreurs)"""
+    if row is None:
+        return None, ["ligne illisible (objet JSON attendu)"]
+    data = _clean(row)
+    id_product = data.pop("id_product", None)
+    if job.role != "ADMIN":
+        data["id_seller"] = job.id_user
+    try:
+        id_product = int(id_product) if id_product is not None else None
+        product = (ProductCreate if id_product is None else ProductUpdate)(**data)
+    except ValidationError as e:
+        return None, [f"{'.'.join(map(str, err['loc']))} : {err['msg']}" for err in e.errors()]
+    except (TypeError, ValueError):
+        return None, ["id_product : entier attendu"]
+
+    errors = []
+    for name in ("nom", "prix"):
+        if name in product.model_fields_set and getattr(product, name) is None:
+            errors.append(f"{name} : valeur obligatoire")
+    if product.prix is not None and product.prix < 0:
+        errors.append("prix : doit être positif")
+    if product.stock is not None and product.stock < 0:
+        errors.append("stock : doit être positif")
+    if product.id_category is not None and product.id_category not in categories:
+        errors.append(f"id_category : catégorie {product.id_category} inconnue")
+    if product.image and not product.image.startswith(("http://", "https://")):
+        # les fichiers locaux passent par l'upload (déduplication, déclinaisons)
+        errors.append("image : URL http(s) attendue")
+    if errors:
+        return None, errors
+
+    if id_product is None:
+        return product.model_dump(), None
+    # Mise à jour : seules les colonnes présentes dans la ligne sont modifiées
+    return {**product.model_dump(exclude_unset=True), "id_product": id_product}, None
+
+
+# ==========================================================
+# 💾 Écriture par lots
+# ==========================================================
+def _check_sellers(db, job: ImportJob, batch: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+    """Écarte (avec erreur) les lignes dont id_seller ne désigne aucun utilisateur"""
+    if job.role != "ADMIN":
+        return batch  # id_seller imposé : le vendeur connecté
+    ids = {m["id_seller"] for _, m in batch if m.get("id_seller") is not None}
+    if not ids:
+        return batch
+    known = {u for (u,) in db.query(models.User.id_user).filter(models.User.id_user.in_(ids))}
+    kept = []
+    for line, mapping in batch:
+        id_seller = mapping.get("id_seller")
+        if id_seller is not None and id_seller not in known:
+            job.add_error(line, [f"id_seller : vendeur {id_seller} introuvable"])
+        else:
+            kept.append((line, mapping))
+    return kept
+
+
+def _write_batch(db, job: ImportJob, batch: list[tuple[int, dict]]):
+    # Une requête pour vérifier les vendeurs de tout le lot (sinon la
+    # contrainte de clé étrangère ferait échouer le lot entier)
+    batch = _check_sellers(db, job, batch)
+    updates = [(line, m) for line, m in batch if "id_product" in m]
+    inserts = [m for _, m in batch if "id_product" not in m]
+
+    if updates:
+        # Une requête pour vérifier existence et propriétaire de tout le lot
+        ids = [m["id_product"] for _, m in updates]
+        owners = dict(
+            db.query(models.Product.id_product, models.Product.id_seller)
+            .filter(models.Product.id_product.in_(ids))
+            .all()
+        )
+        now = datetime.utcnow()
+        allowed = []
+        for line, mapping in updates:
+            owner = owners.get(mapping["id_product"], -1)
+            if owner == -1:
+                job.add_error(line, [f"id_product : produit {mapping['id_product']} introuvable"])
+            elif job.role != "ADMIN" and owner != job.id_user:
+                job.add_error(line, [f"id_product : produit {mapping['id_product']} d'un autre vendeur"])
+            else:
+                allowed.append({**mapping, "date_modification": now})
+        if allowed:
+            reservations.void_leases(db, [m["id_product"] for m in allowed if "stock" in m])
+            db.bulk_update_mappings(models.Product, allowed)
+        job.updated += len(allowed)
+
+    if inserts:
+        db.bulk_insert_mappings(models.Product, inserts)
+        job.inserted += len(inserts)
+
+    db.commit()
+
+
+def run_import(job: ImportJob, path: str):
+    """Traite le fichier déposé ; met à jour `job` au fil de l'eau"""
+    job.status = "EN_COURS"
+    db = SessionLocal()
+    try:
+        categories = {c for (c,) in db.query(models.Category.id_category)}
+        with open(path, "rb") as raw:
+            text = io.TextIOWrapper(
+                io.BufferedReader(_CountingReader(raw, job)),
+                encoding="utf-8-sig",
+                newline="" if job.format == "csv" else None,
+            )
+            rows = _csv_rows(text) if job.format == "csv" else _ndjson_rows(text)
+
+            batch: list[tuple[int, dict]] = []
+            for line, row in rows:
+                job.rows += 1
+                mapping, errors = _validate(row, job, categories)
+                if errors:
+                    job.add_error(line, errors)
+                    continue
+                batch.append((line, mapping))
+                if len(batch) >= job.batch_size:
+                    _write_batch(db, job, batch)
+                    batch = []
+            if batch:
+                _write_batch(db, job, batch)
+        job.status = "TERMINE"
+    except UnicodeDecodeError:
+        db.rollback()
+        job.status, job.message = "ECHEC", "Fichier illisible : encodage UTF-8 attendu"
+    except Exception as e:
+        db.rollback()
+        job.status, job.message = "ECHEC", "Erreur pendant l'import, lots déjà validés conservés"
+        logger.exception("Import de produits interrompu", extra={"job": job.id, "erreur": repr(e)})
+    finally:
+        db.close()
+        job.bytes_read = job.size if job.status == "TERMINE" else job.bytes_read
+        job.finished_at = time.time()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        if job.inserted or job.updated:
+            invalidate_catalog()
+            product_index.invalidate()
+        logger.info(
+            "Import de produits terminé",
+            extra={"job": job.id, "statut": job.status, "crees": job.inserted,
+                   "mis_a_jour": job.updated, "rejetees": job.failed},
+        )
+
+
+# ==========================================================
+# 🚪 Point d'entrée des routes
+# ==========================================================
+def _detect_format(upload: UploadFile, format: str | None) -> str:
+    if format:
+        return format
+    name = (upload.filename or "").lower()
+    content_type = (upload.content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    raise HTTPException(status_code=400, detail="Format inconnu : précisez format=csv ou format=ndjson")
+
+
+def start_import(upload: UploadFile, user, format: str | None = None, batch_size: int | None = None) -> tuple[bool, dict]:
+    """
+    Copie le fichier (par blocs) puis l'importe : immédiatement s'il est petit,
+    en tâche de fond sinon. Retourne (terminé, rapport).
+    """
+    fmt = _detect_format(upload, format)
+    fd, path = tempfile.mkstemp(prefix="drops_import_", suffix=f".{fmt}")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := upload.file.read(_COPY_CHUNK):
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Fichier d'import trop volumineux")
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    job = ImportJob(
+        id_user=user.id_user,
+        role=user.role,
+        format=fmt,
+        size=size,
+        batch_size=batch_size or IMPORT_BATCH_SIZE,
+    )
+    jobs.add(job)
+
+    if size <= IMPORT_SYNC_MAX_BYTES:
+        run_import(job, path)
+        return True, job.report()
+
+    _get_executor().submit(run_import, job, path)
+    return False, job.report()
+
+
+def import_status(job_id: str, user) -> dict:
+    job = jobs.get(job_id)
+    if job is None or (user.role != "ADMIN" and job.id_user != user.id_user):
+        raise HTTPException(status_code=404, detail="Import introuvable")
+    return job.report()
+
+
+def import_response(done: bool, report: dict):
+    """Rapport complet (200) ou import accepté, à suivre par son id (202)"""
+    return report if done else JSONResponse(status_code=202, content=report)
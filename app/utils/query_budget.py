@@ -0,0 +1,218 @@
+# app/utils/query_budget.py
+"""
+Budget de requêtes SQL par requête HTTP et détection des N+1.
+
+Chaque requête SQL est réduite à une empreinte (littéraux, paramètres et
+listes IN remplacés par « ? ») et comptée pour la requête HTTP en cours.
+- Une même empreinte répétée N_PLUS_ONE_THRESHOLD fois signale un N+1
+  (typiquement un chargement paresseux dans une boucle).
+- Une route peut déclarer son budget :
+
+      @query_budget(3)
+      def get_cart(...):
+
+- QUERY_BUDGET_MODE :
+    off   : rien n'est compté,
+    log   : avertissement dans les logs et rapport cumulé (par défaut),
+    raise : la requête SQL qui dépasse le budget lève QueryBudgetExceeded
+            (à activer dans les tests pour bloquer les régressions).
+
+Rapport des pires routes : GET /api/admin/db/queries.
+Hors requête HTTP (scripts, tests) :
+
+    with track_queries() as tracker:
+        ...
+    assert tracker.total <= 3, tracker.summary()
+"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import route_of
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_REPORT_SIZE = int(os.getenv("QUERY_REPORT_SIZE", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Levée en mode raise quand une route dépasse son budget déclaré"""
+
+
+# ==========================================================
+# 🔎 Empreinte d'une requête
+# ==========================================================
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_IN_LISTS = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(?\s*__\[POSTCOMPILE_\w+\]\s*\)?")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    sql = _POSTCOMPILE.sub("(?)", statement)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PARAMS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _IN_LISTS.sub("IN (?)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+# ==========================================================
+# 🧮 Compteur d'une requête HTTP (ou d'un bloc track_queries)
+# ==========================================================
+class QueryTracker:
+
+    def __init__(self, route: str = "-", budget: int | None = None, scope=None):
+        self.route = route
+        self._budget = budget
+        self._scope = scope
+        self.total = 0
+        self.fingerprints = Counter()
+
+    @property
+    def budget(self) -> int | None:
+        if self._budget is None and self._scope is not None:
+            # Le routage a lieu après l'entrée dans le middleware
+            self._budget = getattr(self._scope.get("endpoint"), "__query_budget__", None)
+        return self._budget
+
+    def record(self, statement: str):
+        self.total += 1
+        self.fingerprints[fingerprint(statement)] += 1
+        budget = self.budget
+        if QUERY_BUDGET_MODE == "raise" and budget is not None and self.total > budget:
+            raise QueryBudgetExceeded(
+                f"{self.route} : {self.total} requêtes SQL pour un budget de {budget}\n{self.summary()}"
+            )
+
+    def repeated(self) -> list[tuple[str, int]]:
+        """Empreintes répétées au-delà du seuil N+1"""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= N_PLUS_ONE_THRESHOLD]
+
+    def over_budget(self) -> bool:
+        budget = self.budget
+        return budget is not None and self.total > budget
+
+    def summary(self, limit: int = 5) -> str:
+        return "\n".join(f"{n:>4} × {fp[:200]}" for fp, n in self.fingerprints.most_common(limit))
+
+
+_tracker_var: ContextVar[QueryTracker | None] = ContextVar("query_tracker", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    tracker = _tracker_var.get()
+    if tracker is not None:
+        tracker.record(statement)
+
+
+@contextmanager
+def track_queries(budget: int | None = None, route: str = "-"):
+    tracker = QueryTracker(route, budget)
+    token = _tracker_var.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker_var.reset(token)
+
+
+def query_budget(max_queries: int):
+    """Déclare le nombre maximal de requêtes SQL d'une route"""
+
+    def decorate(endpoint):
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+
+    return decorate
+
+
+# ==========================================================
+# 📋 Rapport cumulé
+# ==========================================================
+class QueryReport:
+    """Pires routes observées depuis le démarrage (par route, bornées)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict] = {}
+
+    def add(self, tracker: QueryTracker):
+        repeated = tracker.repeated()
+        over = tracker.over_budget()
+        with self._lock:
+            entry = self._routes.setdefault(
+                tracker.route,
+                {"requests": 0, "max_queries": 0, "n_plus_one": 0, "over_budget": 0, "budget": None, "worst": []},
+            )
+            entry["requests"] += 1
+            entry["budget"] = tracker.budget
+            entry["n_plus_one"] += bool(repeated)
+            entry["over_budget"] += over
+            if tracker.total > entry["max_queries"]:
+                entry["max_queries"] = tracker.total
+                entry["worst"] = [{"sql": fp[:500], "count": n} for fp, n in tracker.fingerprints.most_common(5)]
+
+    def top(self, limit: int = QUERY_REPORT_SIZE) -> list[dict]:
+        with self._lock:
+            routes = [{"route": route, **entry} for route, entry in self._routes.items()]
+        routes.sort(key=lambda r: (r["n_plus_one"] + r["over_budget"], r["max_queries"]), reverse=True)
+        return routes[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+query_report = QueryReport()
+
+
+# ==========================================================
+# 🧭 Middleware
+# ==========================================================
+class QueryBudgetMiddleware:
+    """Middleware ASGI : compte les requêtes SQL de chaque requête HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_BUDGET_MODE == "off":
+            return await self.app(scope, receive, send)
+
+        tracker = QueryTracker(scope=scope)
+        token = _tracker_var.set(tracker)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _tracker_var.reset(token)
+            if tracker.total:
+                tracker.route = f"{scope['method']} {route_of(scope)}"
+                query_report.add(tracker)
+                self._warn(tracker)
+
+    @staticmethod
+    def _warn(tracker: QueryTracker):
+        repeated = tracker.repeated()
+        if repeated:
+            logger.warning(
+                "N+1 probable",
+                extra={"route": tracker.route, "queries": tracker.total,
+                       "repeated": [{"sql": fp[:300], "count": n} for fp, n in repeated[:3]]},
+            )
+        if tracker.over_budget():
+            logger.warning(
+                "Budget de requêtes SQL dépassé",
+                extra={"route": tracker.route, "queries": tracker.total, "budget": tracker.budget},
+            )
@@ -0,0 +1,504 @@
+# app/utils/reservations.py
+"""
+Réservations de stock pour les drops (RESERVATIONS_ENABLED) : chaque worker
+prélève le stock par lots (baux, table stock_leases) et y tient en mémoire
+les unités réservées au panier jusqu'à la commande.
+
+Invariant en base : products.stock + baux + unités vendues = stock initial ;
+une réservation ne peut pas vendre plus que le bail enregistré. Exploitation
+et reprise après incident : README.md.
+"""
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.cart_service import out_of_stock_error
+from app.utils.db_pool import instrument, pool_options
+
+RESERVATIONS_ENABLED = os.getenv("RESERVATIONS_ENABLED", "false").lower() in ("1", "true", "yes")
+RESERVATION_TTL = float(os.getenv("RESERVATION_TTL", "900"))
+RESERVATION_LEASE_CHUNK = int(os.getenv("RESERVATION_LEASE_CHUNK", "20"))
+RESERVATION_SHARDS = int(os.getenv("RESERVATION_SHARDS", "64"))
+RESERVATION_RECONCILE_INTERVAL = float(os.getenv("RESERVATION_RECONCILE_INTERVAL", "1.0"))
+RESERVATION_IDLE_RETURN = float(os.getenv("RESERVATION_IDLE_RETURN", "60"))
+RESERVATION_LEASE_STALE = float(os.getenv("RESERVATION_LEASE_STALE", "120"))
+RESERVATION_DB_POOL = int(os.getenv("RESERVATION_DB_POOL", "2"))
+
+logger = logging.getLogger(__name__)
+
+Product = models.Product
+Lease = models.StockLease
+
+
+def _create_bind():
+    """
+    Pool dédié : un bail est pris sous le verrou du produit ; pris sur le pool
+    des routes, il pourrait attendre une connexion tenue par une requête
+    elle-même en attente de ce verrou.
+    """
+    from app.database import SQLALCHEMY_DATABASE_URL, _connect_args, engine
+
+    options = pool_options(SQLALCHEMY_DATABASE_URL)
+    if not options:
+        return engine  # SQLite en mémoire : la base n'existe que dans ce moteur
+    options.update(pool_size=RESERVATION_DB_POOL, max_overflow=0)
+    return instrument(
+        create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args(SQLALCHEMY_DATABASE_URL), **options),
+        name="reservations",
+    )
+
+
+class _Sku:
+    """Compteur d'un produit dans ce worker (sous le verrou de son groupe)"""
+
+    __slots__ = ("leased", "held", "holds", "expiries", "touched", "sold_out")
+
+    def __init__(self):
+        self.leased = 0  # unités du bail (ligne stock_leases)
+        self.held = 0  # dont réservées
+        self.holds: dict[int, tuple[int, float]] = {}  # id_user → (quantité, échéance)
+        self.expiries: list[tuple[float, int]] = []  # tas (échéance, id_user), entrées périmées ignorées
+        self.touched = time.monotonic()
+        self.sold_out: tuple[float, str | None, int] | None = None  # (jusqu'à, nom, stock en base) après un refus
+
+    @property
+    def free(self) -> int:
+        return self.leased - self.held
+
+
+class ReservationEngine:
+    """Réservations par utilisateur sur des baux de stock pris par lots"""
+
+    def __init__(
+        self,
+        enabled: bool = RESERVATIONS_ENABLED,
+        ttl: float = RESERVATION_TTL,
+        chunk: int = RESERVATION_LEASE_CHUNK,
+        shards: int = RESERVATION_SHARDS,
+        interval: float = RESERVATION_RECONCILE_INTERVAL,
+        idle_return: float = RESERVATION_IDLE_RETURN,
+        stale: float = RESERVATION_LEASE_STALE,
+        bind=None,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.chunk = max(1, chunk)
+        self.interval = interval
+        self.idle_return = idle_return
+        self.stale = stale
+        self._bind = bind
+        self._worker: tuple[int, str] | None = None
+        self._skus: dict[int, _Sku] = {}
+        self._locks = [threading.Lock() for _ in range(max(1, shards))]
+        self._counts = [Counter() for _ in self._locks]
+        self._rows: set[int] = set()  # produits ayant une ligne stock_leases à notre nom
+        self._suspect: set[int] = set()  # baux à relire (vente repliée sur products.stock)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.last_reconcile: float | None = None
+        self.failures = 0
+
+    @property
+    def bind(self):
+        if self._bind is None:
+            with self._lock:
+                if self._bind is None:
+                    self._bind = _create_bind()
+        return self._bind
+
+    @property
+    def worker(self) -> str:
+        """Identifiant des baux de ce processus (renouvelé après un fork)"""
+        pid = os.getpid()
+        if self._worker is None or self._worker[0] != pid:
+            self._worker = (pid, f"{socket.gethostname()[:40]}:{pid}:{uuid.uuid4().hex[:8]}")
+        return self._worker[1]
+
+    # ---------- compteur en mémoire ----------
+    def _shard(self, id_product: int) -> int:
+        return id_product % len(self._locks)
+
+    def _sku(self, id_product: int) -> _Sku:
+        sku = self._skus.get(id_product)
+        if sku is None:
+            sku = self._skus[id_product] = _Sku()
+        return sku
+
+    @staticmethod
+    def _expire(sku: _Sku, now: float, counts: Counter):
+        while sku.expiries and sku.expiries[0][0] <= now:
+            expires, id_user = heapq.heappop(sku.expiries)
+            hold = sku.holds.get(id_user)
+            if hold is not None and hold[1] == expires:
+                del sku.holds[id_user]
+                sku.held -= hold[0]
+                counts["expired"] += 1
+
+    def _set(self, sku: _Sku, id_user: int, quantite: int, now: float):
+        previous = sku.holds.pop(id_user, None)
+        if previous is not None:
+            sku.held -= previous[0]
+        if quantite > 0:
+            expires = now + self.ttl
+            sku.holds[id_user] = (quantite, expires)
+            sku.held += quantite
+            heapq.heappush(sku.expiries, (expires, id_user))
+        sku.touched = now
+
+    def _hold(self, id_user: int, id_product: int, quantite: int) -> int:
+        shard = self._shard(id_product)
+        with self._locks[shard]:
+            counts = self._counts[shard]
+            sku = self._sku(id_product)
+            now = time.monotonic()
+            self._expire(sku, now, counts)
+            previous = sku.holds.get(id_user, (0, 0.0))[0]
+            missing = quantite - previous - sku.free
+            if missing > 0:
+                self._lease(id_product, sku, missing, quantite, previous, now, counts)
+            self._set(sku, id_user, quantite, now)
+            if quantite > 0:
+                counts["reserved"] += 1
+            return previous
+
+    def hold(self, id_user: int, quantities: dict[int, int]):
+        """
+        Fixe les quantités réservées par l'utilisateur ({id_product: quantité},
+        0 libère) et repousse leur échéance. 409 (ou 404) si le stock manque :
+        les réservations de l'appel sont alors rétablies.
+        """
+        if not self.enabled or not quantities:
+            return
+        self.start()
+        done = {}
+        try:
+            for id_product in sorted(quantities):
+                done[id_product] = self._hold(id_user, id_product, quantities[id_product])
+        except HTTPException:
+            for id_product, previous in done.items():
+                try:
+                    self._hold(id_user, id_product, previous)
+                except HTTPException:
+                    pass  # unités reprises entre-temps : la commande passera par products.stock
+            raise
+
+    def release(self, id_user: int, ids):
+        """Libère les réservations de l'utilisateur sur ces produits"""
+        if self.enabled:
+            for id_product in ids:
+                self._hold(id_user, id_product, 0)
+
+    def covered(self, id_user: int, quantities: dict[int, int]) -> dict[int, int]:
+        """Part de chaque quantité couverte par une réservation en cours de l'utilisateur"""
+        if not self.enabled:
+            return {}
+        covered = {}
+        now = time.monotonic()
+        for id_product, quantite in quantities.items():
+            shard = self._shard(id_product)
+            with self._locks[shard]:
+                sku = self._skus.get(id_product)
+                if sku is None:
+                    continue
+                self._expire(sku, now, self._counts[shard])
+                hold = sku.holds.get(id_user)
+                if hold is not None:
+                    covered[id_product] = min(hold[0], quantite)
+        return covered
+
+    def consume(self, id_user: int, covered: dict[int, int], sold: dict[int, int]):
+        """
+        Après commit de la commande : les réservations couvertes sont levées,
+        les unités vendues sur le bail (sold) en sortent.
+        """
+        now = time.monotonic()
+        for id_product in covered:
+            shard = self._shard(id_product)
+            with self._locks[shard]:
+                sku = self._skus.get(id_product)
+                if sku is None:
+                    continue
+                self._set(sku, id_user, 0, now)
+                if id_product in sold:
+                    sku.leased -= sold[id_product]
+                    self._counts[shard]["sold"] += sold[id_product]
+                else:
+                    self._suspect.add(id_product)
+
+    # ---------- baux en base ----------
+    def _lease(self, id_product: int, sku: _Sku, missing: int, quantite: int, previous: int,
+               now: float, counts: Counter):
+        """Prend un lot (ou au moins missing unités) sur products.stock ; 409/404 sinon"""
+        if sku.sold_out is None or sku.sold_out[0] <= now or missing <= sku.sold_out[2]:
+            for amount in sorted({max(missing, self.chunk), missing}, reverse=True):
+                if self._take(id_product, amount):
+                    sku.leased += amount
+                    sku.sold_out = None
+                    counts["leases"] += 1
+                    return
+            with self.bind.connect() as conn:
+                row = conn.execute(
+                    select(Product.nom, Product.stock).where(Product.id_product == id_product)
+                ).first()
+            nom, stock = (row.nom, row.stock or 0) if row is not None else (None, 0)
+            sku.sold_out = (now + self.interval, nom, stock)
+        counts["rejected"] += 1
+        _, nom, stock = sku.sold_out
+        raise out_of_stock_error(id_product, nom, quantite, stock + previous + max(sku.free, 0))
+
+    def _credit(self, conn, id_product: int, amount: int):
+        now = datetime.utcnow()
+        credited = conn.execute(
+            update(Lease)
+            .where(Lease.worker == self.worker, Lease.id_product == id_product)
+            .values(quantite=Lease.quantite + amount, date_modification=now)
+        ).rowcount
+        if not credited:
+            conn.execute(insert(Lease).values(
+                worker=self.worker, id_product=id_product, quantite=amount, date_modification=now,
+            ))
+
+    def _take(self, id_product: int, amount: int) -> bool:
+        # Même ordre de verrous que la commande (bail puis produit) ; la ligne
+        # de bail n'est créée qu'après coup, quand elle n'existe pas encore.
+        known = id_product in self._rows
+        with self.bind.connect() as conn:
+            if known:
+                self._credit(conn, id_product, amount)
+            taken = conn.execute(
+                update(Product)
+                .where(Product.id_product == id_product, Product.stock >= amount)
+                .values(stock=Product.stock - amount)
+            ).rowcount
+            if not taken:
+                conn.rollback()
+                return False
+            if not known:
+                self._credit(conn, id_product, amount)
+            conn.commit()
+        self._rows.add(id_product)
+        return True
+
+    def sell(self, db: Session, id_product: int, quantite: int) -> bool:
+        """Vend des unités réservées sur le bail, dans la transaction de la commande"""
+        return bool(db.execute(
+            update(Lease)
+            .where(Lease.worker == self.worker, Lease.id_product == id_product, Lease.quantite >= quantite)
+            .values(quantite=Lease.quantite - quantite)
+            .execution_options(synchronize_session=False)
+        ).rowcount)
+
+    def void_leases(self, db: Session, ids):
+        """
+        Avant une écriture absolue de products.stock, dans sa transaction :
+        supprime les baux de ces produits (tous workers) sans les rendre.
+        La nouvelle valeur est le stock initial : restitués plus tard, les
+        baux s'y ajouteraient. Les workers recalent leur mémoire au tour
+        suivant et leurs commandes passent par products.stock.
+        """
+        ids = sorted(set(ids))
+        if not self.enabled or not ids:
+            return
+        db.execute(
+            delete(Lease).where(Lease.id_product.in_(ids)).execution_options(synchronize_session=False)
+        )
+        self._suspect.update(ids)
+
+    @staticmethod
+    def _release_rows(conn, rows, cutoff: datetime | None = None) -> int:
+        """Rend des baux à products.stock et supprime leurs lignes ; un bail modifié entre-temps est ignoré"""
+        released = 0
+        for id_lease, id_product, quantite in sorted(rows, key=lambda row: row[1]):
+            stmt = delete(Lease).where(Lease.id_lease == id_lease, Lease.quantite == quantite)
+            if cutoff is not None:
+                stmt = stmt.where(Lease.date_modification < cutoff)
+            if conn.execute(stmt).rowcount and quantite > 0:
+                conn.execute(
+                    update(Product).where(Product.id_product == id_product).values(stock=Product.stock + quantite)
+                )
+                released += quantite
+        return released
+
+    def _resync(self, ids: set[int] | None = None):
+        """Recale les baux en mémoire sur la base (tous, ou ceux de ids)"""
+        with self.bind.connect() as conn:
+            rows = dict(conn.execute(
+                select(Lease.id_product, Lease.quantite).where(Lease.worker == self.worker)
+            ).all())
+        self._rows = set(rows)
+        targets = set(self._skus) | set(rows) if ids is None else ids
+        for id_product in targets:
+            shard = self._shard(id_product)
+            with self._locks[shard]:
+                sku = self._sku(id_product)
+                sku.leased = rows.get(id_product, 0)
+                # Réservations sans unités derrière : levées (la commande passera par products.stock)
+                while sku.held > sku.leased and sku.holds:
+                    quantite, _ = sku.holds.pop(next(iter(sku.holds)))
+                    sku.held -= quantite
+                    self._counts[shard]["dropped"] += 1
+        self._suspect -= targets
+
+    # ---------- réconciliation ----------
+    def _collect_returns(self, now: float) -> dict[int, int]:
+        returns = {}
+        for id_product, sku in list(self._skus.items()):
+            shard = self._shard(id_product)
+            with self._locks[shard]:
+                self._expire(sku, now, self._counts[shard])
+                sku.sold_out = None  # stock relu au prochain refus (restitutions, reprises, réassort)
+                idle = not sku.holds and now - sku.touched > self.idle_return
+                if idle and sku.leased == 0:
+                    del self._skus[id_product]
+                    continue
+                excess = sku.free - (0 if idle else self.chunk)
+                if excess > 0:
+                    sku.leased -= excess
+                    returns[id_product] = excess
+        return returns
+
+    def reconcile(self) -> dict:
+        """
+        Un tour du fil de fond : expirations, restitution des unités libres
+        en excès, horodatage des baux et reprise des baux orphelins.
+        """
+        returns = self._collect_returns(time.monotonic())
+        lost = set()
+        try:
+            with self.bind.connect() as conn:
+                for id_product in sorted(returns):
+                    amount = returns[id_product]
+                    debited = conn.execute(
+                        update(Lease)
+                        .where(Lease.worker == self.worker, Lease.id_product == id_product, Lease.quantite >= amount)
+                        .values(quantite=Lease.quantite - amount)
+                    ).rowcount
+                    if debited:
+                        conn.execute(
+                            update(Product)
+                            .where(Product.id_product == id_product)
+                            .values(stock=Product.stock + amount)
+                        )
+                    else:
+                        lost.add(id_product)
+                beat = conn.execute(
+                    update(Lease).where(Lease.worker == self.worker).values(date_modification=datetime.utcnow())
+                ).rowcount
+                conn.commit()
+        except Exception:
+            for id_product, amount in returns.items():
+                with self._locks[self._shard(id_product)]:
+                    self._sku(id_product).leased += amount
+            raise
+
+        if beat < len(self._rows) or lost:
+            logger.warning("Baux de stock repris par un autre worker ou annulés", extra={"worker": self.worker})
+            self._resync()
+        elif self._suspect:
+            self._resync(set(self._suspect))
+
+        recovered = self.recover_stale()
+        returned = sum(amount for id_product, amount in returns.items() if id_product not in lost)
+        with self._lock:
+            self.last_reconcile = time.time()
+        return {"returned": returned, "recovered": recovered}
+
+    def recover_stale(self) -> int:
+        """Rend à products.stock les baux des workers qui ne les horodatent plus"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale)
+        with self.bind.connect() as conn:
+            rows = conn.execute(
+                select(Lease.id_lease, Lease.id_product, Lease.quantite)
+                .where(Lease.worker != self.worker, Lease.date_modification < cutoff)
+            ).all()
+            if not rows:
+                return 0
+            recovered = self._release_rows(conn, rows, cutoff)
+            conn.commit()
+        if recovered:
+            logger.warning("Baux orphelins rendus au stock", extra={"units": recovered, "leases": len(rows)})
+        return recovered
+
+    # ---------- fil de fond ----------
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="stock-reconcile", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                logger.exception("Réconciliation des réservations de stock impossible")
+
+    def shutdown(self):
+        """Arrêt : tous les baux du worker (réservations comprises) reviennent à products.stock"""
+        if not self.enabled:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        if not self._rows:
+            return
+        try:
+            with self.bind.connect() as conn:
+                rows = conn.execute(
+                    select(Lease.id_lease, Lease.id_product, Lease.quantite).where(Lease.worker == self.worker)
+                ).all()
+                released = self._release_rows(conn, rows)
+                conn.commit()
+            self._skus.clear()
+            self._rows.clear()
+            logger.info("Baux de stock rendus à l'arrêt", extra={"units": released})
+        except Exception:
+            logger.exception("Baux de stock non rendus à l'arrêt (repris après RESERVATION_LEASE_STALE)")
+
+    def stats(self) -> dict:
+        counts = Counter()
+        skus = holds = held = leased = 0
+        for id_product, sku in list(self._skus.items()):
+            with self._locks[self._shard(id_product)]:
+                skus += 1
+                holds += len(sku.holds)
+                held += sku.held
+                leased += sku.leased
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                counts.update(self._counts[shard])
+        return {
+            "enabled": self.enabled,
+            "worker": self.worker,
+            "products": skus,
+            "holds": holds,
+            "held_units": held,
+            "leased_units": leased,
+            **{key: counts[key] for key in ("reserved", "rejected", "expired", "dropped", "leases", "sold")},
+            "failures": self.failures,
+            "last_reconcile": self.last_reconcile,
+            "ttl_s": self.ttl,
+            "lease_chunk": self.chunk,
+            "shards": len(self._locks),
+        }
+
+
+reservations = ReservationEngine()
@@ -0,0 +1,153 @@
+# app/utils/review_stats.py
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import models
+
+NOTE_MIN = 1
+NOTE_MAX = 5
+
+Stats = models.ProductReviewStats
+Review = models.ProductReview
+
+
+def _aggregate_columns():
+    """Colonnes d'agrégation (count, somme, histogramme) sur product_reviews"""
+    return [
+        func.count(Review.id_review),
+        func.coalesce(func.sum(Review.note), 0),
+        *[
+            func.coalesce(func.sum(case((Review.note == n, 1), else_=0)), 0)
+            for n in range(NOTE_MIN, NOTE_MAX + 1)
+        ],
+    ]
+
+
+_STATS_COLUMNS = ["nb_reviews", "somme_notes", *[f"nb_{n}" for n in range(NOTE_MIN, NOTE_MAX + 1)]]
+
+
+def apply_review_change(db: Session, id_product: int, old_note: int | None = None, new_note: int | None = None):
+    """
+    Applique un delta aux statistiques d'un produit dans la transaction courante.
+    - old_note=None  → nouvel avis
+    - new_note=None  → avis supprimé
+    Le commit reste à la charge de l'appelant.
+    """
+    deltas: dict[str, int] = {}
+
+    if old_note is None and new_note is not None:
+        deltas["nb_reviews"] = 1
+    elif old_note is not None and new_note is None:
+        deltas["nb_reviews"] = -1
+
+    somme = (new_note or 0) - (old_note or 0)
+    if somme:
+        deltas["somme_notes"] = somme
+
+    if old_note != new_note:
+        if old_note is not None:
+            deltas[f"nb_{old_note}"] = deltas.get(f"nb_{old_note}", 0) - 1
+        if new_note is not None:
+            deltas[f"nb_{new_note}"] = deltas.get(f"nb_{new_note}", 0) + 1
+
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        if db.get(Stats, id_product) is None:
+            _insert_from_reviews(db, id_product)
+        return
+
+    # UPDATE atomique côté base : pas de lecture-modification-écriture
+    stmt = (
+        update(Stats)
+        .where(Stats.id_product == id_product)
+        .values({getattr(Stats, col): getattr(Stats, col) + delta for col, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(stmt).rowcount:
+        return
+
+    # Première écriture pour ce produit : on part des avis existants (déjà flushés)
+    db.flush()
+    try:
+        with db.begin_nested():
+            _insert_from_reviews(db, id_product)
+    except IntegrityError:
+        # Une requête concurrente a créé la ligne entre-temps
+        db.execute(stmt)
+
+
+def _insert_from_reviews(db: Session, id_product: int):
+    row = db.execute(select(*_aggregate_columns()).where(Review.id_product == id_product)).one()
+    db.add(Stats(id_product=id_product, **dict(zip(_STATS_COLUMNS, row))))
+    db.flush()
+
+
+def get_stats(db: Session, id_product: int):
+    """Relit la ligne de statistiques (après un UPDATE atomique)"""
+    return db.get(Stats, id_product, populate_existing=True)
+
+
+def remove_user_reviews(db: Session, id_user: int) -> int:
+    """
+    Retire des statistiques les avis d'un utilisateur avant sa suppression
+    (les lignes product_reviews partent ensuite en cascade) et recalcule
+    Product.note_moyenne des produits touchés. Le commit reste à la charge
+    de l'appelant. Retourne le nombre d'avis retirés.
+    """
+    rows = db.execute(
+        select(Review.id_product, Review.note).where(Review.id_user == id_user, Review.id_product.isnot(None))
+    ).all()
+    for id_product, note in rows:
+        apply_review_change(db, id_product, old_note=note, new_note=None)
+    for id_product in {id_product for id_product, _ in rows}:
+        stats = get_stats(db, id_product)
+        avg = round((stats.note_moyenne if stats else None) or 5, 2)
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id_product == id_product)
+            .values(note_moyenne=avg, date_modification=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    return len(rows)
+
+
+def rebuild_review_stats(db: Session) -> int:
+    """
+    Recalcule entièrement product_review_stats depuis product_reviews
+    et resynchronise Product.note_moyenne. Retourne le nombre de produits.
+    """
+    db.execute(delete(Stats))
+    source = (
+        select(Review.id_product, *_aggregate_columns())
+        .where(Review.id_product.isnot(None))
+        .group_by(Review.id_product)
+    )
+    db.execute(insert(Stats).from_select(["id_product", *_STATS_COLUMNS], source))
+
+    avg = (
+        select(func.round(Stats.somme_notes * 1.0 / Stats.nb_reviews, 2))
+        .where(Stats.id_product == models.Product.id_product, Stats.nb_reviews > 0)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(models.Product)
+        .values(note_moyenne=func.coalesce(avg, 5))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.query(func.count(Stats.id_product)).scalar()
+
+
+if __name__ == "__main__":
+    # python -m app.utils.review_stats
+    from app.database import SessionLocal, Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        total = rebuild_review_stats(session)
+        print(f"product_review_stats reconstruite : {total} produits")
+    finally:
+        session.close()
@@ -0,0 +1,297 @@
+# app/utils/search.py
+"""
+Moteur de recherche plein texte en mémoire pour le catalogue.
+
+- Index inversé sur Product.nom et Product.description
+- Repli des accents (« télé » trouve « Télévision ») et mots vides français
+- Classement BM25 (nom pondéré plus fort que la description)
+- Dernier mot traité comme préfixe (recherche à la frappe)
+
+L'index vit dans le processus : il fonctionne à l'identique sur MySQL et
+SQLite. Chaque écriture produit l'y répercute ; il est aussi reconstruit
+périodiquement (SEARCH_INDEX_TTL) pour rattraper les écritures faites par
+d'autres workers. Seule la première construction bloque une requête : les
+suivantes tournent dans un thread pendant que l'ancien index continue de
+répondre, et les écritures faites pendant la reconstruction y sont rejouées.
+"""
+import math
+import os
+import re
+import threading
+import time
+import logging
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_TTL = int(os.getenv("SEARCH_INDEX_TTL", "300"))
+
+FIELD_WEIGHTS = {"nom": 3.0, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_PREFIX_LENGTH = 2
+
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "en", "et",
+    "la", "le", "les", "leur", "ou", "par", "pour", "sa", "se", "ses", "son",
+    "sur", "un", "une", "d", "l", "the", "and", "of", "for",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+
+def fold(text: str) -> str:
+    """Minuscules + suppression des accents"""
+    text = text.lower().translate(_LIGATURES)
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+
+def _weigh(fields: dict) -> tuple[dict[str, float], float]:
+    """Fréquences pondérées des termes d'un document et sa longueur pondérée"""
+    weighted: dict[str, float] = defaultdict(float)
+    length = 0.0
+    for field, weight in FIELD_WEIGHTS.items():
+        tokens = tokenize(fields.get(field))
+        length += weight * len(tokens)
+        for token in tokens:
+            weighted[token] += weight
+    return weighted, length
+
+
+class SearchIndex:
+    """Index inversé BM25 thread-safe (ajout / suppression incrémentaux)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self.doc_terms: dict[int, tuple[str, ...]] = {}
+        self.doc_len: dict[int, float] = {}
+        self.total_len = 0.0
+        self.vocabulary: list[str] = []
+
+    # ----------------------------------------------------------
+    # ✏️ Mises à jour
+    # ----------------------------------------------------------
+    def add(self, doc_id: int, **fields):
+        weighted, length = _weigh(fields)
+        with self._lock:
+            self._insert(doc_id, weighted, length)
+
+    def _insert(self, doc_id: int, weighted: dict[str, float], length: float, sort_vocabulary: bool = True):
+        self._remove(doc_id)
+        for term, tf in weighted.items():
+            if sort_vocabulary and term not in self.postings:
+                insort(self.vocabulary, term)
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = tuple(weighted)
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def remove(self, doc_id: int):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(doc_id, 0.0)
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+                i = bisect_left(self.vocabulary, term)
+                if i < len(self.vocabulary) and self.vocabulary[i] == term:
+                    del self.vocabulary[i]
+
+    def replace_all(self, documents):
+        """Reconstruit l'index à partir d'itérables (doc_id, fields)"""
+        fresh = SearchIndex()
+        for doc_id, fields in documents:
+            fresh._insert(doc_id, *_weigh(fields), sort_vocabulary=False)
+        # Un seul tri à la fin plutôt qu'une insertion triée par terme nouveau
+        fresh.vocabulary = sorted(fresh.postings)
+        with self._lock:
+            self.postings = fresh.postings
+            self.doc_terms = fresh.doc_terms
+            self.doc_len = fresh.doc_len
+            self.total_len = fresh.total_len
+            self.vocabulary = fresh.vocabulary
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    # ----------------------------------------------------------
+    # 🔍 Recherche
+    # ----------------------------------------------------------
+    def _expand_prefix(self, prefix: str) -> list[str]:
+        i = bisect_left(self.vocabulary, prefix)
+        terms = []
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            terms.append(self.vocabulary[i])
+            i += 1
+        return terms
+
+    def search(self, query: str, prefix_last: bool = True) -> list[tuple[float, int]]:
+        """
+        Retourne [(score, doc_id)] triés par pertinence décroissante.
+        Tous les mots de la requête doivent apparaître (ET logique).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return []
+            avg_len = (self.total_len / n_docs) or 1.0
+
+            scores: dict[int, float] | None = None
+            for position, token in enumerate(tokens):
+                is_last = position == len(tokens) - 1
+                if is_last and prefix_last and len(token) >= MIN_PREFIX_LENGTH:
+                    terms = self._expand_prefix(token)
+                else:
+                    terms = [token] if token in self.postings else []
+
+                token_scores: dict[int, float] = defaultdict(float)
+                for term in terms:
+                    docs = self.postings[term]
+                    idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for doc_id, tf in docs.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[doc_id] / avg_len)
+                        token_scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+                if scores is None:
+                    scores = dict(token_scores)
+                else:
+                    scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+                if not scores:
+                    return []
+
+        return sorted(((round(s, 6), d) for d, s in scores.items()), reverse=True)
+
+
+# ==========================================================
+# 🛍️ Index produits partagé par les routes
+# ==========================================================
+class ProductSearchIndex(SearchIndex):
+
+    def __init__(self, ttl: int = SEARCH_INDEX_TTL):
+        super().__init__()
+        self.ttl = ttl
+        self.built_at: float | None = None
+        self.populated = False
+        self._build_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # Écritures reçues pendant une reconstruction, rejouées sur le nouvel index
+        self._pending: list[tuple[int, dict | None]] | None = None
+
+    def is_fresh(self) -> bool:
+        return self.built_at is not None and time.monotonic() - self.built_at < self.ttl
+
+    def ensure_ready(self, db: Session):
+        """
+        Construit l'index au premier appel (bloquant) ; ensuite, passé `ttl`
+        secondes ou après invalidate(), lance une reconstruction en arrière-plan
+        et continue de répondre avec l'index courant.
+        """
+        if self.is_fresh():
+            return
+        if self.populated:
+            self._rebuild_in_background()
+            return
+        with self._build_lock:
+            if not self.populated:
+                self._rebuild(db)
+
+    def rebuild(self, db: Session):
+        with self._build_lock:
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session):
+        with self._lock:
+            self._pending = []
+        try:
+            rows = (
+                db.query(models.Product.id_product, models.Product.nom, models.Product.description)
+                .yield_per(1000)
+            )
+            self.replace_all(
+                (row.id_product, {"nom": row.nom, "description": row.description}) for row in rows
+            )
+            with self._lock:
+                for doc_id, fields in self._pending:
+                    if fields is None:
+                        self._remove(doc_id)
+                    else:
+                        self._insert(doc_id, *_weigh(fields))
+        finally:
+            with self._lock:
+                self._pending = None
+        self.populated = True
+        self.built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run_rebuild, name="search-rebuild", daemon=True)
+            self._thread.start()
+
+    def _run_rebuild(self):
+        if not self._build_lock.acquire(blocking=False):
+            return  # reconstruction déjà en cours
+        db = SessionLocal(read_only=True)
+        try:
+            if not self.is_fresh():
+                self._rebuild(db)
+        except Exception:
+            logger.exception("Échec de la reconstruction de l'index de recherche")
+        finally:
+            db.close()
+            self._build_lock.release()
+
+    def invalidate(self):
+        """Changement de masse : reconstruction complète au prochain ensure_ready()"""
+        self.built_at = None
+
+    def index_product(self, product):
+        if not self.populated and self._pending is None:
+            return  # sera pris en compte à la construction
+        fields = {"nom": product.nom, "description": product.description}
+        with self._lock:
+            self.add(product.id_product, **fields)
+            if self._pending is not None:
+                self._pending.append((product.id_product, fields))
+
+    def remove_product(self, id_product: int):
+        with self._lock:
+            self.remove(id_product)
+            if self._pending is not None:
+                self._pending.append((id_product, None))
+
+
+product_index = ProductSearchIndex()
@@ -1,19 +1,27 @@
+import os
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app import models
+from app.utils.cache import MISS, MemoryCache
+from app.utils.passwords import hash_sync, verify_sync
 
 # 🔑 Clé secrète (à placer dans .env plus tard)
 SECRET_KEY = "DROPS_SECRET_KEY_123456"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# ⚙️ Contexte de hachage
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cache des principals décodés (par token) et des versions de jetons (par
+# utilisateur). PRINCIPAL_VERSION_TTL borne le délai de prise en compte d'un
+# changement de rôle dans les autres workers.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+PRINCIPAL_VERSION_TTL = float(os.getenv("PRINCIPAL_VERSION_TTL", "30"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -21,24 +29,12 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 # 🔐 FONCTIONS UTILITAIRES
 # ==================================================
 def hash_password(password: str):
-    """Hash du mot de passe sécurisé avec coupure à 72 bytes"""
-    encoded_pw = password.encode("utf-8")
-    if len(encoded_pw) > 72:
-        encoded_pw = encoded_pw[:72]
-        password = encoded_pw.decode("utf-8", errors="ignore")
-    return pwd_context.hash(password)
+    """Hash du mot de passe (synchrone, scripts) — les routes passent par password_service"""
+    return hash_sync(password)
 
 def verify_password(plain_password, hashed_password):
     """Vérifie le mot de passe (retourne False si invalides)"""
-    try:
-        print("🧩 DEBUG - Mot de passe en clair:", plain_password)
-        print("🧩 DEBUG - Hash stocké:", hashed_password)
-        result = pwd_context.verify(plain_password, hashed_password)
-        print("✅ Résultat vérification:", result)
-        return result
-    except Exception as e:
-        print("❌ Erreur de vérification bcrypt :", e)
-        return False
+    return verify_sync(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -48,24 +44,145 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Récupère l'utilisateur courant depuis le token"""
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token invalide ou expiré",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+# ==================================================
+# 🪪 PRINCIPAL (utilisateur résolu depuis le token)
+# ==================================================
+@dataclass(frozen=True)
+class Principal:
+    """Identité portée par le JWT : suffit aux routes qui n'ont besoin que de l'id ou du rôle"""
+    id_user: int
+    role: str
+    nom: str
+    prenom: str
+    email: str
+    token_version: int = 0
+
+
+def principal_claims(user) -> dict:
+    """Claims à placer dans le token à la connexion"""
+    role = user.role.value if hasattr(user.role, "value") else user.role
+    return {
+        "sub": str(user.id_user),
+        "role": role,
+        "nom": user.nom,
+        "prenom": user.prenom,
+        "email": user.email,
+        "ver": user.token_version or 0,
+    }
+
+
+_principals = MemoryCache(max_entries=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+_versions = MemoryCache(max_entries=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_VERSION_TTL)
 
-    user = db.query(models.User).filter(models.User.id_user == user_id).first()
-    if user is None:
-        raise credentials_exception
+
+def _current_version(db: Session, user_id: int) -> int | None:
+    """Version de jeton courante de l'utilisateur (None s'il n'existe plus)"""
+    version = _versions.get(user_id)
+    if version is MISS:
+        row = db.query(models.User.token_version).filter(models.User.id_user == user_id).first()
+        version = None if row is None else (row[0] or 0)
+        _versions.set(user_id, version)
+        # Rend la connexion au pool avant la route : gardée entre la dépendance
+        # et la route, elle peut épuiser le pool pendant que les threads
+        # AnyIO attendent (interblocage sous une rafale de nouveaux clients).
+        db.rollback()
+    return version
+
+
+def revoke_tokens(user_id: int, version: int | None = None):
+    """
+    À appeler après un changement de token_version (rôle, suppression…).
+    Effet immédiat dans ce processus, au plus PRINCIPAL_VERSION_TTL ailleurs.
+    """
+    if version is None:
+        _versions.delete(user_id)
+    else:
+        _versions.set(user_id, version)
+
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Résout l'utilisateur courant à partir des claims du token, sans lire la
+    table users (hors contrôle de version, mis en cache).
+    Les anciens tokens sans claims de rôle sont complétés depuis la base.
+    """
+    principal = _principals.get(token)
+    if principal is MISS:
+        payload = _decode(token)
+        user_id = int(payload["sub"])
+        if "role" in payload:
+            principal = Principal(
+                id_user=user_id,
+                role=payload["role"],
+                nom=payload.get("nom", ""),
+                prenom=payload.get("prenom", ""),
+                email=payload.get("email", ""),
+                token_version=payload.get("ver", 0),
+            )
+        else:
+            user = db.query(models.User).filter(models.User.id_user == user_id).first()
+            if user is None:
+                raise _credentials_exception()
+            claims = principal_claims(user)
+            principal = Principal(
+                id_user=user_id,
+                role=claims["role"],
+                nom=user.nom,
+                prenom=user.prenom,
+                email=user.email,
+                token_version=payload.get("ver", 0),
+            )
+        remaining = payload["exp"] - time.time() if "exp" in payload else PRINCIPAL_CACHE_TTL
+        _principals.set(token, principal, ttl=max(0.0, min(PRINCIPAL_CACHE_TTL, remaining)))
+
+    current = _current_version(db, principal.id_user)
+    if current is None or principal.token_version < current:
+        raise _credentials_exception()
+    return principal
+
+
+def authenticated_user_id(authorization: str | None) -> int | None:
+    """
+    Identifiant de l'utilisateur d'un en-tête « Bearer <token> » accepté par
+    get_current_principal (signature, expiration, révocation), sinon None.
+    Session dédiée : à appeler hors d'une dépendance (threadpool).
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    db = SessionLocal()
+    try:
+        return get_current_principal(token, db).id_user
+    except (HTTPException, KeyError, ValueError):
+        return None
+    finally:
+        db.close()
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Récupère l'utilisateur courant (objet ORM complet) depuis le token"""
+    payload = _decode(token)
+    user = db.query(models.User).filter(models.User.id_user == payload["sub"]).first()
+    if user is None or payload.get("ver", 0) < (user.token_version or 0):
+        raise _credentials_exception()
     return user
 
 def require_role(user, allowed_roles: list[str]):
@@ -0,0 +1,194 @@
+# app/utils/static_files.py
+"""
+Service des fichiers de /uploads.
+
+- Les fichiers adressés par leur contenu (SHA-256, cf. app/utils/storage.py)
+  et leurs déclinaisons ne changent jamais : Cache-Control immutable d'un an
+  et ETag fort = empreinte du contenu. Les autres (anciens noms aléatoires)
+  gardent un cache court (UPLOADS_CACHE_CONTROL).
+- ETag / If-None-Match / If-Modified-Since → 304, Range → 206 (Starlette).
+- Si le serveur ASGI annonce l'extension `http.response.pathsend`, le fichier
+  est transmis sans copie par le worker Python ; sinon lecture par gros blocs.
+- Si UPLOADS_ACCEL_REDIRECT est défini (ex. /_protected_uploads/), Python
+  ne fait que la vérification d'accès et renvoie un en-tête X-Accel-Redirect :
+  nginx envoie le fichier (sendfile). Configuration générée par :
+      python -m app.utils.static_files --root /srv/drops/uploads
+"""
+import argparse
+import os
+import re
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UPLOADS_CACHE_CONTROL = os.getenv("UPLOADS_CACHE_CONTROL", "public, max-age=3600")
+UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT", "")
+FILE_CHUNK_SIZE = 256 * 1024
+
+# <sha256>.<ext> ou déclinaison <sha256>_<taille>.<ext>
+_CONTENT_ADDRESSED = re.compile(r"^(?P<hash>[0-9a-f]{64})(?:_[a-z]+)?\.[a-z0-9]+$")
+
+# Fichiers pré-compressés servis à la place de l'original (SVG, JSON…)
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+class UploadFiles(StaticFiles):
+
+    def __init__(self, *args, accel_redirect: str | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        prefix = UPLOADS_ACCEL_REDIRECT if accel_redirect is None else accel_redirect
+        self.accel_redirect = prefix.rstrip("/") + "/" if prefix else ""
+
+    def authorize(self, path: str, scope) -> bool:
+        """Point d'extension : les images produits sont publiques"""
+        return True
+
+    async def get_response(self, path: str, scope) -> Response:
+        if not self.authorize(path, scope):
+            raise HTTPException(status_code=403)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        match = _CONTENT_ADDRESSED.match(name)
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if match else UPLOADS_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if match:
+            headers["ETag"] = f'"{match.group("hash")}"' if "_" not in name else f'"{name}"'
+
+        encoding, served_path, served_stat = self._precompressed(full_path, request_headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            if "ETag" in headers:
+                headers["ETag"] = headers["ETag"][:-1] + f'-{encoding}"'
+
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            stat_result=served_stat or stat_result,
+            headers=headers,
+            media_type=_media_type(full_path),
+        )
+        response.chunk_size = FILE_CHUNK_SIZE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if self.accel_redirect:
+            return self._accel_response(served_path, response)
+        return response
+
+    def _precompressed(self, full_path, request_headers):
+        accepted = request_headers.get("accept-encoding", "")
+        for encoding, suffix in _PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            candidate = f"{full_path}{suffix}"
+            try:
+                return encoding, candidate, os.stat(candidate)
+            except OSError:
+                continue
+        return None, full_path, None
+
+    def _accel_response(self, served_path, response: FileResponse) -> Response:
+        root = os.path.realpath(self.directory)
+        relative = os.path.relpath(os.path.realpath(served_path), root).replace(os.sep, "/")
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key in ("cache-control", "etag", "last-modified", "content-type", "content-encoding", "vary")
+        }
+        headers["X-Accel-Redirect"] = self.accel_redirect + relative
+        # nginx reprend ETag/Range/If-* sur la location interne
+        return Response(status_code=200, headers=headers)
+
+
+def _media_type(full_path) -> str | None:
+    media_type, _ = guess_type(str(full_path))
+    return media_type
+
+
+# ==========================================================
+# 🧩 Génération de la configuration nginx
+# ==========================================================
+NGINX_TEMPLATE = """\
+# Généré par : python -m app.utils.static_files
+upstream drops_api {{
+    server {upstream};
+    keepalive 32;
+}}
+
+server {{
+    listen {listen};
+    server_name {server_name};
+
+    sendfile on;
+    tcp_nopush on;
+    open_file_cache max=10000 inactive=60s;
+    open_file_cache_valid 120s;
+
+    # Fichiers adressés par leur contenu : servis directement, jamais revalidés
+    location ~ "^/uploads/(?<path>(products/)?(variants/)?[0-9a-f]{{64}}(_[a-z]+)?\\.[a-z0-9]+)$" {{
+        alias {root}/$path;
+        add_header Cache-Control "{immutable}" always;
+        etag on;
+        gzip_static on;
+        access_log off;
+    }}
+
+    # Autres fichiers : l'API vérifie l'accès puis délègue l'envoi à nginx
+    location /uploads/ {{
+        proxy_pass http://drops_api;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+    }}
+
+    location {accel} {{
+        internal;
+        alias {root}/;
+        etag on;
+        gzip_static on;
+    }}
+
+    location / {{
+        proxy_pass http://drops_api;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}
+}}
+"""
+
+
+def nginx_config(root: str, upstream: str = "127.0.0.1:8000", server_name: str = "_",
+                 listen: str = "80", accel: str | None = None) -> str:
+    accel = (accel or UPLOADS_ACCEL_REDIRECT or "/_protected_uploads/").rstrip("/") + "/"
+    return NGINX_TEMPLATE.format(
+        root=os.path.abspath(root).rstrip("/"),
+        upstream=upstream,
+        server_name=server_name,
+        listen=listen,
+        accel=accel,
+        immutable=IMMUTABLE_CACHE_CONTROL,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Configuration nginx pour /uploads")
+    parser.add_argument("--root", default="uploads", help="Dossier uploads sur le serveur")
+    parser.add_argument("--upstream", default="127.0.0.1:8000")
+    parser.add_argument("--server-name", default="_")
+    parser.add_argument("--listen", default="80")
+    parser.add_argument("--accel", default=None, help="Préfixe X-Accel-Redirect (UPLOADS_ACCEL_REDIRECT)")
+    args = parser.parse_args()
+    print(nginx_config(args.root, args.upstream, args.server_name, args.listen, args.accel))
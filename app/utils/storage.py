@@ -0,0 +1,301 @@
+# app/utils/storage.py
+"""
+Stockage des images adressé par le contenu.
+
+- La clé d'un fichier est son SHA-256 + extension : la même photo envoyée
+  pour 30 déclinaisons d'un produit n'est stockée qu'une fois.
+- stored_files.ref_count compte les produits qui pointent vers le fichier.
+  Il est tenu à jour par des événements ORM sur Product.image (création,
+  changement d'image, suppression — y compris les suppressions en cascade).
+- Un fichier n'est supprimé qu'une fois son compteur à zéro, après commit,
+  sous verrou de ligne : un upload concurrent du même contenu (même
+  transaction que la création du produit) ne peut pas le perdre.
+- Le balayage complet (admin) respecte un délai de grâce
+  (STORAGE_GC_GRACE_SECONDS) pour les uploads dont le produit est en cours
+  de création.
+
+Backends : disque local (défaut) ou S3 compatible (STORAGE_BACKEND=s3,
+S3_ENDPOINT_URL permet de viser MinIO / moto en local).
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.utils import image_pipeline
+from app.utils.uploads import UPLOAD_DIR, StoredUpload
+
+STORAGE_GC_GRACE_SECONDS = int(os.getenv("STORAGE_GC_GRACE_SECONDS", "60"))
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+# ==========================================================
+# 🗄️ Backends
+# ==========================================================
+class StorageBackend:
+
+    def put(self, key: str, source_path: str, content_type: str | None = None):
+        """Range `source_path` sous `key` (le fichier source est consommé)"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def image_path(self, key: str) -> str:
+        """Valeur enregistrée dans Product.image"""
+        raise NotImplementedError
+
+    def key_from_image(self, image_path: str | None) -> str | None:
+        """Clé de contenu d'un Product.image, None si ce n'en est pas une"""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def put(self, key, source_path, content_type=None):
+        if os.path.exists(self._path(key)):
+            os.unlink(source_path)
+        else:
+            os.replace(source_path, self._path(key))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def delete(self, key):
+        image_pipeline.delete_variants(self.image_path(key))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def image_path(self, key):
+        return f"{self.root}/{key}"
+
+    def key_from_image(self, image_path):
+        if not image_path or image_path.startswith(("http://", "https://")):
+            return None
+        key = image_path.replace("\\", "/").rsplit("/", 1)[-1]
+        return key if _KEY_RE.match(key) else None
+
+
+class S3Storage(StorageBackend):
+
+    def __init__(self, bucket: str, prefix: str = "products/", endpoint_url: str | None = None,
+                 public_url: str | None = None, client=None):
+        if client is None:
+            import boto3  # dépendance optionnelle, seulement pour ce backend
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        base = public_url or f"{(endpoint_url or 'https://s3.amazonaws.com').rstrip('/')}/{bucket}"
+        self.public_url = base.rstrip("/")
+
+    def put(self, key, source_path, content_type=None):
+        extra = {"CacheControl": "public, max-age=31536000, immutable"}
+        if content_type:
+            extra["ContentType"] = content_type
+        self.client.upload_file(source_path, self.bucket, self.prefix + key, ExtraArgs=extra)
+        os.unlink(source_path)
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except Exception:
+            return False
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def image_path(self, key):
+        return f"{self.public_url}/{self.prefix}{key}"
+
+    def key_from_image(self, image_path):
+        base = f"{self.public_url}/{self.prefix}"
+        if not image_path or not image_path.startswith(base):
+            return None
+        key = image_path[len(base):]
+        return key if _KEY_RE.match(key) else None
+
+
+def create_backend() -> StorageBackend:
+    backend = os.getenv("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalStorage()
+    if backend == "s3":
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.getenv("S3_PREFIX", "products/"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            public_url=os.getenv("S3_PUBLIC_URL"),
+        )
+    raise ValueError(f"Backend de stockage inconnu : {backend}")
+
+
+storage = create_backend()
+
+
+# ==========================================================
+# 📥 Enregistrement d'un upload
+# ==========================================================
+def store_upload(db: Session, upload: StoredUpload) -> str:
+    """
+    Range l'upload sous sa clé de contenu et garantit la ligne stored_files.
+    Le compteur est incrémenté par l'insertion du produit qui l'utilise.
+    Retourne la valeur à enregistrer dans Product.image.
+    """
+    key = f"{upload.sha256}{upload.extension}"
+    touched = db.execute(
+        update(models.StoredFile)
+        .where(models.StoredFile.content_hash == upload.sha256)
+        .values(date_maj=datetime.utcnow())
+    ).rowcount
+
+    if touched and storage.exists(key):
+        os.unlink(upload.path)  # doublon : on garde le fichier existant
+        return storage.image_path(key)
+
+    storage.put(key, upload.path, upload.content_type)
+    if not touched:
+        try:
+            with db.begin_nested():
+                db.add(models.StoredFile(
+                    content_hash=upload.sha256,
+                    storage_key=key,
+                    taille=upload.size,
+                    content_type=upload.content_type,
+                    ref_count=0,
+                ))
+        except IntegrityError:
+            pass  # créé au même moment par un autre upload du même fichier
+    return storage.image_path(key)
+
+
+def delete_legacy_file(image_path: str | None):
+    """Ancien format (nom aléatoire, non partagé) : suppression directe"""
+    if not image_path or not image_path.startswith("uploads/"):
+        return
+    if storage.key_from_image(image_path) is not None:
+        return  # géré par les compteurs de références
+    if os.path.exists(image_path):
+        os.remove(image_path)
+    image_pipeline.delete_variants(image_path)
+
+
+# ==========================================================
+# 🔢 Compteurs de références (événements ORM sur Product.image)
+# ==========================================================
+def _adjust(connection, session, key: str | None, delta: int):
+    if key is None:
+        return
+    connection.execute(
+        update(models.StoredFile)
+        .where(models.StoredFile.storage_key == key)
+        .values(ref_count=models.StoredFile.ref_count + delta)
+    )
+    if delta < 0 and session is not None:
+        session.info.setdefault("released_files", set()).add(key)
+
+
+@event.listens_for(models.Product, "after_insert")
+def _product_inserted(mapper, connection, target):
+    _adjust(connection, None, storage.key_from_image(target.image), +1)
+
+
+@event.listens_for(models.Product, "after_update")
+def _product_updated(mapper, connection, target):
+    history = inspect(target).attrs.image.history
+    if not history.has_changes():
+        return
+    session = object_session(target)
+    for old in history.deleted:
+        _adjust(connection, session, storage.key_from_image(old), -1)
+    for new in history.added:
+        _adjust(connection, session, storage.key_from_image(new), +1)
+
+
+@event.listens_for(models.Product, "after_delete")
+def _product_deleted(mapper, connection, target):
+    _adjust(connection, object_session(target), storage.key_from_image(target.image), -1)
+
+
+@event.listens_for(Session, "after_commit")
+def _collect_after_commit(session):
+    keys = session.info.pop("released_files", None)
+    if keys:
+        collect_garbage(keys=keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("released_files", None)
+
+
+def collect_garbage(keys=None, grace_seconds: int | None = None) -> int:
+    """
+    Supprime les fichiers sans référence (tous, ou seulement `keys`).
+    Chaque ligne est verrouillée pendant la suppression : un upload
+    concurrent du même contenu attend puis recrée fichier et ligne.
+    Le délai de grâce ne s'applique par défaut qu'au balayage complet
+    (fichiers uploadés dont le produit n'a jamais été créé).
+    """
+    from app.database import SessionLocal
+
+    if grace_seconds is None:
+        grace_seconds = STORAGE_GC_GRACE_SECONDS if keys is None else 0
+    limit = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    removed = 0
+    db = SessionLocal()
+    try:
+        query = db.query(models.StoredFile).filter(
+            models.StoredFile.ref_count <= 0,
+            models.StoredFile.date_maj <= limit,
+        )
+        if keys is not None:
+            query = query.filter(models.StoredFile.storage_key.in_(list(keys)))
+        for content_hash, in query.with_entities(models.StoredFile.content_hash).all():
+            row = (
+                db.query(models.StoredFile)
+                .filter(models.StoredFile.content_hash == content_hash, models.StoredFile.ref_count <= 0)
+                .with_for_update()
+                .first()
+            )
+            if row is None:
+                db.rollback()
+                continue
+            storage.delete(row.storage_key)
+            db.delete(row)
+            db.commit()
+            removed += 1
+    finally:
+        db.close()
+    return removed
+
+
+def recount_references(db: Session) -> int:
+    """Recalcule tous les ref_count depuis products.image"""
+    counts: dict[str, int] = {}
+    for (image,) in db.query(models.Product.image).filter(models.Product.image.isnot(None)).yield_per(1000):
+        key = storage.key_from_image(image)
+        if key:
+            counts[key] = counts.get(key, 0) + 1
+    for row in db.query(models.StoredFile).all():
+        row.ref_count = counts.get(row.storage_key, 0)
+    db.commit()
+    return len(counts)
@@ -0,0 +1,207 @@
+# app/utils/uploads.py
+"""
+Réception des images produits, partagée par sellers.py et admin.py.
+
+Le fichier est copié par blocs dans un fichier temporaire du dossier cible
+(hors du pool de threads entre deux blocs), avec :
+- une taille maximale stricte (413 au-delà),
+- un contrôle des magic bytes (l'extension vient du contenu, pas du nom),
+- un SHA-256 calculé pendant la copie,
+- un renommage atomique vers le nom définitif.
+
+Starlette analyse le formulaire multipart (et met le fichier en tampon)
+avant l'exécution des dépendances : UploadLimitMiddleware borne donc la
+taille du corps dès l'en-tête Content-Length, puis octet par octet pour
+les corps sans longueur annoncée, avant toute analyse.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from uuid import uuid4
+
+from anyio import to_thread
+from fastapi import Depends, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from app.utils.security import get_current_principal, require_role
+
+UPLOAD_DIR = "uploads/products"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+
+# mkstemp crée le fichier en 0600 : l'original doit rester lisible par le
+# serveur web (nginx), comme un fichier créé normalement. Le umask ne se lit
+# qu'en le modifiant, d'où la lecture unique à l'import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o644 & ~_UMASK
+# Marge pour les autres champs du formulaire et les délimiteurs multipart
+MULTIPART_OVERHEAD = 64 * 1024
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+@dataclass
+class StoredUpload:
+    path: str           # chemin relatif enregistré en base (uploads/products/…)
+    size: int
+    sha256: str
+    content_type: str
+    extension: str
+
+
+def detect_image_type(head: bytes) -> tuple[str, str] | None:
+    """(extension, content-type) d'après les premiers octets, sinon None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg", "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png", "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif", "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return ".avif", "image/avif"
+    return None
+
+
+def _too_large(max_bytes: int):
+    return HTTPException(
+        status_code=413,
+        detail=f"Image trop volumineuse (maximum {max_bytes} octets)",
+    )
+
+
+async def save_upload(upload: UploadFile, directory: str = UPLOAD_DIR, max_bytes: int | None = None) -> StoredUpload:
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    hasher = hashlib.sha256()
+    size = 0
+    detected = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                if detected is None:
+                    detected = detect_image_type(chunk[:16])
+                    if detected is None:
+                        raise HTTPException(
+                            status_code=415,
+                            detail="Format d'image non supporté (JPEG, PNG, GIF, WebP ou AVIF)",
+                        )
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                hasher.update(chunk)
+                await to_thread.run_sync(out.write, chunk)
+
+            if detected is None:
+                raise HTTPException(status_code=400, detail="Fichier image vide")
+            await to_thread.run_sync(os.fsync, out.fileno())
+            os.fchmod(out.fileno(), FILE_MODE)
+
+        extension, content_type = detected
+        final_path = os.path.join(directory, f"{uuid4()}{extension}")
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    finally:
+        await upload.close()
+
+    return StoredUpload(
+        path=final_path.replace(os.sep, "/"),
+        size=size,
+        sha256=hasher.hexdigest(),
+        content_type=content_type,
+        extension=extension,
+    )
+
+
+def product_image_upload(*roles: str):
+    """
+    Dépendance FastAPI : reçoit le champ `image_file` avant l'exécution de
+    la route (qui reste synchrone pour la base de données). Le rôle est
+    vérifié avant de copier le fichier dans le dossier d'uploads ; le corps
+    de la requête, lui, est déjà analysé (taille bornée par
+    UploadLimitMiddleware).
+    """
+    async def dependency(
+        image_file: UploadFile = File(None),
+        user=Depends(get_current_principal),
+    ) -> StoredUpload | None:
+        require_role(user, list(roles))
+        if image_file is None or not image_file.filename:
+            return None
+        return await save_upload(image_file)
+
+    return dependency
+
+
+def _body_too_large(max_bytes: int):
+    return HTTPException(
+        status_code=413,
+        detail=f"Requête trop volumineuse (maximum {max_bytes} octets)",
+    )
+
+
+# ==========================================================
+# 📏 Limite de taille des corps multipart (avant analyse)
+# ==========================================================
+class UploadLimitMiddleware:
+    """
+    Middleware ASGI : 413 pour un corps multipart/form-data plus gros que
+    la limite de sa route (`limits` : suffixe de chemin → octets, sinon
+    MAX_UPLOAD_BYTES), plus MULTIPART_OVERHEAD pour les autres champs.
+    """
+
+    def __init__(self, app, max_bytes: int | None = None, limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_bytes = max_bytes or MAX_UPLOAD_BYTES
+        self.limits = limits or {}
+
+    def _limit(self, path: str) -> int:
+        path = path.rstrip("/")
+        for suffix, max_bytes in self.limits.items():
+            if path.endswith(suffix):
+                return max_bytes + MULTIPART_OVERHEAD
+        return self.max_bytes + MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_type = content_length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-type":
+                content_type = value
+            elif name == b"content-length":
+                content_length = value
+        if content_type is None or not content_type.lower().startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        limit = self._limit(scope["path"])
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": _body_too_large(limit).detail}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Propagé tel quel par FastAPI pendant l'analyse du formulaire
+                    raise _body_too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,9 @@
+"""
+Scripts de mesure de performance (hors application, lancés à la main).
+
+- dataset    : jeu de données synthétique (remplissage par lots)
+- endpoints  : latence / débit de chaque routeur, JSON et comparaison à une référence
+- async_reads : routes de lecture sync vs async sous forte concurrence
+- checkout_concurrency : validations de commande simultanées, contrôle de non-survente
+- reservations : réservations/s sur un produit unique, moteur de réservation vs UPDATE direct
+"""
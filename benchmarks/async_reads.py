@@ -0,0 +1,141 @@
+# benchmarks/async_reads.py
+"""
+Compare les routes de lecture sync (pool de threads) et async (AsyncSession)
+sous forte concurrence.
+
+Lance deux serveurs uvicorn sur la même base — ASYNC_READ_ROUTES=false puis
+true — et envoie la même charge à chacun (500 connexions simultanées par
+défaut). Le cache catalogue est désactivé pour mesurer l'accès base.
+
+    python -m benchmarks.async_reads --duration 20 --concurrency 500
+    python -m benchmarks.async_reads --url http://127.0.0.1:8000   # serveur déjà lancé
+
+Nécessite httpx et uvicorn ; ASYNC_DATABASE_URL (ou le pilote asyncmy) doit
+viser la même base que la connexion synchrone.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/products/?limit=20",
+    "/api/products/search?q=basket&limit=20",
+    "/api/categories/",
+    "/api/products/1",
+    "/api/reviews/product/1",
+]
+
+
+async def run_load(base_url: str, paths: list[str], concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    cycle = itertools.cycle(paths)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(next(cycle))
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"Serveur non disponible : {base_url}")
+
+
+def spawn_server(port: int, async_reads: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "ASYNC_READ_ROUTES": "true" if async_reads else "false",
+        "CATALOG_CACHE_BACKEND": "none",
+        "LOG_LEVEL": "WARNING",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def print_report(results: dict[str, dict]):
+    columns = ("rps", "p50_ms", "p95_ms", "p99_ms", "errors", "requests")
+    print(f"{'mode':<8}" + "".join(f"{c:>10}" for c in columns))
+    for mode, result in results.items():
+        print(f"{mode:<8}" + "".join(f"{str(result[c]):>10}" for c in columns))
+    if {"sync", "async"} <= results.keys() and results["sync"]["rps"]:
+        print(f"\nasync / sync : x{results['async']['rps'] / results['sync']['rps']:.2f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Mesurer un serveur déjà lancé au lieu d'en démarrer deux")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", action="append", dest="paths", help="Chemin à interroger (répétable)")
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    if args.url:
+        print_report({"server": asyncio.run(run_load(args.url, paths, args.concurrency, args.duration))})
+        return
+
+    results = {}
+    for mode, async_reads in (("sync", False), ("async", True)):
+        server = spawn_server(args.port, async_reads)
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            _wait_ready(base_url)
+            asyncio.run(run_load(base_url, paths, min(args.concurrency, 50), 2.0))  # chauffe
+            results[mode] = asyncio.run(run_load(base_url, paths, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
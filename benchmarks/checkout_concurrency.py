@@ -0,0 +1,172 @@
+# benchmarks/checkout_concurrency.py
+"""
+Test de non-survente : N acheteurs valident leur panier en même temps sur
+quelques produits au stock limité (drop).
+
+    python -m benchmarks.checkout_concurrency
+    python -m benchmarks.checkout_concurrency --buyers 200 --stock 50 --products 3 --max-quantity 3
+    python -m benchmarks.checkout_concurrency --url "mysql+pymysql://u:p@127.0.0.1/drops_bench"
+
+Chaque acheteur a un panier de 1 à --products produits (quantités 1 à
+--max-quantity) ; toutes les requêtes POST /api/orders/ partent ensemble
+(ASGI, dans le processus). À la fin, pour chaque produit :
+
+    stock initial - stock final == quantités commandées  et  stock final >= 0
+
+Le code de sortie vaut 1 si l'invariant est violé. Avec SQLite les
+écritures sont sérialisées par la base ; --url vers une base MySQL vide
+(réinitialisée !) teste les verrous de ligne réels.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+
+def _setup(engine, args, rng: random.Random) -> dict[int, dict[int, int]]:
+    """Schéma, produits, acheteurs et paniers ; retourne {id_user: panier}"""
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, sync_schema
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
+
+    carts = {}
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {"id_user": u, "nom": f"Acheteur{u}", "prenom": "Bench", "email": f"buyer{u}@bench.drops",
+             "mot_de_passe": "-", "role": "CLIENT", "token_version": 0}
+            for u in range(1, args.buyers + 1)
+        ])
+        conn.execute(insert(models.Product.__table__), [
+            {"id_product": p, "nom": f"Drop {p}", "prix": 100 + p, "stock": args.stock, "note_moyenne": 5.0}
+            for p in range(1, args.products + 1)
+        ])
+        conn.execute(insert(models.Cart.__table__), [
+            {"id_cart": u, "id_user": u} for u in range(1, args.buyers + 1)
+        ])
+        items = []
+        for u in range(1, args.buyers + 1):
+            # ordre aléatoire dans le panier : le moteur doit trier pour éviter les interblocages
+            chosen = rng.sample(range(1, args.products + 1), rng.randint(1, args.products))
+            carts[u] = {p: rng.randint(1, args.max_quantity) for p in chosen}
+            items += [{"id_cart": u, "id_product": p, "quantite": q} for p, q in carts[u].items()]
+        conn.execute(insert(models.CartItem.__table__), items)
+    return carts
+
+
+async def _checkout_all(app, tokens: dict[int, dict]) -> tuple[Counter, float]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        start_line = asyncio.Event()
+
+        async def buyer(headers):
+            await start_line.wait()
+            return (await client.post("/api/orders/", headers=headers)).status_code
+
+        tasks = [asyncio.create_task(buyer(headers)) for headers in tokens.values()]
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        start_line.set()
+        statuses = await asyncio.gather(*tasks)
+        return Counter(statuses), time.perf_counter() - started
+
+
+def _verify(engine, args) -> list[str]:
+    from sqlalchemy import func, select
+
+    from app import models
+
+    errors = []
+    with engine.connect() as conn:
+        stock = dict(conn.execute(select(models.Product.id_product, models.Product.stock)).all())
+        sold = dict(conn.execute(
+            select(models.OrderItem.id_product, func.sum(models.OrderItem.quantite))
+            .group_by(models.OrderItem.id_product)
+        ).all())
+        orders = conn.execute(select(func.count(models.Order.id_order))).scalar()
+
+    print(f"\n  {'produit':<10}{'initial':>10}{'vendu':>10}{'final':>10}", file=sys.stderr)
+    for id_product in sorted(stock):
+        vendu = int(sold.get(id_product, 0))
+        final = stock[id_product]
+        print(f"  {id_product:<10}{args.stock:>10}{vendu:>10}{final:>10}", file=sys.stderr)
+        if final < 0:
+            errors.append(f"produit {id_product} : stock négatif ({final})")
+        if args.stock - final != vendu:
+            errors.append(f"produit {id_product} : {vendu} vendus pour {args.stock - final} déstockés")
+    print(f"  commandes créées : {orders}", file=sys.stderr)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=200, help="Validations simultanées")
+    parser.add_argument("--stock", type=int, default=50, help="Stock initial de chaque produit")
+    parser.add_argument("--products", type=int, default=3, help="Produits du drop")
+    parser.add_argument("--max-quantity", type=int, default=2)
+    parser.add_argument("--url", help="Base MySQL/SQLite à utiliser (réinitialisée !) au lieu d'un SQLite temporaire")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = None if args.url else tempfile.mkdtemp(prefix="drops_checkout_")
+    db_url = args.url or f"sqlite:///{workdir}/checkout.db"
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("QUERY_BUDGET_MODE", "off")
+    os.environ.setdefault("DB_POOL_SIZE", "40")
+    os.environ.setdefault("DB_POOL_TIMEOUT", "120")
+
+    try:
+        from app.database import engine
+        from app.main import app
+        from app.utils.security import create_access_token
+
+        carts = _setup(engine, args, random.Random(args.seed))
+        demand = Counter()
+        for cart in carts.values():
+            demand.update(cart)
+        print(
+            f"🛒 {args.buyers} acheteurs, {args.products} produit(s) à {args.stock} unités, "
+            f"demande totale {dict(sorted(demand.items()))} ({db_url.split(':')[0]})",
+            file=sys.stderr,
+        )
+
+        tokens = {
+            u: {"Authorization": "Bearer " + create_access_token({"sub": str(u), "role": "CLIENT"})}
+            for u in carts
+        }
+        statuses, elapsed = asyncio.run(_checkout_all(app, tokens))
+        print(
+            f"  {elapsed:.2f} s — réponses : {dict(sorted(statuses.items()))} "
+            f"(200 commande créée, 409 stock insuffisant)",
+            file=sys.stderr,
+        )
+        errors = _verify(engine, args)
+        if statuses[200] == 0:
+            errors.append("aucune commande créée")
+        unexpected = {s: n for s, n in statuses.items() if s not in (200, 409)}
+        if unexpected:
+            print(f"  ⚠️ réponses inattendues : {unexpected}", file=sys.stderr)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if errors:
+        print("\n❌ " + "\n❌ ".join(errors), file=sys.stderr)
+        sys.exit(1)
+    print("\n✅ Aucune survente", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# benchmarks/dataset.py
+"""
+Jeu de données synthétique pour les benchmarks : une place de marché
+complète (utilisateurs, vendeurs, catégories, produits, avis et leurs
+statistiques, paniers, commandes, paiements), générée de façon
+déterministe et insérée par lots (INSERT multi-lignes, sans ORM).
+
+    python -m benchmarks.dataset --url sqlite:///bench.db --products 100000 --reset
+    python -m benchmarks.dataset --url "mysql+pymysql://u:p@127.0.0.1/drops_bench" --products 1000
+
+L'application n'est importée qu'au remplissage : DATABASE_URL doit être
+fixé avant (le script le fait à partir de --url).
+
+Tous les comptes ont le mot de passe BENCH_PASSWORD ; les identifiants
+sont fixés à l'avance (clients 1..N, puis vendeurs, puis administrateurs)
+pour que les scénarios puissent viser des lignes existantes.
+"""
+import argparse
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+
+BENCH_PASSWORD = "benchmark"
+BATCH_SIZE = 5000
+
+_WORDS = (
+    "basket", "sneaker", "veste", "sac", "montre", "casquette", "pull", "jean", "robe", "chemise",
+    "sandale", "lunettes", "ceinture", "écharpe", "bonnet", "short", "jupe", "manteau", "bottes", "gants",
+)
+_ADJECTIVES = ("noir", "blanc", "rouge", "vintage", "premium", "sport", "classique", "édition", "limitée", "cuir")
+
+
+@dataclass
+class DatasetSpec:
+    products: int = 1000
+    clients: int | None = None      # par défaut : products / 5 (au moins 50)
+    sellers: int | None = None      # par défaut : products / 50 (au moins 5)
+    admins: int = 2
+    categories: int = 20
+    reviews_per_product: float = 3.0
+    cart_ratio: float = 0.3         # part des clients avec un panier
+    items_per_cart: int = 3
+    orders_per_client: float = 2.0
+    items_per_order: int = 3
+    seed: int = 42
+
+    def __post_init__(self):
+        if self.clients is None:
+            self.clients = max(50, self.products // 5)
+        if self.sellers is None:
+            self.sellers = max(5, self.products // 50)
+
+    # Plages d'identifiants (utilisées aussi par les scénarios)
+    @property
+    def first_seller(self) -> int:
+        return self.clients + 1
+
+    @property
+    def first_admin(self) -> int:
+        return self.clients + self.sellers + 1
+
+
+def _batched(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk(conn, model, rows) -> int:
+    count = 0
+    for batch in _batched(rows):
+        conn.execute(insert(model.__table__), batch)
+        count += len(batch)
+    return count
+
+
+# ==========================================================
+# 🏭 Générateurs de lignes
+# ==========================================================
+def _users(spec: DatasetSpec, password_hash: str, now: datetime):
+    roles = (("CLIENT", spec.clients), ("VENDEUR", spec.sellers), ("ADMIN", spec.admins))
+    id_user = 0
+    for role, count in roles:
+        for i in range(count):
+            id_user += 1
+            yield {
+                "id_user": id_user,
+                "nom": f"{role.title()}{i}",
+                "prenom": "Bench",
+                "email": f"{role.lower()}{i}@bench.drops",
+                "mot_de_passe": password_hash,
+                "role": role,
+                "date_creation": now - timedelta(days=id_user % 365),
+                "token_version": 0,
+            }
+
+
+def _sellers(spec: DatasetSpec):
+    for i in range(spec.sellers):
+        yield {
+            "id_seller": spec.first_seller + i,
+            "nom_boutique": f"Boutique {i}",
+            "description": "Boutique de test",
+            "type": "PARTICULIER" if i % 2 else "ENTREPRISE",
+            "statut": "VALIDE",
+        }
+
+
+def _categories(spec: DatasetSpec, now: datetime):
+    for i in range(1, spec.categories + 1):
+        yield {"id_category": i, "nom": f"Catégorie {i}", "description": None, "image": None, "date_modification": now}
+
+
+def _products(spec: DatasetSpec, rng: random.Random, now: datetime):
+    for id_product in range(1, spec.products + 1):
+        created = now - timedelta(minutes=spec.products - id_product)
+        yield {
+            "id_product": id_product,
+            "id_seller": spec.first_seller + rng.randrange(spec.sellers),
+            "id_category": rng.randint(1, spec.categories),
+            "nom": f"{rng.choice(_WORDS)} {rng.choice(_ADJECTIVES)} {id_product}",
+            "description": " ".join(rng.choices(_WORDS + _ADJECTIVES, k=12)),
+            "prix": round(rng.uniform(5, 500), 2),
+            "stock": rng.randint(0, 200),
+            "image": None,
+            "date_creation": created,
+            "date_modification": created,
+            "note_moyenne": 5.0,
+        }
+
+
+def _reviews(spec: DatasetSpec, rng: random.Random, now: datetime, stats: dict):
+    id_review = 0
+    for id_product in range(1, spec.products + 1):
+        count = int(spec.reviews_per_product) + (rng.random() < spec.reviews_per_product % 1)
+        # un avis par client et par produit
+        for id_user in rng.sample(range(1, spec.clients + 1), min(count, spec.clients)):
+            id_review += 1
+            note = rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 2, 4, 6))[0]
+            entry = stats.setdefault(id_product, [0, 0, 0, 0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += note
+            entry[1 + note] += 1
+            yield {
+                "id_review": id_review,
+                "id_user": id_user,
+                "id_product": id_product,
+                "note": note,
+                "commentaire": "Avis de test",
+                "date_review": now - timedelta(hours=id_review % 5000),
+            }
+
+
+def _review_stats(stats: dict):
+    for id_product, (count, total, n1, n2, n3, n4, n5) in stats.items():
+        yield {
+            "id_product": id_product, "nb_reviews": count, "somme_notes": total,
+            "nb_1": n1, "nb_2": n2, "nb_3": n3, "nb_4": n4, "nb_5": n5,
+        }
+
+
+def _carts(spec: DatasetSpec, rng: random.Random, now: datetime, items: list):
+    owners = rng.sample(range(1, spec.clients + 1), int(spec.clients * spec.cart_ratio))
+    for id_cart, id_user in enumerate(owners, start=1):
+        for id_product in rng.sample(range(1, spec.products + 1), min(spec.items_per_cart, spec.products)):
+            items.append({"id_cart": id_cart, "id_product": id_product, "quantite": rng.randint(1, 3)})
+        yield {"id_cart": id_cart, "id_user": id_user, "date_creation": now}
+
+
+def _orders(spec: DatasetSpec, rng: random.Random, now: datetime, prices: dict, items: list, payments: list):
+    statuses = ("EN_ATTENTE", "PAYEE", "LIVREE", "ANNULEE")
+    id_order = 0
+    for id_user in range(1, spec.clients + 1):
+        count = int(spec.orders_per_client) + (rng.random() < spec.orders_per_client % 1)
+        for _ in range(count):
+            id_order += 1
+            date = now - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+            total = 0.0
+            for id_product in rng.sample(range(1, spec.products + 1), min(spec.items_per_order, spec.products)):
+                quantite = rng.randint(1, 3)
+                total += prices[id_product] * quantite
+                items.append({
+                    "id_order": id_order, "id_product": id_product,
+                    "quantite": quantite, "prix_unitaire": prices[id_product],
+                })
+            statut = rng.choice(statuses)
+            if statut != "EN_ATTENTE":
+                payments.append({
+                    "id_order": id_order, "methode": "CARTE", "montant": round(total, 2),
+                    "statut": "ECHEC" if statut == "ANNULEE" else "SUCCES", "date_paiement": date,
+                })
+            yield {"id_order": id_order, "id_user": id_user, "date_commande": date, "total": round(total, 2), "statut": statut}
+
+
+# ==========================================================
+# 🌱 Remplissage
+# ==========================================================
+def seed(engine, spec: DatasetSpec, reset: bool = False, verbose: bool = True) -> dict:
+    """Crée le schéma et insère le jeu de données ; retourne le nombre de lignes par table"""
+    from app import models
+    from app.database import Base, sync_schema
+    from app.utils.passwords import hash_sync
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
+
+    rng = random.Random(spec.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # un seul hash (coût minimal) partagé : bcrypt ne doit pas dominer le remplissage
+    password_hash = hash_sync(BENCH_PASSWORD, rounds=4)
+    counts = {}
+    started = time.perf_counter()
+
+    def step(name, model, rows):
+        t0 = time.perf_counter()
+        counts[name] = _bulk(conn, model, rows)
+        if verbose:
+            print(f"  {name:<16} {counts[name]:>9} lignes  {time.perf_counter() - t0:6.2f} s")
+
+    with engine.begin() as conn:
+        step("users", models.User, _users(spec, password_hash, now))
+        step("sellers", models.Seller, _sellers(spec))
+        step("categories", models.Category, _categories(spec, now))
+
+        products = list(_products(spec, rng, now))
+        prices = {p["id_product"]: p["prix"] for p in products}
+        step("products", models.Product, products)
+        del products
+
+        stats: dict = {}
+        step("reviews", models.ProductReview, _reviews(spec, rng, now, stats))
+        step("review_stats", models.ProductReviewStats, _review_stats(stats))
+
+        cart_items: list = []
+        step("carts", models.Cart, list(_carts(spec, rng, now, cart_items)))
+        step("cart_items", models.CartItem, cart_items)
+
+        order_items: list = []
+        payments: list = []
+        step("orders", models.Order, list(_orders(spec, rng, now, prices, order_items, payments)))
+        step("order_items", models.OrderItem, order_items)
+        step("payments", models.Payment, payments)
+
+    if verbose:
+        print(f"  {'total':<16} {sum(counts.values()):>9} lignes  {time.perf_counter() - started:6.2f} s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="URL SQLAlchemy de la base à remplir")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--reviews-per-product", type=float, default=3.0)
+    parser.add_argument("--orders-per-client", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Supprimer les tables avant remplissage")
+    args = parser.parse_args()
+
+    spec = DatasetSpec(
+        products=args.products,
+        categories=args.categories,
+        reviews_per_product=args.reviews_per_product,
+        orders_per_client=args.orders_per_client,
+        seed=args.seed,
+    )
+    os.environ.setdefault("DATABASE_URL", args.url)
+    print(f"Remplissage de {args.url} : {asdict(spec)}")
+    seed(create_engine(args.url), spec, reset=args.reset)
+
+
+if __name__ == "__main__":
+    main()
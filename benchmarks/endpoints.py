@@ -0,0 +1,313 @@
+# benchmarks/endpoints.py
+"""
+Latence et débit des routes de l'API, mesurés dans le processus (ASGI,
+sans réseau) sur un jeu de données synthétique (benchmarks.dataset).
+
+    python -m benchmarks.endpoints --products 1000
+    python -m benchmarks.endpoints --products 1000 100000 --only products
+    python -m benchmarks.endpoints --products 10000 --save benchmarks/results/baseline.json
+    python -m benchmarks.endpoints --products 10000 --baseline benchmarks/results/baseline.json
+
+Chaque taille de catalogue tourne dans un sous-processus avec sa propre
+base SQLite (ou --url vers une base MySQL vide, réinitialisée).
+Le cache catalogue est désactivé par défaut (--cache pour le garder).
+
+Seules les réponses réussies (< 400) entrent dans les latences : une
+erreur rapide ne doit pas faire baisser le p95. Un scénario avec des
+erreurs est signalé et fait échouer la mesure (code de sortie 1).
+
+Comparaison : une route régresse si son p95 dépasse celui de la référence
+de plus de --tolerance (25 % par défaut) ; le code de sortie vaut alors 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+# ==========================================================
+# 🎯 Scénarios (un ou plusieurs par routeur)
+# ==========================================================
+# (nom, routeur, méthode, chemin, rôle du token) ; {product}, {category}
+# et {seller} sont tirés du jeu de données.
+SCENARIOS = [
+    ("products.list", "products", "GET", "/api/products/?limit=20", None),
+    ("products.list_deep", "products", "GET", "/api/products/?limit=100", None),
+    ("products.search", "products", "GET", "/api/products/search?q=basket&limit=20", None),
+    ("products.filter", "products", "GET", "/api/products/search?min_price=50&max_price=60&limit=20", None),
+    ("products.category", "products", "GET", "/api/products/public/category/{category}?limit=20", None),
+    ("products.detail", "products", "GET", "/api/products/{product}", None),
+    ("categories.list", "categories", "GET", "/api/categories/", None),
+    ("reviews.product", "reviews", "GET", "/api/reviews/product/{product}", None),
+    ("cart.get", "cart", "GET", "/api/cart/", "CLIENT"),
+    ("cart.add", "cart", "POST", "/api/cart/add/{product}", "CLIENT"),
+    ("cart.batch", "cart", "POST", "/api/cart/batch", "CLIENT"),
+    ("orders.list", "orders", "GET", "/api/orders/?limit=20", None),
+    ("sellers.products", "sellers", "GET", "/api/sellers/products", "VENDEUR"),
+    ("sellers.orders", "sellers", "GET", "/api/sellers/orders", "VENDEUR"),
+    ("seller_dashboard", "seller_dashboard", "GET", "/api/sellers/dashboard", "VENDEUR"),
+    ("admin.users", "admin", "GET", "/api/admin/users?limit=50", "ADMIN"),
+    ("admin.products", "admin", "GET", "/api/admin/products?limit=50", "ADMIN"),
+    ("admin.orders", "admin", "GET", "/api/admin/orders?limit=50", "ADMIN"),
+    ("admin_dashboard", "admin_dashboard", "GET", "/api/admin/dashboard", "ADMIN"),
+    ("admin_dashboard.daily", "admin_dashboard", "GET", "/api/admin/dashboard/daily", "ADMIN"),
+    ("users.list", "users", "GET", "/api/users/", "ADMIN"),
+    ("auth.login", "auth", "POST", "/api/auth/login", None),
+]
+
+
+def _pct(latencies, q):
+    if not latencies:
+        return None
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+
+def _ms(value) -> str:
+    return "—" if value is None else str(value)
+
+
+async def _measure(client, method, make_request, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    error_statuses: Counter[int] = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for i in remaining:
+            path, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                error_statuses[response.status_code] += 1
+            else:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": sum(error_statuses.values()),
+        "error_statuses": {str(status): n for status, n in sorted(error_statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": _pct(latencies, 0.50),
+        "p95_ms": _pct(latencies, 0.95),
+        "p99_ms": _pct(latencies, 0.99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+# ==========================================================
+# 🏃 Exécution pour une taille de catalogue (sous-processus)
+# ==========================================================
+def run_size(args) -> dict:
+    """Remplit la base puis mesure chaque scénario ; à appeler avant tout import de app"""
+    workdir = None if args.url else tempfile.mkdtemp(prefix="drops_bench_")
+    db_url = args.url or f"sqlite:///{workdir}/bench_{args.products[0]}.db"
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.setdefault("QUERY_BUDGET_MODE", "off")
+    if not args.cache:
+        os.environ["CATALOG_CACHE_BACKEND"] = "none"
+
+    import httpx
+    from sqlalchemy import create_engine
+
+    from benchmarks.dataset import BENCH_PASSWORD, DatasetSpec, seed
+
+    spec = DatasetSpec(products=args.products[0], seed=args.seed)
+    print(f"\n📦 {spec.products} produits ({db_url})", file=sys.stderr)
+    seed(create_engine(db_url), spec, reset=True, verbose=args.verbose)
+
+    from app.main import app
+    from app.utils.security import create_access_token
+
+    tokens = {
+        role: {"Authorization": "Bearer " + create_access_token({"sub": str(uid)})}
+        for role, uid in (("CLIENT", 1), ("VENDEUR", spec.first_seller), ("ADMIN", spec.first_admin))
+    }
+
+    def request_factory(path_template, role, name):
+        def make(i):
+            path = path_template.format(
+                product=1 + (i * 7919) % spec.products,
+                category=1 + i % spec.categories,
+                seller=spec.first_seller + i % spec.sellers,
+            )
+            kwargs = {"headers": tokens[role]} if role else {}
+            if name == "auth.login":
+                kwargs["json"] = {"email": f"client{i % spec.clients}@bench.drops", "password": BENCH_PASSWORD}
+            elif name == "cart.batch":
+                kwargs["json"] = {"items": [
+                    {"id_product": 1 + (i * 31 + k) % spec.products, "quantite": 1 + k} for k in range(5)
+                ]}
+            return path, kwargs
+        return make
+
+    scenarios = [s for s in SCENARIOS if not args.only or s[1] in args.only or s[0] in args.only]
+    results = {}
+
+    async def run_all():
+        # une exception dans une route compte comme une erreur (500), sans arrêter la mesure
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, router, method, path, role in scenarios:
+                make = request_factory(path, role, name)
+                await _measure(client, method, make, min(args.warmup, args.requests), args.concurrency)
+                result = await _measure(client, method, make, args.requests, args.concurrency)
+                results[name] = {"router": router, "path": path, **result}
+                flag = f"  ⚠️ {result['error_statuses']}" if result["errors"] else ""
+                print(
+                    f"  {name:<24} {result['rps']:>8} req/s  p50 {_ms(result['p50_ms']):>8} ms  "
+                    f"p95 {_ms(result['p95_ms']):>8} ms  erreurs {result['errors']}{flag}",
+                    file=sys.stderr,
+                )
+
+    try:
+        asyncio.run(run_all())
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"products": spec.products, "database": db_url.split(":")[0], "results": results}
+
+
+# ==========================================================
+# 📊 Résultats et comparaison
+# ==========================================================
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def failures(report: dict) -> list[str]:
+    """Scénarios dont au moins une requête a échoué (mesure invalide)"""
+    return [
+        f"{run['products']}:{name} ({result['errors']} erreurs)"
+        for run in report["runs"]
+        for name, result in run["results"].items()
+        if result["errors"]
+    ]
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Régressions de p95 par taille de catalogue et par scénario. Un scénario
+    en erreur (actuel ou référence) n'est pas comparable : il est compté
+    comme régression.
+    """
+    regressions = []
+    previous = {run["products"]: run["results"] for run in baseline["runs"]}
+    for run in current["runs"]:
+        reference = previous.get(run["products"])
+        if reference is None:
+            continue
+        print(f"\n🔍 {run['products']} produits : p95 actuel / référence", file=sys.stderr)
+        for name, result in run["results"].items():
+            if name not in reference:
+                continue
+            before, after = reference[name]["p95_ms"], result["p95_ms"]
+            if result["errors"] or reference[name].get("errors") or before is None or after is None:
+                print(
+                    f"  ❌ {name:<24} erreurs {reference[name].get('errors', 0)} → {result['errors']}",
+                    file=sys.stderr,
+                )
+                regressions.append(f"{run['products']}:{name} (erreurs)")
+                continue
+            ratio = after / before if before else 1.0
+            flag = "❌" if ratio > 1 + tolerance else "✅"
+            print(f"  {flag} {name:<24} {before:>9} → {after:>9} ms  (x{ratio:.2f})", file=sys.stderr)
+            if ratio > 1 + tolerance:
+                regressions.append(f"{run['products']}:{name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[1000], help="Taille(s) de catalogue")
+    parser.add_argument("--url", help="Base MySQL/SQLite à utiliser (réinitialisée !) au lieu d'un SQLite temporaire")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes mesurées par scénario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="+", help="Routeurs ou scénarios à mesurer (ex. products cart.get)")
+    parser.add_argument("--cache", action="store_true", help="Garder le cache catalogue actif")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument("--baseline", help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Sous-processus : une seule taille, résultat JSON sur stdout
+        print(json.dumps(run_size(args)))
+        return
+
+    runs = []
+    for products in args.products:
+        command = [sys.executable, "-m", "benchmarks.endpoints", "--child", "--products", str(products)]
+        for flag in ("url", "requests", "warmup", "concurrency", "seed"):
+            value = getattr(args, flag)
+            if value is not None:
+                command += [f"--{flag}", str(value)]
+        if args.only:
+            command += ["--only", *args.only]
+        command += ["--cache"] * args.cache + ["--verbose"] * args.verbose
+        output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "cache": args.cache},
+        "runs": runs,
+    }
+
+    if len(runs) > 1:
+        print("\n📐 p95 (ms) par taille de catalogue", file=sys.stderr)
+        names = list(runs[0]["results"])
+        print(f"  {'scénario':<24}" + "".join(f"{run['products']:>12}" for run in runs), file=sys.stderr)
+        for name in names:
+            print(f"  {name:<24}" + "".join(f"{_ms(run['results'][name]['p95_ms']):>12}" for run in runs), file=sys.stderr)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Résultats enregistrés dans {args.save}", file=sys.stderr)
+
+    failed = failures(report)
+    if failed:
+        print(f"\n❌ {len(failed)} scénario(s) en erreur : {', '.join(failed)}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} régression(s) : {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+        if not failed:
+            print("\n✅ Aucune régression", file=sys.stderr)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# benchmarks/reservations.py
+"""
+Débit de réservation sur un seul produit très demandé (ouverture d'un drop).
+
+    python -m benchmarks.reservations
+    python -m benchmarks.reservations --buyers 20000 --stock 5000 --threads 64 --chunk 50
+    python -m benchmarks.reservations --mode direct
+    python -m benchmarks.reservations --url "mysql+pymysql://u:p@127.0.0.1/drops_bench"
+
+--threads fils réservent chacun une unité pour --buyers acheteurs distincts :
+- engine : moteur de réservation (app.utils.reservations), baux de --chunk
+  unités pris sur products.stock ;
+- direct : référence, un UPDATE conditionnel + commit par réservation sur
+  la ligne products (verrou de ligne à chaque acheteur).
+
+Pour chaque mode : réservations/s, latences p50/p95/p99, acceptées et
+refusées, écritures sur la ligne products. Contrôles : exactement
+min(--buyers, --stock) réservations acceptées, puis (engine) stock initial
+retrouvé après restitution des baux. Le code de sortie vaut 1 sinon.
+
+Avec SQLite les écritures sont sérialisées par la base ; --url vers une
+base MySQL vide (réinitialisée !) mesure les verrous de ligne réels.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HOT_PRODUCT = 1
+
+
+def _setup(engine, args):
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, sync_schema
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    sync_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product.__table__), [
+            {"id_product": HOT_PRODUCT, "nom": "Drop", "prix": 100, "stock": args.stock, "note_moyenne": 5.0}
+        ])
+
+
+def _stock(engine) -> int:
+    from sqlalchemy import select
+
+    from app import models
+
+    with engine.connect() as conn:
+        return conn.scalar(select(models.Product.stock).where(models.Product.id_product == HOT_PRODUCT))
+
+
+def _run(reserve, args) -> tuple[list[float], int, int, float]:
+    """Lance les fils ; retourne latences (ms), acceptées, refusées, durée (s)"""
+    latencies: list[list[float]] = [[] for _ in range(args.threads)]
+    accepted = [0] * args.threads
+    rejected = [0] * args.threads
+    start_line = threading.Barrier(args.threads + 1)
+
+    def worker(index):
+        start_line.wait()
+        for id_user in range(index + 1, args.buyers + 1, args.threads):
+            started = time.perf_counter()
+            ok = reserve(id_user)
+            latencies[index].append((time.perf_counter() - started) * 1000)
+            accepted[index] += ok
+            rejected[index] += not ok
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    start_line.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return [v for values in latencies for v in values], sum(accepted), sum(rejected), time.perf_counter() - started
+
+
+def _engine_mode(engine, args) -> tuple[dict, list[str]]:
+    from fastapi import HTTPException
+
+    from app.utils.reservations import ReservationEngine
+
+    reservations = ReservationEngine(enabled=True, chunk=args.chunk, interval=3600)
+
+    def reserve(id_user):
+        try:
+            reservations.hold(id_user, {HOT_PRODUCT: 1})
+            return True
+        except HTTPException:
+            return False
+
+    latencies, accepted, rejected, elapsed = _run(reserve, args)
+    stats = reservations.stats()
+    errors = []
+    if stats["held_units"] != accepted:
+        errors.append(f"engine : {stats['held_units']} unités tenues pour {accepted} réservations")
+    if _stock(engine) + stats["leased_units"] != args.stock:
+        errors.append("engine : stock + baux différent du stock initial")
+    reservations.shutdown()
+    if _stock(engine) != args.stock:
+        errors.append(f"engine : stock {_stock(engine)} après restitution (attendu {args.stock})")
+    return _report("engine", latencies, accepted, rejected, elapsed, stats["leases"]), errors
+
+
+def _direct_mode(engine, args) -> tuple[dict, list[str]]:
+    from sqlalchemy import update
+
+    from app import models
+
+    Product = models.Product
+
+    def reserve(id_user):
+        with engine.connect() as conn:
+            taken = conn.execute(
+                update(Product)
+                .where(Product.id_product == HOT_PRODUCT, Product.stock >= 1)
+                .values(stock=Product.stock - 1)
+            ).rowcount
+            conn.commit()
+        return bool(taken)
+
+    latencies, accepted, rejected, elapsed = _run(reserve, args)
+    errors = []
+    if args.stock - _stock(engine) != accepted:
+        errors.append(f"direct : {accepted} réservations pour {args.stock - _stock(engine)} unités déstockées")
+    return _report("direct", latencies, accepted, rejected, elapsed, len(latencies)), errors
+
+
+def _report(mode, latencies, accepted, rejected, elapsed, writes) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0]] * 99
+    return {
+        "mode": mode,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": quantiles[49],
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "accepted": accepted,
+        "rejected": rejected,
+        "writes": writes,
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=5000, help="Acheteurs (une réservation chacun)")
+    parser.add_argument("--stock", type=int, default=1000, help="Stock initial du produit")
+    parser.add_argument("--threads", type=int, default=32, help="Fils concurrents")
+    parser.add_argument("--chunk", type=int, default=20, help="Unités par bail (mode engine)")
+    parser.add_argument("--mode", choices=["engine", "direct", "both"], default="both")
+    parser.add_argument("--url", help="Base MySQL/SQLite à utiliser (réinitialisée !) au lieu d'un SQLite temporaire")
+    args = parser.parse_args()
+
+    workdir = None if args.url else tempfile.mkdtemp(prefix="drops_reservations_")
+    db_url = args.url or f"sqlite:///{workdir}/reservations.db"
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+    os.environ.setdefault("DB_POOL_TIMEOUT", "120")
+
+    modes = ["engine", "direct"] if args.mode == "both" else [args.mode]
+    expected = min(args.buyers, args.stock)
+    results, errors = [], []
+    try:
+        from app.database import engine
+
+        print(
+            f"🎟️ {args.buyers} acheteurs, {args.threads} fils, 1 produit à {args.stock} unités "
+            f"({db_url.split(':')[0]})",
+            file=sys.stderr,
+        )
+        for mode in modes:
+            _setup(engine, args)
+            result, mode_errors = (_engine_mode if mode == "engine" else _direct_mode)(engine, args)
+            results.append(result)
+            errors += mode_errors
+            if result["accepted"] != expected:
+                errors.append(f"{mode} : {result['accepted']} réservations acceptées (attendu {expected})")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"\n  {'mode':<8}{'rés./s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'acceptées':>11}{'refusées':>10}{'écritures':>11}",
+        file=sys.stderr,
+    )
+    for r in results:
+        print(
+            f"  {r['mode']:<8}{r['rps']:>10.0f}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}"
+            f"{r['accepted']:>11}{r['rejected']:>10}{r['writes']:>11}",
+            file=sys.stderr,
+        )
+    if len(results) == 2 and results[1]["rps"]:
+        print(f"\n  engine / direct : x{results[0]['rps'] / results[1]['rps']:.1f}", file=sys.stderr)
+
+    if errors:
+        print("\n❌ " + "\n❌ ".join(errors), file=sys.stderr)
+        sys.exit(1)
+    print("\n✅ Réservations cohérentes avec le stock", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# tests/conftest.py
+# Deux bases SQLite locales jouent le primaire et le réplica ; à définir
+# avant tout import de app.database (lu à l'import).
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="drops_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/primary.db"
+os.environ["DB_REPLICA_URLS"] = f"sqlite:///{_workdir}/replica.db"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
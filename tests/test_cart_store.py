@@ -0,0 +1,126 @@
+# tests/test_cart_store.py
+"""Reprise après incident de l'écriture différée des paniers (memory et redis)"""
+import pytest
+
+from app import database, models
+from app.utils import cart_store as store_module
+from app.utils.cart_service import cart_quantities
+from app.utils.cart_store import MemoryCartBackend, RedisCartBackend, WriteBehindCartStore
+
+USERS = [1, 2, 3]
+PRODUCTS = [10, 11]
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    database.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        for model in (models.CartItem, models.Cart, models.Product, models.User):
+            conn.execute(model.__table__.delete())
+        conn.execute(models.User.__table__.insert(), [
+            {"id_user": u, "nom": "N", "prenom": "P", "email": f"{u}@x.com", "mot_de_passe": "x", "role": "CLIENT"}
+            for u in USERS
+        ])
+        conn.execute(models.Product.__table__.insert(), [
+            {"id_product": p, "nom": f"P{p}", "prix": 10, "stock": 100} for p in PRODUCTS
+        ])
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return MemoryCartBackend()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCartBackend(prefix="test:", client=fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture
+def store(backend):
+    store = WriteBehindCartStore(backend, interval=3600, batch=2)
+    yield store
+    store.shutdown()
+
+
+def _saved(id_user: int) -> dict[int, int]:
+    db = database.SessionLocal()
+    try:
+        return cart_quantities(db, id_user)
+    finally:
+        db.close()
+
+
+def test_failed_write_keeps_cart_pending(store, backend, monkeypatch):
+    backend.apply(1, {10: 2}, merge=False)
+
+    def unavailable(db, carts):
+        raise RuntimeError("base indisponible")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store_module, "replace_carts", unavailable)
+        with pytest.raises(RuntimeError):
+            store.flush()
+    assert backend.is_pending(1)
+    assert store.stats()["failures"] == 1
+    assert _saved(1) == {}
+
+    # Base revenue : le tour suivant écrit le panier
+    assert store.flush() == 1
+    assert not backend.is_pending(1)
+    assert _saved(1) == {10: 2}
+
+
+def test_edit_during_flush_is_written_next_round(store, backend, monkeypatch):
+    backend.apply(1, {10: 1}, merge=False)
+    replace_carts = store_module.replace_carts
+
+    def edited_meanwhile(db, carts):
+        backend.apply(1, {11: 3}, merge=True)  # modification pendant l'écriture
+        replace_carts(db, carts)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store_module, "replace_carts", edited_meanwhile)
+        store.flush()
+    assert _saved(1) == {10: 1}
+    assert backend.is_pending(1)
+
+    store.flush()
+    assert _saved(1) == {10: 1, 11: 3}
+    assert not backend.is_pending(1)
+
+
+def test_shutdown_writes_every_pending_cart(store, backend):
+    for id_user in USERS:  # plus d'un lot (batch=2)
+        backend.apply(id_user, {10: id_user}, merge=False)
+
+    store.shutdown()
+    assert {u: _saved(u) for u in USERS} == {u: {10: u} for u in USERS}
+    assert backend.pending(10) == []
+
+
+def test_pending_memory_cart_outlives_its_ttl(monkeypatch):
+    backend = MemoryCartBackend(ttl=60)
+    store = WriteBehindCartStore(backend, interval=3600)
+    backend.apply(1, {10: 2}, merge=False)
+    later = store_module.time.monotonic() + 120
+    monkeypatch.setattr(store_module.time, "monotonic", lambda: later)
+
+    # Un panier marqué n'expire pas tant qu'il n'est pas écrit
+    assert backend.get(1) == {10: 2}
+    assert store.flush() == 1
+    assert _saved(1) == {10: 2}
+
+    # Écrit, il expire normalement
+    monkeypatch.setattr(store_module.time, "monotonic", lambda: later + 120)
+    assert backend.get(1) is None
+
+
+def test_redis_cart_expired_before_write_is_unmarked():
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = RedisCartBackend(prefix="test:", client=fakeredis.FakeRedis(decode_responses=True))
+    store = WriteBehindCartStore(backend, interval=3600)
+    backend.apply(1, {10: 2}, merge=False)
+    backend.client.delete(backend._key(1))  # expiration de la clé (CART_STORE_TTL)
+
+    assert store.flush() == 0
+    assert not backend.is_pending(1)
+    assert _saved(1) == {}
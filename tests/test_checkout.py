@@ -0,0 +1,60 @@
+# tests/test_checkout.py
+"""Pas de survente : commandes concurrentes sur un même produit (SQLite)"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from app import database, models
+from app.utils.checkout import place_order
+
+USERS = 20
+ORDERS = 200
+PRODUCT = 1
+INITIAL_STOCK = 120
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    database.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        for model in (models.OrderItem, models.Order, models.Product, models.User):
+            conn.execute(model.__table__.delete())
+        conn.execute(models.User.__table__.insert(), [
+            {"id_user": u, "nom": "N", "prenom": "P", "email": f"{u}@x.com", "mot_de_passe": "x", "role": "CLIENT"}
+            for u in range(1, USERS + 1)
+        ])
+        conn.execute(models.Product.__table__.insert(), [
+            {"id_product": PRODUCT, "nom": "Drop", "prix": 10, "stock": INITIAL_STOCK}
+        ])
+
+
+def _order(n: int) -> int:
+    """Unités vendues par une commande (0 si refusée pour rupture)"""
+    quantite = 1 + n % 2
+    db = database.SessionLocal()
+    try:
+        place_order(db, 1 + n % USERS, {PRODUCT: quantite})
+        return quantite
+    except HTTPException as e:
+        assert e.status_code == 409
+        return 0
+    finally:
+        db.close()
+
+
+def test_parallel_orders_never_oversell():
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        sold = sum(pool.map(_order, range(ORDERS)))
+
+    db = database.SessionLocal()
+    try:
+        stock = db.get(models.Product, PRODUCT).stock
+        ordered = db.query(func.coalesce(func.sum(models.OrderItem.quantite), 0)).scalar()
+    finally:
+        db.close()
+
+    assert stock >= 0
+    assert INITIAL_STOCK - stock == sold == ordered
+    assert sold > INITIAL_STOCK - 2  # la demande (300 unités) dépasse le stock : il est épuisé
@@ -0,0 +1,88 @@
+# tests/test_read_replicas.py
+"""Routage primaire / réplica et lecture de ses écritures, sur deux SQLite"""
+import pytest
+from starlette.requests import Request
+
+from app import database, models
+from app.utils.cache import MemoryCache, register_backend
+
+
+@pytest.fixture(autouse=True)
+def databases(monkeypatch):
+    # Même ligne, contenu différent : on sait de quelle base vient la lecture
+    for engine, nom in ((database.engine, "primaire"), (database.replica_engines[0], "réplica")):
+        database.Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(models.Category.__table__.delete())
+            conn.execute(models.Category.__table__.insert(), [{"id_category": 1, "nom": nom}])
+    monkeypatch.setattr(database, "_recent_writers", None)
+
+
+def _request(token: str) -> Request:
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+def _session(dependency, token: str = "client-a"):
+    sessions = dependency(_request(token))
+    return next(sessions), sessions
+
+
+def _nom(db) -> str:
+    return db.get(models.Category, 1).nom
+
+
+def test_read_only_routes_use_the_replica():
+    db, sessions = _session(database.get_read_db)
+    assert _nom(db) == "réplica"
+    sessions.close()
+
+    db, sessions = _session(database.get_db)
+    assert _nom(db) == "primaire"
+    sessions.close()
+
+
+def test_read_only_session_switches_to_primary_on_first_write():
+    db, sessions = _session(database.get_read_db)
+    db.add(models.Category(nom="nouvelle"))
+    db.flush()
+    assert _nom(db) == "primaire"
+    db.rollback()
+    sessions.close()
+
+
+def test_client_reads_its_own_writes_on_the_primary():
+    db, sessions = _session(database.get_db, "client-a")
+    db.get(models.Category, 1).nom = "modifiée"
+    db.commit()
+    sessions.close()
+
+    db, sessions = _session(database.get_read_db, "client-a")
+    assert _nom(db) == "modifiée"
+    sessions.close()
+
+    # Les autres clients restent sur le réplica
+    db, sessions = _session(database.get_read_db, "client-b")
+    assert _nom(db) == "réplica"
+    sessions.close()
+
+
+def test_registered_backend_holds_recent_writers(monkeypatch):
+    created = []
+
+    def factory(**options):
+        created.append(MemoryCache(**options))
+        return created[-1]
+
+    register_backend("shared-test", factory)
+    monkeypatch.setattr(database, "DB_STICKY_BACKEND", "shared-test")
+
+    db, sessions = _session(database.get_db, "client-a")
+    db.get(models.Category, 1).nom = "modifiée"
+    db.commit()
+    sessions.close()
+
+    assert len(created) == 1
+    assert created[0].stats()["entries"] == 1
+    db, sessions = _session(database.get_read_db, "client-a")
+    assert _nom(db) == "modifiée"
+    sessions.close()